@@ -0,0 +1,162 @@
+import argparse
+import asyncio
+import random
+import secrets
+from urllib.parse import parse_qs
+
+# Loopback ports used by the farm: base_port, base_port + 1, ...
+DEFAULT_BASE_PORT = 20000
+
+_REASONS = {200: "OK", 303: "See Other", 404: "Not Found", 500: "Internal Server Error"}
+
+_LOGIN_PAGE = """<!DOCTYPE html>
+<html><head><title>Mock ONT {port}</title>
+<link rel="stylesheet" href="/static/style.css"><script src="/static/app.js"></script></head>
+<body><form method="post" action="/login">
+<input id="username" name="username"><input id="password" name="password" type="password">
+<button id="login" type="submit">Entrar</button>
+</form></body></html>"""
+
+_CONFIG_PAGE = """<!DOCTYPE html>
+<html><head><title>Mock ONT {port} - WLAN</title>
+<link rel="stylesheet" href="/static/style.css"><script src="/static/app.js"></script></head>
+<body><form method="post" action="/save">
+<input id="ssid" name="ssid" value="{ssid}"><button id="save" type="submit">Salvar</button>
+</form></body></html>"""
+
+_SAVED_PAGE = """<!DOCTYPE html>
+<html><head><title>Mock ONT {port}</title></head>
+<body><div id="saved">Configuração salva</div><a href="/config">Voltar</a></body></html>"""
+
+
+class MockRouterFarm:
+    """
+    count fake routers on 127.0.0.1:base_port.., each with a login page, a WLAN config page
+    behind a session cookie and a save action. latency_ms (+/- jitter) delays every response,
+    page_kb is the size of the static JS each page loads, failure_rate is the chance that a
+    login or save answers 500, and unreachable_rate leaves that share of the ports closed.
+    """
+
+    def __init__(self, count, base_port=DEFAULT_BASE_PORT, latency_ms=50, jitter=0.2, page_kb=200, failure_rate=0.0, unreachable_rate=0.0, seed=None):
+        self.count = count
+        self.base_port = base_port
+        self.latency_ms = latency_ms
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self.unreachable_rate = unreachable_rate
+        self._random = random.Random(seed)
+        self._servers = []
+        self._sessions = {}  # port -> session cookie of the logged-in client
+        self._ssids = {}
+        filler = "/* mock router bundle */\n" + "var pad='" + "x" * 1000 + "';\n"
+        self._app_js = (filler * max(1, page_kb)).encode("utf-8")
+        self._style_css = b"body{font-family:sans-serif}input{margin:4px}"
+        self.requests = 0
+
+    @property
+    def ports(self):
+        return list(range(self.base_port, self.base_port + self.count))
+
+    async def start(self):
+        """ Starts listening; returns the devices ({"ip", "port"}) of every port, closed ones included. """
+        devices = []
+        for port in self.ports:
+            devices.append({"ip": "127.0.0.1", "port": str(port)})
+            if self._random.random() < self.unreachable_rate:
+                continue
+            server = await asyncio.start_server(lambda r, w, port=port: self._handle(r, w, port), "127.0.0.1", port, backlog=64)
+            self._servers.append(server)
+        return devices
+
+    async def stop(self):
+        for server in self._servers:
+            server.close()
+        await asyncio.gather(*(server.wait_closed() for server in self._servers), return_exceptions=True)
+        self._servers = []
+
+    async def _handle(self, reader, writer, port):
+        # HTTP/1.1 keep-alive: one connection serves requests until the client closes it
+        try:
+            while True:
+                head = await reader.readuntil(b"\r\n\r\n")
+                lines = head.decode("latin-1").split("\r\n")
+                method, path, _ = lines[0].split(" ", 2)
+                headers = {}
+                for line in lines[1:]:
+                    if ":" in line:
+                        name, value = line.split(":", 1)
+                        headers[name.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get("content-length", 0) or 0))
+                self.requests += 1
+                await asyncio.sleep(self.latency_ms * (1 + self._random.uniform(-self.jitter, self.jitter)) / 1000)
+                status, extra_headers, payload = self._route(port, method, path.split("?")[0], headers, body)
+                response = [f"HTTP/1.1 {status} {_REASONS[status]}", f"Content-Length: {len(payload)}", "Connection: keep-alive"]
+                response.extend(f"{name}: {value}" for name, value in extra_headers)
+                writer.write(("\r\n".join(response) + "\r\n\r\n").encode("latin-1") + payload)
+                await writer.drain()
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    def _route(self, port, method, path, headers, body):
+        html = ("Content-Type", "text/html; charset=utf-8")
+        logged = self._sessions.get(port) and f"sid={self._sessions[port]}" in headers.get("cookie", "")
+        if path == "/static/app.js":
+            return 200, [("Content-Type", "application/javascript"), ("Cache-Control", "max-age=3600")], self._app_js
+        if path == "/static/style.css":
+            return 200, [("Content-Type", "text/css"), ("Cache-Control", "max-age=3600")], self._style_css
+        if path == "/" and method == "GET":
+            if logged:
+                return 303, [("Location", "/config")], b""
+            return 200, [html], _LOGIN_PAGE.format(port=port).encode("utf-8")
+        if path == "/login" and method == "POST":
+            if self._random.random() < self.failure_rate:
+                return 500, [html], b"<h1>Erro interno</h1>"
+            self._sessions[port] = secrets.token_hex(8)
+            return 303, [("Location", "/config"), ("Set-Cookie", f"sid={self._sessions[port]}; Path=/; HttpOnly")], b""
+        if path == "/config" and method == "GET":
+            if not logged:
+                return 303, [("Location", "/")], b""
+            return 200, [html], _CONFIG_PAGE.format(port=port, ssid=self._ssids.get(port, "")).encode("utf-8")
+        if path == "/save" and method == "POST":
+            if not logged:
+                return 303, [("Location", "/")], b""
+            if self._random.random() < self.failure_rate:
+                return 500, [html], b"<h1>Erro interno</h1>"
+            self._ssids[port] = parse_qs(body.decode("utf-8")).get("ssid", [""])[0]
+            return 200, [html], _SAVED_PAGE.format(port=port).encode("utf-8")
+        return 404, [html], b"<h1>404</h1>"
+
+
+def serve_forever(count, base_port, latency_ms, page_kb, failure_rate, unreachable_rate, seed, ready=None):
+    """ Process entry point: runs a farm until the process is terminated. """
+    async def run():
+        farm = MockRouterFarm(count, base_port, latency_ms, page_kb=page_kb, failure_rate=failure_rate, unreachable_rate=unreachable_rate, seed=seed)
+        await farm.start()
+        if ready is not None:
+            ready.set()
+        await asyncio.Event().wait()
+    asyncio.run(run())
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.mock_router", description="Roteadores falsos em 127.0.0.1 para testes de carga")
+    parser.add_argument("--count", type=int, default=100)
+    parser.add_argument("--base-port", type=int, default=DEFAULT_BASE_PORT)
+    parser.add_argument("--latency-ms", type=float, default=50)
+    parser.add_argument("--page-kb", type=int, default=200)
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    parser.add_argument("--unreachable-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int)
+    args = parser.parse_args(argv)
+    print(f"{args.count} roteadores em 127.0.0.1:{args.base_port}-{args.base_port + args.count - 1} (Ctrl+C para sair)")
+    try:
+        serve_forever(args.count, args.base_port, args.latency_ms, args.page_kb, args.failure_rate, args.unreachable_rate, args.seed)
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
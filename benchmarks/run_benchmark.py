@@ -0,0 +1,245 @@
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import platform
+import subprocess
+import sys
+import threading
+import time
+
+try:
+    import psutil
+except ImportError:  # The report then has no RSS/CPU figures
+    psutil = None
+
+from benchmarks.mock_router import DEFAULT_BASE_PORT, serve_forever
+from core.automation_engine import AutomationEngine
+
+# Templates written for the pages of benchmarks/mock_router.py
+SAMPLE_TEMPLATES = {
+    # Login, change the SSID, save: the usual provisioning flow
+    "wifi": '''await page.goto(f"http://{{IP}}:{{PORT}}/")
+await page.fill("#username", "{{USERNAME}}")
+await page.fill("#password", "{{PASSWORD}}")
+await page.click("#login")
+# FIM DO LOGIN
+await page.wait_for_selector("#ssid")
+await page.fill("#ssid", "BENCH-{{PORT}}")
+await page.click("#save")
+await page.wait_for_selector("#saved")''',
+    # Login page only: measures launch/context/navigation overhead
+    "login_page": '''await page.goto(f"http://{{IP}}:{{PORT}}/")
+await page.wait_for_selector("#password")''',
+}
+
+# Seconds between two RSS/CPU samples
+_SAMPLE_INTERVAL = 0.25
+
+
+class ResourceSampler:
+    """ Background thread sampling RSS and CPU time of this process and its children
+    (Playwright driver and browsers), leaving out the mock router farm. """
+
+    def __init__(self, exclude_pid=None):
+        self.exclude_pid = exclude_pid
+        self.peak_rss_mb = 0.0
+        self.peak_cpu_percent = 0.0
+        self._cpu_seconds = {}  # pid -> last seen user+system seconds
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="bench-sampler", daemon=True)
+
+    def __enter__(self):
+        if psutil is not None:
+            self._baseline = self._sample()[1]
+            self._started = time.perf_counter()
+            self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        if psutil is not None:
+            self._stop.set()
+            self._thread.join()
+            self.wall_seconds = time.perf_counter() - self._started
+
+    def _processes(self):
+        me = psutil.Process(os.getpid())
+        excluded = set()
+        if self.exclude_pid:
+            try:
+                farm = psutil.Process(self.exclude_pid)
+                excluded = {farm.pid, *(child.pid for child in farm.children(recursive=True))}
+            except psutil.Error:
+                pass
+        return [me] + [child for child in me.children(recursive=True) if child.pid not in excluded]
+
+    def _sample(self):
+        rss = 0
+        for process in self._processes():
+            try:
+                rss += process.memory_info().rss
+                times = process.cpu_times()
+                self._cpu_seconds[process.pid] = times.user + times.system
+            except psutil.Error:
+                pass  # Exited between listing and sampling; its last CPU reading is kept
+        return rss / (1024 * 1024), sum(self._cpu_seconds.values())
+
+    def _run(self):
+        previous = (time.perf_counter(), self._baseline)
+        stopped = False
+        while not stopped:
+            # One last sample after stop, so even a sub-interval run gets measured
+            stopped = self._stop.wait(_SAMPLE_INTERVAL)
+            rss_mb, cpu = self._sample()
+            now = time.perf_counter()
+            self.peak_rss_mb = max(self.peak_rss_mb, rss_mb)
+            self.peak_cpu_percent = max(self.peak_cpu_percent, (cpu - previous[1]) / (now - previous[0]) * 100)
+            previous = (now, cpu)
+
+    def report(self):
+        if psutil is None:
+            return {"peak_rss_mb": None, "cpu_percent_avg": None, "cpu_percent_peak": None}
+        cpu = sum(self._cpu_seconds.values()) - self._baseline
+        return {
+            "peak_rss_mb": round(self.peak_rss_mb, 1),
+            "cpu_percent_avg": round(cpu / self.wall_seconds * 100, 1),
+            "cpu_percent_peak": round(self.peak_cpu_percent, 1),
+        }
+
+
+async def run_case(devices, script, browser_type, workers, timeout_ms, use_pool, farm_pid=None):
+    """ One run_batch over the farm; returns its throughput, status counts, phases and resources. """
+    engine = AutomationEngine(max_concurrent=workers)
+    with ResourceSampler(exclude_pid=farm_pid) as sampler:
+        start = time.perf_counter()
+        results = await engine.run_batch(devices, script, "admin", "admin", browser_type=browser_type, timeout_ms=timeout_ms, use_pool=use_pool, cache_assets=True)
+        elapsed = time.perf_counter() - start
+    statuses = {}
+    for result in results:
+        statuses[result["status"]] = statuses.get(result["status"], 0) + 1
+    case = {
+        "browser": browser_type,
+        "workers": workers,
+        "devices": len(results),
+        "wall_seconds": round(elapsed, 2),
+        "devices_per_min": round(len(results) / elapsed * 60, 1),
+        "statuses": statuses,
+        "phases": engine.phase_percentiles(),
+    }
+    case.update(sampler.report())
+    return case
+
+
+def _git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, timeout=5, cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def _environment():
+    try:
+        from importlib.metadata import version
+        playwright_version = version("playwright")
+    except Exception:
+        playwright_version = None
+    return {
+        "revision": _git_revision(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "playwright": playwright_version,
+    }
+
+
+def run_suite(args):
+    ready = multiprocessing.Event()
+    farm = multiprocessing.Process(
+        target=serve_forever,
+        args=(args.devices, args.base_port, args.latency_ms, args.page_kb, args.failure_rate, args.unreachable_rate, args.seed),
+        kwargs={"ready": ready},
+        daemon=True,
+    )
+    farm.start()
+    if not ready.wait(60):
+        farm.terminate()
+        raise RuntimeError("Os roteadores de teste não subiram em 60s")
+    devices = [{"ip": "127.0.0.1", "port": str(port)} for port in range(args.base_port, args.base_port + args.devices)]
+
+    report = {
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "environment": _environment(),
+        "farm": {"devices": args.devices, "latency_ms": args.latency_ms, "page_kb": args.page_kb, "failure_rate": args.failure_rate, "unreachable_rate": args.unreachable_rate, "seed": args.seed},
+        "template": args.template,
+        "use_pool": not args.no_pool,
+        "cases": [],
+    }
+    try:
+        for browser_type in args.browsers:
+            for workers in args.workers:
+                print(f"{browser_type} x {workers} workers...", file=sys.stderr, flush=True)
+                case = asyncio.run(run_case(devices, SAMPLE_TEMPLATES[args.template], browser_type, workers, args.timeout * 1000, not args.no_pool, farm.pid))
+                report["cases"].append(case)
+                print(f"  {case['devices_per_min']} equipamentos/min, pico {case['peak_rss_mb']}MB, {case['statuses']}", file=sys.stderr, flush=True)
+    finally:
+        farm.terminate()
+        farm.join()
+    return report
+
+
+def compare(old_path, new_path):
+    """ Prints devices/min and peak RSS of the cases present in both reports. """
+    with open(old_path, encoding="utf-8") as f:
+        old = json.load(f)
+    with open(new_path, encoding="utf-8") as f:
+        new = json.load(f)
+    old_cases = {(case["browser"], case["workers"]): case for case in old["cases"]}
+    print(f"{old['environment'].get('revision')} -> {new['environment'].get('revision')}")
+    for case in new["cases"]:
+        before = old_cases.get((case["browser"], case["workers"]))
+        if before is None:
+            continue
+        change = (case["devices_per_min"] / before["devices_per_min"] - 1) * 100 if before["devices_per_min"] else 0.0
+        print(f"{case['browser']:<9} {case['workers']:>4} workers: {before['devices_per_min']:>8} -> {case['devices_per_min']:>8} equip/min ({change:+.1f}%), "
+              f"RSS {before['peak_rss_mb']} -> {case['peak_rss_mb']} MB")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.run_benchmark", description="Mede o AutomationEngine contra roteadores falsos locais")
+    sub = parser.add_subparsers(dest="mode")
+    diff = sub.add_parser("compare", help="Compara dois relatórios JSON")
+    diff.add_argument("old")
+    diff.add_argument("new")
+    parser.add_argument("--devices", type=int, default=200, help="Roteadores falsos (uma porta cada)")
+    parser.add_argument("--workers", default="5,10,20", help="Navegadores simultâneos, separados por vírgula")
+    parser.add_argument("--browsers", default="firefox,chromium")
+    parser.add_argument("--template", choices=sorted(SAMPLE_TEMPLATES), default="wifi")
+    parser.add_argument("--latency-ms", type=float, default=50)
+    parser.add_argument("--page-kb", type=int, default=200)
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    parser.add_argument("--unreachable-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--base-port", type=int, default=DEFAULT_BASE_PORT)
+    parser.add_argument("--timeout", type=int, default=15, help="Timeout por ação, em segundos")
+    parser.add_argument("--no-pool", action="store_true", help="Um navegador por equipamento (sem BrowserPool)")
+    parser.add_argument("--output", help="Arquivo JSON do relatório (padrão: benchmarks/results/<data>.json)")
+    args = parser.parse_args(argv)
+
+    if args.mode == "compare":
+        compare(args.old, args.new)
+        return 0
+
+    args.workers = [int(w) for w in args.workers.split(",") if w.strip()]
+    args.browsers = [b.strip().lower() for b in args.browsers.split(",") if b.strip()]
+    report = run_suite(args)
+    output = args.output or os.path.join(os.path.dirname(os.path.abspath(__file__)), "results", time.strftime("%Y%m%d-%H%M%S") + ".json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    print(f"Relatório salvo em {output}", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
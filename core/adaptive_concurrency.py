@@ -0,0 +1,140 @@
+import asyncio
+import os
+import statistics
+import time
+
+try:
+    import psutil
+except ImportError:  # Adaptive mode then only reacts to latency and error rate
+    psutil = None
+
+
+class ConcurrencyGate:
+    """ Resizable limit on how many workers may run a device at the same time. """
+
+    def __init__(self, limit):
+        self.limit = max(1, int(limit))
+        self.active = 0
+        self._cond = asyncio.Condition()
+
+    async def acquire(self):
+        async with self._cond:
+            await self._cond.wait_for(lambda: self.active < self.limit)
+            self.active += 1
+
+    async def release(self):
+        async with self._cond:
+            self.active -= 1
+            self._cond.notify()
+
+    async def set_limit(self, limit):
+        async with self._cond:
+            self.limit = max(1, int(limit))
+            self._cond.notify_all()
+
+
+def sample_browser_rss_mb():
+    """ RSS (MB) of every process started by this one: Playwright driver and its browsers. """
+    if psutil is None:
+        return None
+    total = 0
+    try:
+        children = psutil.Process(os.getpid()).children(recursive=True)
+    except psutil.Error:
+        return None
+    for child in children:
+        try:
+            total += child.memory_info().rss
+        except psutil.Error:
+            pass  # Process exited between listing and sampling
+    return total / (1024 * 1024)
+
+
+class AdaptiveConcurrency:
+    """
+    AIMD controller for the number of active workers. Every interval it grows the limit by one
+    while the workers are saturated and there is headroom, and cuts it multiplicatively when
+    browser RSS passes the memory ceiling, free memory or CPU run out, or the devices start
+    failing / slowing down.
+    """
+
+    def __init__(self, min_concurrent=1, max_concurrent=50, memory_ceiling_mb=None, interval=5.0,
+                 min_free_mb=512, cpu_limit=90.0, error_rate_limit=0.5, latency_factor=2.0, decrease_factor=0.75):
+        self.min_concurrent = max(1, int(min_concurrent))
+        self.max_concurrent = max(self.min_concurrent, int(max_concurrent))
+        self.memory_ceiling_mb = memory_ceiling_mb
+        self.interval = interval
+        self.min_free_mb = min_free_mb
+        self.cpu_limit = cpu_limit
+        self.error_rate_limit = error_rate_limit
+        self.latency_factor = latency_factor
+        self.decrease_factor = decrease_factor
+        self.limit = self.min_concurrent
+        self.last_sample = {}
+        self._durations = []
+        self._errors = 0
+        self._baseline_latency = None
+
+    def record(self, duration, ok):
+        """ Called by the workers once per finished device. """
+        self._durations.append(duration)
+        if not ok:
+            self._errors += 1
+
+    def sample(self):
+        """ Measures the machine. Blocking (psutil), run it off the event loop. """
+        sample = {"browser_rss_mb": sample_browser_rss_mb(), "free_mb": None, "cpu_percent": None}
+        if psutil is not None:
+            sample["free_mb"] = psutil.virtual_memory().available / (1024 * 1024)
+            sample["cpu_percent"] = psutil.cpu_percent(interval=None)
+        return sample
+
+    def next_limit(self, sample, active, has_backlog):
+        durations, errors = self._durations, self._errors
+        self._durations, self._errors = [], 0
+
+        overloaded = False
+        rss = sample.get("browser_rss_mb")
+        per_worker_mb = rss / active if rss and active else None
+        if self.memory_ceiling_mb and rss is not None and rss > self.memory_ceiling_mb:
+            overloaded = True
+        if sample.get("free_mb") is not None and sample["free_mb"] < self.min_free_mb:
+            overloaded = True
+        if sample.get("cpu_percent") is not None and sample["cpu_percent"] > self.cpu_limit:
+            overloaded = True
+
+        if durations:
+            if len(durations) >= 4 and errors / len(durations) > self.error_rate_limit:
+                overloaded = True
+            median = statistics.median(durations)
+            if self._baseline_latency is None or median < self._baseline_latency:
+                self._baseline_latency = median
+            else:
+                if median > self._baseline_latency * self.latency_factor:
+                    overloaded = True
+                # Let the baseline drift up slowly so one lucky fast window doesn't pin it
+                self._baseline_latency += (median - self._baseline_latency) * 0.05
+
+        if overloaded:
+            limit = int(self.limit * self.decrease_factor)
+        elif has_backlog and active >= self.limit:
+            limit = self.limit + 1
+            # Don't grow past the memory ceiling if one more browser would not fit
+            if self.memory_ceiling_mb and per_worker_mb and rss + per_worker_mb > self.memory_ceiling_mb:
+                limit = self.limit
+        else:
+            limit = self.limit
+
+        self.limit = min(self.max_concurrent, max(self.min_concurrent, limit))
+        self.last_sample = dict(sample, limit=self.limit, active=active, at=time.monotonic())
+        return self.limit
+
+    async def run(self, gate, has_backlog):
+        """ Control loop; cancel the task to stop it. has_backlog() tells if devices are waiting. """
+        await gate.set_limit(self.limit)
+        while True:
+            await asyncio.sleep(self.interval)
+            sample = await asyncio.to_thread(self.sample)
+            limit = self.next_limit(sample, gate.active, has_backlog())
+            if limit != gate.limit:
+                await gate.set_limit(limit)
@@ -0,0 +1,91 @@
+from collections import OrderedDict
+from urllib.parse import urlsplit
+
+# Only these content types are shared between devices; pages, XHR and JSON always hit the device
+STATIC_CONTENT_TYPES = (
+    "text/css", "javascript", "ecmascript", "font/", "application/font", "application/x-font",
+    "image/", "application/wasm",
+)
+# Request types that are never served from the cache
+_DYNAMIC_RESOURCE_TYPES = ("document", "xhr", "fetch", "websocket", "eventsource", "manifest")
+# Headers that don't survive being replayed to another context
+_DROPPED_HEADERS = ("content-encoding", "content-length", "transfer-encoding", "set-cookie", "connection")
+
+
+class StaticAssetCache:
+    """
+    Engine-wide LRU cache of static responses (JS/CSS/fonts/images), keyed by template and
+    URL path, so devices of the same model share the bundles downloaded by the first one.
+    Filled from real responses via route.fetch and served to later contexts with route.fulfill.
+    """
+
+    def __init__(self, max_bytes=64 * 1024 * 1024, max_entry_bytes=4 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = max_entry_bytes
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # (template_key, path?query) -> (status, headers, body)
+
+    def get(self, key):
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+        return entry
+
+    def put(self, key, status, headers, body):
+        if len(body) > self.max_entry_bytes:
+            return
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self.size -= len(old[2])
+        self._entries[key] = (status, headers, body)
+        self.size += len(body)
+        while self.size > self.max_bytes and self._entries:
+            _, evicted = self._entries.popitem(last=False)
+            self.size -= len(evicted[2])
+
+    def clear(self):
+        self._entries.clear()
+        self.size = 0
+
+    def _is_cacheable(self, response):
+        if response.status != 200:
+            return False
+        headers = response.headers
+        if "no-store" in headers.get("cache-control", "").lower():
+            return False
+        content_type = headers.get("content-type", "").lower()
+        return any(static in content_type for static in STATIC_CONTENT_TYPES)
+
+    async def attach(self, context, template_key):
+        """ Routes the context's static GET requests through the cache. """
+
+        async def _route(route):
+            request = route.request
+            if request.method != "GET" or request.resource_type in _DYNAMIC_RESOURCE_TYPES:
+                await route.fallback()
+                return
+
+            parts = urlsplit(request.url)
+            key = (template_key, f"{parts.path}?{parts.query}")
+            entry = self.get(key)
+            if entry is not None:
+                self.hits += 1
+                status, headers, body = entry
+                await route.fulfill(status=status, headers=headers, body=body)
+                return
+
+            self.misses += 1
+            try:
+                response = await route.fetch()
+                body = await response.body()
+            except Exception:
+                await route.fallback()  # Let the browser report the network error itself
+                return
+            if self._is_cacheable(response):
+                headers = {k: v for k, v in response.headers.items() if k.lower() not in _DROPPED_HEADERS}
+                self.put(key, response.status, headers, body)
+            await route.fulfill(response=response, body=body)
+
+        await context.route("**/*", _route)
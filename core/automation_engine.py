@@ -1,15 +1,132 @@
 import asyncio
+import math
+import time
 from playwright.async_api import async_playwright
 import re
 
+from core.adaptive_concurrency import AdaptiveConcurrency, ConcurrencyGate, sample_browser_rss_mb
+from core.asset_cache import StaticAssetCache
+from core.browser_pool import BrowserPool
+from core.fingerprint import UNMATCHED, Fingerprinter, describe, match_route, parse_rule
+from core.http_replay import HttpRecorder, HttpReplayEngine
+from core.lean_profile import LeanProfile
+from core.memory_profile import MemoryProfiler
+from core.phase_timing import PhaseHistogram, PhaseTimer
+from core.preflight import PREFLIGHT_CONCURRENCY, UNREACHABLE, tcp_probe
+from core.progress_bus import CANCELLED, ERROR, RETRY, SUCCESS, STATUS
+from core.retry_policy import CONNECTION_REFUSED, TIMEOUT, RetryPolicy, classify_error
+from core.session_cache import LOGIN_FORM_SELECTOR, split_login
+from core.template_compiler import compile_chain, compile_template, template_steps
+
+# How many isolated contexts share one pooled browser when pool_size is not given
+CONTEXTS_PER_BROWSER = 10
+
+# Sentinel passed through the batch queues
+_BATCH_DONE = object()
+
+# Graceful cancel: seconds in-flight devices get to finish before they are cancelled
+CANCEL_GRACE_SECONDS = 10
+
+# Seconds between two browser RSS samples of the batch's memory profile
+MEMORY_SAMPLE_SECONDS = 2.0
+
+async def _iterate(devices):
+    """ Async iteration over a plain iterable or an async one (e.g. devices fed by another process). """
+    if hasattr(devices, "__aiter__"):
+        async for dev in devices:
+            yield dev
+    else:
+        for dev in devices:
+            yield dev
+
+class _WorkItem:
+    """ A device travelling through the batch queue, with its attempt history. """
+
+    __slots__ = ("dev", "attempts", "preflight_ms", "route")
+
+    def __init__(self, dev):
+        self.dev = dev
+        self.attempts = []
+        self.preflight_ms = None
+        self.route = None  # Template picked by fingerprint in a routed batch
+
 class AutomationEngine:
-    def __init__(self, max_concurrent=5):
+    def __init__(self, max_concurrent=5, pool_size=None, recycle_after=50, adaptive=False, min_concurrent=1, memory_ceiling_mb=None, retry_policy=None, lean_profile=None, asset_cache=None, progress_bus=None, session_cache=None):
         self.max_concurrent = max_concurrent
+        # Optional ProgressBus: typed, coalesced events for consumers on another thread (the GUI)
+        self.progress_bus = progress_bus
         self.semaphore = asyncio.Semaphore(self.max_concurrent)
         self.is_cancelled = False
+        self._loop = None
+        self._inflight = set()
+        self._retry_timers = set()
+        # Default policy: a single attempt, i.e. the historical behaviour
+        self.retry_policy = retry_policy or RetryPolicy(max_attempts=1)
+        # Lean mode (per template): blocked asset types/URLs and small viewport
+        self.lean_profile = lean_profile or LeanProfile()
+        # Static JS/CSS shared between devices of the same template (lives as long as the engine)
+        self.asset_cache = asset_cache or StaticAssetCache()
+        # Optional SessionCache: logged-in storage_state per device, lets templates skip their login
+        self.session_cache = session_cache
+        # Browserless backend, created by run_batch when a recorded HTTP recipe is used
+        self.http_replay = None
+        # Per-phase latency histograms of the current batch (see phase_percentiles)
+        self.phase_stats = PhaseHistogram()
+        # Browser RSS vs active devices of the current batch (see memory_profile)
+        self.memory_profiler = MemoryProfiler()
+        # Browser pool settings (used by run_batch). Recycle a browser after N devices to cap leaks.
+        self.pool_size = pool_size or math.ceil(max_concurrent / CONTEXTS_PER_BROWSER)
+        self.recycle_after = recycle_after
+        self.pool = None
+        # Adaptive mode: max_concurrent becomes the upper bound and the controller
+        # moves the active worker count between min_concurrent and it during the batch
+        self.controller = None
+        if adaptive:
+            self.controller = AdaptiveConcurrency(min_concurrent=min_concurrent, max_concurrent=max_concurrent, memory_ceiling_mb=memory_ceiling_mb)
 
-    def cancel(self):
+    @property
+    def current_concurrency(self):
+        return self.controller.limit if self.controller else self.max_concurrent
+
+    def phase_percentiles(self):
+        """ p50/p95/p99 (ms) per phase of the devices finished so far. Safe to call from any thread. """
+        return self.phase_stats.percentiles()
+
+    def memory_profile(self):
+        """ Measured browser RAM of the batch: {"base_mb", "per_worker_mb", ...} or None (see core/memory_profile.py). """
+        return self.memory_profiler.estimate()
+
+    def cancel(self, mode="graceful"):
+        """
+        Stops the running batch. Safe to call from any thread (e.g. the Tk PARAR button).
+        Queued devices are reported as cancelled without ever launching. In "graceful" mode
+        in-flight devices get CANCEL_GRACE_SECONDS to finish; in "hard" mode they are
+        cancelled at once and their contexts/browsers closed.
+        """
         self.is_cancelled = True
+        loop = self._loop
+        if loop and not loop.is_closed():
+            loop.call_soon_threadsafe(self._cancel_inflight, mode)
+
+    def _cancel_inflight(self, mode):
+        # Devices waiting for a retry are finished right away in both modes
+        for timer in list(self._retry_timers):
+            timer.cancel()
+        if mode == "hard":
+            for task in list(self._inflight):
+                task.cancel()
+        elif self._inflight:
+            self._loop.call_later(CANCEL_GRACE_SECONDS, self._cancel_inflight, "hard")
+
+    def _report(self, progress_callback, ip, message, kind=STATUS):
+        if progress_callback:
+            progress_callback(ip, message)
+        if self.progress_bus is not None:
+            self.progress_bus.publish(ip, message, kind)
+
+    def _cancelled_result(self, ip, progress_callback):
+        self._report(progress_callback, ip, "Cancelado", CANCELLED)
+        return {"ip": ip, "status": "cancelled", "message": "Operação cancelada pelo usuário"}
 
     async def test_single_ip(self, ip, port, username, password, template_script, browser_type="firefox", timeout_ms: int = 15000):
         """ Test a single IP primarily to check if it's reachable and the automation runs. """
@@ -18,106 +135,525 @@ class AutomationEngine:
 
     async def execute_template_on_router(self, ip, port, username, password, template_script, visible=True, progress_callback=None, browser_type="firefox", timeout_ms: int = 15000):
         if self.is_cancelled:
-            if progress_callback:
-                progress_callback(ip, "Cancelado")
-            return {"ip": ip, "status": "cancelled", "message": "Operação cancelada pelo usuário"}
-            
+            return self._cancelled_result(ip, progress_callback)
+
         async with self.semaphore:
             # We wrap the playwright execution inside the semaphore to limit concurrent browsers
-            async with async_playwright() as p:
-                browser = None
+            return await self._execute_device(ip, port, username, password, template_script, visible, progress_callback, browser_type, timeout_ms)
+
+    async def _execute_device(self, ip, port, username, password, template_script, visible, progress_callback, browser_type, timeout_ms, lean=False, cache_assets=False, http_recipe=None, backend="browser", session_scope=None):
+        """ Runs the template on one device and returns its result dict. Never raises. """
+        timer = PhaseTimer()
+        result = await self._execute_device_timed(ip, port, username, password, template_script, visible, progress_callback, browser_type, timeout_ms, lean, cache_assets, http_recipe, backend, timer, session_scope)
+        result["phases"] = timer.phases
+        if result["status"] != "cancelled":
+            self.phase_stats.record(timer.phases)
+        return result
+
+    async def _execute_device_timed(self, ip, port, username, password, template_script, visible, progress_callback, browser_type, timeout_ms, lean, cache_assets, http_recipe, backend, timer, session_scope=None):
+        if http_recipe and backend in ("http", "auto"):
+            try:
+                self._report(progress_callback, ip, "Reproduzindo receita HTTP...")
+                with timer.phase("http_replay"):
+                    await self.http_replay.replay(http_recipe, ip, port, username, password)
+                self._report(progress_callback, ip, "Sucesso", SUCCESS)
+                return {"ip": ip, "status": "success", "message": "Configuração aplicada (HTTP)", "backend": "http"}
+            except Exception as e:
+                if self.is_cancelled:
+                    return self._cancelled_result(ip, progress_callback)
+                if backend == "http":
+                    self._report(progress_callback, ip, f"Erro: {str(e)}", ERROR)
+                    return {"ip": ip, "status": "error", "message": str(e), "error_class": classify_error(e), "backend": "http"}
+                # auto: the browser engine is the fallback
+                self._report(progress_callback, ip, f"Receita HTTP falhou ({e}). Usando navegador...")
+
+        extras = {"backend": "browser"}
+        context_options = {"ignore_https_errors": True}
+        if lean:
+            context_options.update(self.lean_profile.context_options())
+        session = None
+        if session_scope and self.session_cache:
+            session = (session_scope, await asyncio.to_thread(self.session_cache.get, ip, port, session_scope))
+            if session[1]:
+                context_options["storage_state"] = session[1]
+        try:
+            if self.pool:
+                # Pool mode: the browser is already running, the device only gets its own context
+                # ("new_context" includes waiting for a pool slot and any browser relaunch)
+                timer.start("new_context")
                 try:
-                    # Depending on the network, headless might be preferred.
-                    # Choose browser based on parameter
-                    browser_instance = getattr(p, browser_type.lower(), p.firefox)
-                    browser = await browser_instance.launch(headless=not visible)
-                    context = await browser.new_context(ignore_https_errors=True)
-                    page = await context.new_page()
-                    # Set page timeout based on user configuration
-                    page.set_default_timeout(timeout_ms)
-                    
-                    if progress_callback:
-                        progress_callback(ip, "Iniciando conexão...")
-                    
-                    # The script stored in DB needs to be executed within this context.
-                    # Ideally, the stored script is a python async function body generated by Codegen
-                    # Build variables dictionary
-                    variables = {
-                        "{{IP}}": ip,
-                        "{{PORT}}": str(port),
-                        "{{USERNAME}}": username,
-                        "{{PASSWORD}}": password
-                    }
-                    
-                    # 1. First, replace variables securely
-                    for key, val in variables.items():
-                        template_script = template_script.replace(key, str(val))
-                        
-                    # Build local context for exec
-                    local_env = {
-                        'page': page,
-                        'browser': browser,
-                        'context': context,
-                        'asyncio': asyncio,
-                        'variables': variables # Passing variables for possible script usage
-                    }
-                    
-                    script_lines = "\n".join([f"    {line}" for line in template_script.splitlines()])
-                    wrapped_script = f"async def run_automation(page):\n{script_lines}"
-                    
-                    # 2. Add an explicit wait for stability to let router finish processing
-                    if progress_callback:
-                        progress_callback(ip, "Aplicando configurações...")
-
-                    # Execute the definition into local_env
-                    exec(wrapped_script, globals(), local_env)
-                    
-                    if self.is_cancelled:
-                        raise Exception("Operação cancelada pelo usuário")
-                    
-                    # Run the function
-                    # The function is stored in local_env and we must await its execution
-                    await local_env['run_automation'](page)
-                    
-                    if progress_callback:
-                        progress_callback(ip, "Sucesso")
-                        
-                    return {"ip": ip, "status": "success", "message": "Configuração aplicada"}
-                
-                except Exception as e:
-                    if progress_callback:
-                        progress_callback(ip, f"Erro: {str(e)}")
-                    return {"ip": ip, "status": "error", "message": str(e)}
+                    async with self.pool.context(**context_options) as (browser, context):
+                        timer.stop("new_context")
+                        try:
+                            await self._run_script(ip, port, username, password, template_script, browser, context, progress_callback, timeout_ms, lean, cache_assets, extras, timer, session)
+                        finally:
+                            timer.start("close")
                 finally:
-                    if browser:
-                        await browser.close()
-                    
+                    timer.stop("close")
+            else:
+                async with async_playwright() as p:
+                    browser = None
+                    try:
+                        # Depending on the network, headless might be preferred.
+                        # Choose browser based on parameter
+                        browser_instance = getattr(p, browser_type.lower(), p.firefox)
+                        with timer.phase("launch"):
+                            browser = await browser_instance.launch(headless=not visible)
+                        with timer.phase("new_context"):
+                            context = await browser.new_context(**context_options)
+                        await self._run_script(ip, port, username, password, template_script, browser, context, progress_callback, timeout_ms, lean, cache_assets, extras, timer, session)
+                    finally:
+                        if browser:
+                            with timer.phase("close"):
+                                await browser.close()
+
+            self._report(progress_callback, ip, "Sucesso", SUCCESS)
+
+            result = {"ip": ip, "status": "success", "message": "Configuração aplicada"}
+
+        except Exception as e:
+            if self.is_cancelled:
+                # Errors raised while stopping (closed page/context) are not device failures
+                return self._cancelled_result(ip, progress_callback)
+            message = str(e)
+            if "failed_step" in extras:
+                message = f"Passo {extras['failed_step']}: {message}"
+            self._report(progress_callback, ip, f"Erro: {message}", ERROR)
+            result = {"ip": ip, "status": "error", "message": message, "error_class": classify_error(e)}
+
+        result.update(extras)
+        return result
+
+    async def _run_script(self, ip, port, username, password, template_script, browser, context, progress_callback, timeout_ms, lean=False, cache_assets=False, extras=None, timer=None, session=None):
+        # The script stored in DB is compiled once per content hash; the device
+        # only supplies its variables, which are bound at runtime (never pasted into the source)
+        steps = template_steps(template_script)
+        compiled_steps = compile_chain(steps)
+        # Asset cache and lean profile are learned per entry template of the chain
+        key = compiled_steps[0].key
+
+        if cache_assets:
+            # Registered before the lean route: Playwright runs the last route first,
+            # so blocked assets are aborted before they ever reach the cache
+            await self.asset_cache.attach(context, key)
+
+        if lean and extras is not None:
+            # Blocked request counters keep updating while the script runs
+            extras["lean"] = await self.lean_profile.apply(context, key)
+
+        page = await context.new_page()
+        # Set page timeout based on user configuration
+        page.set_default_timeout(timeout_ms)
+
+        self._report(progress_callback, ip, "Iniciando conexão...")
+
+        variables = {
+            "IP": ip,
+            "PORT": str(port),
+            "USERNAME": username,
+            "PASSWORD": password
+        }
+        # "shared" is one dict for the whole chain: a step can leave values for the next ones
+        env = {"page": page, "browser": browser, "context": context, "shared": {}}
+
+        # 2. Add an explicit wait for stability to let router finish processing
+        self._report(progress_callback, ip, "Aplicando configurações...")
+
+        if self.is_cancelled:
+            raise Exception("Operação cancelada pelo usuário")
+
+        timer = timer or PhaseTimer()
+        timer.wrap_first_goto(page)
+        with timer.phase("script"):
+            restored = False
+            if session is not None:
+                session_scope, cached_state = session
+                restored = cached_state is not None
+                if extras is not None:
+                    extras["session"] = "new"
+            try:
+                await self._run_steps(ip, steps, compiled_steps, variables, env, page, extras, restored, progress_callback)
+            except Exception:
+                if restored:
+                    await asyncio.to_thread(self.session_cache.invalidate, ip, port, session_scope)
+                raise
+        if session is None:
+            return
+        # Logged in now: the next template on this device can skip the login
+        state = await context.storage_state()
+        await asyncio.to_thread(self.session_cache.put, ip, port, session_scope, state)
+
+    async def _run_steps(self, ip, steps, compiled_steps, variables, env, page, extras, restored, progress_callback):
+        """
+        Runs the chain's steps in order on the same page. Every step after the first finds the
+        device already logged in, so it resumes past its own login like a cached session would.
+        Stops at the first failing step; the ones after it are recorded as skipped.
+        """
+        chained = len(steps) > 1
+        records = []
+        for index, (step, compiled) in enumerate(zip(steps, compiled_steps), 1):
+            if chained:
+                self._report(progress_callback, ip, f"Passo {index}/{len(steps)}: {step['name'] or step['id']}")
+            record = {"step": index, "template_id": step["id"], "name": step["name"], "status": "success"}
+            records.append(record)
+            start = time.perf_counter()
+            try:
+                if self.is_cancelled:
+                    raise Exception("Operação cancelada pelo usuário")
+                resume = restored if index == 1 else True
+                if not resume or not await self._resume_session(step["script"], variables, env, page, extras if index == 1 else None):
+                    await compiled.bind(variables, **env)(page)
+            except Exception as e:
+                record.update(status="error", message=str(e), error_class=classify_error(e))
+                raise
+            finally:
+                record["duration_ms"] = round((time.perf_counter() - start) * 1000, 1)
+                if chained and extras is not None:
+                    if record["status"] == "error":
+                        extras["failed_step"] = index
+                        records.extend({"step": i, "template_id": s["id"], "name": s["name"], "status": "skipped"}
+                                       for i, s in enumerate(steps[index:], index + 1))
+                    extras["steps"] = records
+
+    async def _resume_session(self, template_script, variables, env, page, extras=None):
+        """
+        With the device already logged in (cached session or an earlier step of the chain), runs
+        only the template's first goto and the steps after LOGIN_END_MARKER. Returns False
+        (nothing else run) when the device shows its login form, so the full script must run.
+        """
+        parts = split_login(template_script)
+        if parts is None:
+            return False
+        try:
+            prelude, rest = (compile_template(part) for part in parts)
+        except Exception:
+            return False  # Marker inside a block: only the full script is valid Python
+        await prelude.bind(variables, **env)(page)
+        if await page.locator(LOGIN_FORM_SELECTOR).count():
+            if extras is not None:
+                extras["session"] = "expired"
+            return False
+        try:
+            await rest.bind(variables, **env)(page)
+        except Exception:
+            # The login form may have rendered late (SPA): then it's an expired session, not a failure
+            if not await page.locator(LOGIN_FORM_SELECTOR).count():
+                raise
+            if extras is not None:
+                extras["session"] = "expired"
+            await page.goto("about:blank")
+            return False
+        if extras is not None:
+            extras["session"] = "reused"
+        return True
+
+    async def record_http_recipe(self, ip, port, username, password, template_script, browser_type="firefox", timeout_ms: int = 15000, visible=True, progress_callback=None):
+        """ Runs the template once in a browser and records its page/XHR requests as an HTTP
+        recipe (see core/http_replay.py) for the browserless backend. Raises on failure. """
+        async with async_playwright() as p:
+            browser_instance = getattr(p, browser_type.lower(), p.firefox)
+            browser = await browser_instance.launch(headless=not visible)
+            try:
+                context = await browser.new_context(ignore_https_errors=True)
+                recorder = HttpRecorder(ip, port, username, password)
+                recorder.attach(context)
+                await self._run_script(ip, port, username, password, template_script, browser, context, progress_callback, timeout_ms)
+                recipe = await recorder.finish()
+            finally:
+                await browser.close()
+        if not recipe["steps"]:
+            raise Exception("Nenhuma requisição HTTP foi gravada")
+        return recipe
+
     def _indent_string(self, text, spaces=4):
         return '\n'.join(' ' * spaces + line if line.strip() else line for line in text.split('\n'))
 
-    async def run_batch(self, devices_list, script, username, password, browser_type="firefox", timeout_ms=15000, progress_callback=None, visible=False):
+    async def run_batch_stream(self, devices, script, username, password, browser_type="firefox", timeout_ms=15000, progress_callback=None, visible=False, use_pool=True, lean=False, cache_assets=False, http_recipe=None, backend="browser", preflight_timeout=None, session_scope=None, routes=None):
         """
-        devices_list format: [{"ip": "192.168.1.1", "port": "80"}, ...]
+        Async generator: yields each device's result dict as soon as that device finishes.
+        devices: any iterable (or async iterable) of {"ip": "192.168.1.1", "port": "80"} dicts.
+        script: a template script, or a chain of {"id", "name", "script"} steps run in order in
+        one browser context per device (see template_steps); each step is reported in "steps".
+        It is consumed lazily, so a generator (CSV reader, IP range) never has to be materialized.
+        Exactly max_concurrent workers pull from a bounded queue (in adaptive mode only
+        current_concurrency of them run a device at once); with use_pool, one Playwright
+        driver and pool_size browsers are shared by the whole batch.
+        lean applies the engine's LeanProfile to every device (see core/lean_profile.py);
+        cache_assets serves static JS/CSS/fonts from the engine's StaticAssetCache after the
+        first device of the template downloaded them.
+        backend: "browser" (Playwright), "http" (replay http_recipe only) or "auto" (replay,
+        falling back to the browser when the recipe fails on a device).
+        preflight_timeout (seconds): every device first gets a plain TCP connect to ip:port;
+        devices that don't answer finish at once with status "unreachable" and never take a
+        browser slot. None disables the stage.
+        session_scope (e.g. the template vendor): with the engine's session_cache and a template
+        containing LOGIN_END_MARKER, each device's logged-in storage_state is cached under
+        (ip, port, scope) and later runs skip the login while it is valid.
+        routes: run a different template per device instead of script. A list of
+        {"name", "script", "rule", "lean", "vendor"} dicts (see DatabaseHandler.get_fingerprint_routes);
+        every device is fingerprinted over HTTP (unless it already carries a scanner "fingerprint")
+        and runs the route whose rule matches (see core/fingerprint.py). Devices matching no
+        rule finish with status "unmatched" without taking a browser slot. Routed batches
+        always use the browser backend; lean and the session vendor come from each route.
         """
+        try:
+            # Compile the template (every step of a chain) once for the whole batch; syntax errors surface here
+            if routes is None:
+                compile_chain(script)
+            else:
+                prepared = []
+                for route in routes:
+                    try:
+                        compile_chain(route["script"])
+                        conditions = parse_rule(route["rule"])
+                    except Exception as e:
+                        raise ValueError(f"{route['name']}: {e}")
+                    use_session = session_scope and self.session_cache is not None and split_login(template_steps(route["script"])[0]["script"]) is not None
+                    prepared.append(dict(route, conditions=conditions, session_scope=route.get("vendor") if use_session else None))
+                routes = prepared
+        except Exception as e:
+            async for dev in _iterate(devices):
+                yield {"ip": dev['ip'], "port": dev['port'], "status": "error", "message": f"Erro no template: {e}"}
+            return
+
+        if routes is not None or not http_recipe or len(template_steps(script)) > 1:
+            backend = "browser"  # Recipes are recorded per template, never for a chain or a routed batch
+        if routes is not None or self.session_cache is None or split_login(template_steps(script)[0]["script"]) is None:
+            session_scope = None
+        if backend != "browser":
+            self.http_replay = HttpReplayEngine(max_connections=max(1, self.max_concurrent), timeout_ms=timeout_ms)
+
+        self._loop = asyncio.get_running_loop()
+        self.phase_stats = PhaseHistogram()
+        self.memory_profiler = MemoryProfiler()
+        worker_count = max(1, self.max_concurrent)
+        # Small bound: the feeder only stays a couple of devices ahead of the workers
+        work_queue = asyncio.Queue(maxsize=worker_count * 2)
+        # Optional stage in front of the workers: devices wait here for their TCP preflight / fingerprint
+        probe_queue = asyncio.Queue(maxsize=PREFLIGHT_CONCURRENCY) if preflight_timeout or routes is not None else None
+        fingerprinter = Fingerprinter(max_connections=PREFLIGHT_CONCURRENCY) if routes is not None else None
+        results = asyncio.Queue()
+        gate = ConcurrencyGate(self.current_concurrency)
+        policy = self.retry_policy
+        # Devices handed to the workers and not finished yet (retries included)
+        state = {"outstanding": 0, "feed_done": False}
+
+        def check_done():
+            if state["feed_done"] and state["outstanding"] == 0:
+                for _ in range(worker_count):
+                    work_queue.put_nowait(_BATCH_DONE)
+
+        def finish(item, result):
+            # With the ip, identifies the device: one address may expose several (port forwards)
+            result["port"] = item.dev['port']
+            result["attempts"] = len(item.attempts)
+            result["attempt_timings"] = item.attempts
+            if item.preflight_ms is not None:
+                result.setdefault("phases", {})["preflight"] = round(item.preflight_ms, 1)
+            if item.route is not None:
+                result["template"] = item.route["name"]
+            results.put_nowait(result)
+            state["outstanding"] -= 1
+            check_done()
+
+        async def requeue(item, delay):
+            try:
+                await asyncio.sleep(delay)
+            except asyncio.CancelledError:
+                if not self.is_cancelled:
+                    raise
+                finish(item, self._cancelled_result(item.dev['ip'], progress_callback))
+                return
+            # Goes to the back of the queue, behind fresh devices already waiting
+            await work_queue.put(item)
+
+        async def feeder():
+            try:
+                async for dev in _iterate(devices):
+                    if self.is_cancelled:
+                        # Remaining devices are reported without ever reaching a worker
+                        results.put_nowait(dict(self._cancelled_result(dev['ip'], progress_callback), port=dev['port']))
+                        continue
+                    state["outstanding"] += 1
+                    await (probe_queue or work_queue).put(_WorkItem(dev))
+            finally:
+                state["feed_done"] = True
+                check_done()
+
+        async def prober():
+            while True:
+                item = await probe_queue.get()
+                try:
+                    ip = item.dev['ip']
+                    if self.is_cancelled:
+                        finish(item, self._cancelled_result(ip, progress_callback))
+                        continue
+                    if preflight_timeout:
+                        reachable, reason, item.preflight_ms = await tcp_probe(ip, item.dev['port'], preflight_timeout)
+                        self.phase_stats.record({"preflight": item.preflight_ms})
+                        if not reachable:
+                            message = f"Inacessível: {reason}"
+                            self._report(progress_callback, ip, message, UNREACHABLE)
+                            finish(item, {"ip": ip, "status": UNREACHABLE, "message": message, "error_class": UNREACHABLE})
+                            continue
+                    if routes is not None:
+                        if "fingerprint" in item.dev:
+                            fingerprint = item.dev["fingerprint"]  # Already identified by the scanner
+                        else:
+                            started = time.perf_counter()
+                            fingerprint = await fingerprinter.fingerprint(ip, item.dev['port'])
+                            self.phase_stats.record({"fingerprint": (time.perf_counter() - started) * 1000})
+                        item.route = match_route(fingerprint, routes)
+                        if item.route is None:
+                            message = f"Não identificado ({describe(fingerprint)})"
+                            self._report(progress_callback, ip, message, UNMATCHED)
+                            finish(item, {"ip": ip, "status": UNMATCHED, "message": message, "error_class": UNMATCHED, "fingerprint": fingerprint})
+                            continue
+                        self._report(progress_callback, ip, f"Identificado: {item.route['name']}")
+                except Exception as e:
+                    # An unexpected failure ends this device only, never the whole stage
+                    ip = item.dev['ip']
+                    self._report(progress_callback, ip, f"Erro: {e}", ERROR)
+                    finish(item, {"ip": ip, "status": "error", "message": str(e), "error_class": classify_error(e)})
+                    continue
+                await work_queue.put(item)
+
+        async def worker():
+            try:
+                while True:
+                    item = await work_queue.get()
+                    if item is _BATCH_DONE:
+                        break
+                    dev = item.dev
+                    route = item.route or {}
+                    await gate.acquire()
+                    try:
+                        if self.is_cancelled:
+                            finish(item, self._cancelled_result(dev['ip'], progress_callback))
+                            continue
+                        started = time.monotonic()
+                        started_at = time.time()
+                        # Each device runs as its own task so cancel() can interrupt it
+                        device_task = asyncio.ensure_future(self._execute_device(
+                            ip=dev['ip'],
+                            port=dev['port'],
+                            username=username,
+                            password=password,
+                            template_script=route.get("script", script),
+                            visible=visible,
+                            progress_callback=progress_callback,
+                            browser_type=browser_type,
+                            timeout_ms=timeout_ms,
+                            lean=route.get("lean", lean),
+                            cache_assets=cache_assets,
+                            http_recipe=http_recipe,
+                            backend=backend,
+                            session_scope=route.get("session_scope", session_scope)
+                        ))
+                        self._inflight.add(device_task)
+                        try:
+                            result = await device_task
+                        except asyncio.CancelledError:
+                            if not device_task.cancelled():
+                                raise  # The worker itself is being torn down
+                            result = self._cancelled_result(dev['ip'], progress_callback)
+                        finally:
+                            self._inflight.discard(device_task)
+                    finally:
+                        await gate.release()
+
+                    duration = time.monotonic() - started
+                    if self.controller and result['status'] != 'cancelled':
+                        # Only timeouts and refused connections mean "too many at once"; a broken
+                        # template or wrong password fails the same way at any concurrency
+                        self.controller.record(duration, result.get('error_class') not in (TIMEOUT, CONNECTION_REFUSED))
+                    item.attempts.append({
+                        "attempt": len(item.attempts) + 1,
+                        "started_at": started_at,
+                        "duration_ms": int(duration * 1000),
+                        "status": result['status'],
+                        "error_class": result.get('error_class')
+                    })
+
+                    attempt = len(item.attempts)
+                    if result['status'] == 'error' and not self.is_cancelled and policy.should_retry(result['error_class'], attempt):
+                        delay = policy.backoff(attempt)
+                        self._report(progress_callback, dev['ip'], f"Tentativa {attempt}/{policy.max_attempts} falhou ({result['error_class']}). Nova tentativa em {delay:.0f}s...", RETRY)
+                        timer = asyncio.ensure_future(requeue(item, delay))
+                        self._retry_timers.add(timer)
+                        timer.add_done_callback(self._retry_timers.discard)
+                        continue
+                    finish(item, result)
+            finally:
+                results.put_nowait(_BATCH_DONE)
+
+        async def memory_sampler():
+            while True:
+                await asyncio.sleep(MEMORY_SAMPLE_SECONDS)
+                active = gate.active
+                if active:
+                    self.memory_profiler.record(active, await asyncio.to_thread(sample_browser_rss_mb))
+
         tasks = []
-        for dev in devices_list:
-            if self.is_cancelled:
-                break
-                
-            # Create a task for each device
-            task = self.execute_template_on_router(
-                ip=dev['ip'],
-                port=dev['port'],
-                username=username,
-                password=password,
-                template_script=script,
-                progress_callback=progress_callback,
-                visible=visible,
-                browser_type=browser_type,
-                timeout_ms=timeout_ms
-            )
-            tasks.append(task)
-            
-        # Run all tasks concurrently (semaphore limits active ones)
-        results = await asyncio.gather(*tasks, return_exceptions=True)
-        return results
+        try:
+            if use_pool and backend != "http":
+                # Inside the try: a launch failing halfway still closes the driver and the browsers already up
+                self.pool = BrowserPool(browser_type=browser_type, size=self.pool_size, recycle_after=self.recycle_after, headless=not visible)
+                await self.pool.start()
+            tasks.append(asyncio.ensure_future(feeder()))
+            tasks += [asyncio.ensure_future(worker()) for _ in range(worker_count)]
+            if probe_queue:
+                # Probers never end by themselves; they are cancelled with the batch below
+                tasks += [asyncio.ensure_future(prober()) for _ in range(PREFLIGHT_CONCURRENCY)]
+            if self.controller:
+                tasks.append(asyncio.ensure_future(self.controller.run(gate, lambda: not work_queue.empty())))
+            if backend != "http":
+                tasks.append(asyncio.ensure_future(memory_sampler()))
+            finished_workers = 0
+            while finished_workers < worker_count:
+                result = await results.get()
+                if result is _BATCH_DONE:
+                    finished_workers += 1
+                else:
+                    yield result
+            feeder_task = tasks[0]
+            if not feeder_task.cancelled() and feeder_task.exception():
+                # The device source (CSV reader, scanner, journal) failed: the batch is truncated, not done
+                raise feeder_task.exception()
+        finally:
+            # Consumer stopped early (break/aclose): don't leave devices running
+            pending = [task for task in tasks + list(self._retry_timers) if not task.done()]
+            for task in pending:
+                task.cancel()
+            if pending:
+                await asyncio.gather(*pending, return_exceptions=True)
+            if self.pool:
+                await self.pool.close()
+                self.pool = None
+            if self.http_replay:
+                await self.http_replay.close()
+                self.http_replay = None
+            if fingerprinter:
+                await fingerprinter.close()
+            self._loop = None
+
+    async def run_batch(self, devices, script, username, password, browser_type="firefox", timeout_ms=15000, progress_callback=None, visible=False, use_pool=True, lean=False, cache_assets=False, http_recipe=None, backend="browser", preflight_timeout=None, session_scope=None, routes=None):
+        """
+        devices: iterable of {"ip": "192.168.1.1", "port": "80"} dicts.
+        Returns every result dict, in completion order. See run_batch_stream for incremental consumers.
+        """
+        return [result async for result in self.run_batch_stream(
+            devices, script, username, password,
+            browser_type=browser_type,
+            timeout_ms=timeout_ms,
+            progress_callback=progress_callback,
+            visible=visible,
+            use_pool=use_pool,
+            lean=lean,
+            cache_assets=cache_assets,
+            http_recipe=http_recipe,
+            backend=backend,
+            preflight_timeout=preflight_timeout,
+            session_scope=session_scope,
+            routes=routes
+        )]
@@ -0,0 +1,94 @@
+import asyncio
+from contextlib import asynccontextmanager
+from playwright.async_api import async_playwright
+
+
+class _BrowserSlot:
+    def __init__(self, browser):
+        self.browser = browser
+        self.active = 0   # Contexts currently open on this browser
+        self.served = 0   # Devices handed to this browser since launch
+
+
+class BrowserPool:
+    """ One Playwright driver and a few long-lived browsers shared by every device of a batch.
+    Each device only gets a fresh, isolated BrowserContext. """
+
+    def __init__(self, browser_type="firefox", size=2, recycle_after=50, headless=True):
+        self.browser_type = browser_type
+        self.size = max(1, int(size))
+        self.recycle_after = recycle_after
+        self.headless = headless
+        self._playwright = None
+        self._launcher = None
+        self._slots = []
+        self._retired = []
+        self._lock = asyncio.Lock()
+
+    async def start(self):
+        self._playwright = await async_playwright().start()
+        self._launcher = getattr(self._playwright, self.browser_type.lower(), self._playwright.firefox)
+        for _ in range(self.size):
+            self._slots.append(await self._launch_slot())
+
+    async def _launch_slot(self):
+        browser = await self._launcher.launch(headless=self.headless)
+        return _BrowserSlot(browser)
+
+    async def _close_slot(self, slot):
+        try:
+            await slot.browser.close()
+        except Exception:
+            pass  # Browser already gone (crash or driver shutdown)
+
+    async def _acquire_slot(self):
+        async with self._lock:
+            # Replace browsers that crashed or were disconnected
+            for slot in [s for s in self._slots if not s.browser.is_connected()]:
+                self._slots.remove(slot)
+                if slot.active:
+                    self._retired.append(slot)
+                else:
+                    await self._close_slot(slot)
+            while len(self._slots) < self.size:
+                self._slots.append(await self._launch_slot())
+
+            slot = min(self._slots, key=lambda s: s.active)
+            slot.active += 1
+            slot.served += 1
+            if self.recycle_after and slot.served >= self.recycle_after:
+                # Stop handing out this browser; it is closed once its last context ends
+                self._slots.remove(slot)
+                self._retired.append(slot)
+            return slot
+
+    async def _release_slot(self, slot):
+        slot.active -= 1
+        if slot in self._retired and slot.active <= 0:
+            self._retired.remove(slot)
+            await self._close_slot(slot)
+
+    @asynccontextmanager
+    async def context(self, **context_kwargs):
+        """ Yields (browser, context) on the least busy browser and closes the context afterwards. """
+        slot = await self._acquire_slot()
+        context = None
+        try:
+            context = await slot.browser.new_context(**context_kwargs)
+            yield slot.browser, context
+        finally:
+            if context:
+                try:
+                    await context.close()
+                except Exception:
+                    pass
+            await self._release_slot(slot)
+
+    async def close(self):
+        for slot in self._slots + self._retired:
+            await self._close_slot(slot)
+        self._slots = []
+        self._retired = []
+        if self._playwright:
+            await self._playwright.stop()
+            self._playwright = None
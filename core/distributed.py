@@ -0,0 +1,436 @@
+"""
+Coordinator/worker mode: one batch spread across several machines on the management LAN.
+
+The coordinator (the app, or `python -m core.distributed coordinator`) owns the device list
+and leases chunks of it to headless workers over plain TCP, one JSON object per line:
+
+    worker -> {"type": "hello", "name": ..., "token": ...}      coordinator -> {"type": "job", ...}
+    worker -> {"type": "lease", "max": n}                        coordinator -> {"type": "devices" | "wait" | "done", ...}
+    worker -> {"type": "result", "key": k, "result": {...}}
+    worker -> {"type": "progress", "events": [[ip, kind, message], ...]}
+    worker -> {"type": "heartbeat"}                              coordinator -> {"type": "cancel", "mode": ...}
+
+A lease not renewed by heartbeats within lease_ttl (crashed or unplugged worker) expires
+and its unfinished devices go back to the front of the queue.
+
+Workers run whatever script the coordinator sends, and the coordinator hands out credentials:
+every connection must present the coordinator's token (generated when none is given).
+
+    python -m core.distributed coordinator --template-id 3 --devices lista.csv
+    python -m core.distributed worker --host 192.168.0.10 --token <token do coordenador> --concurrency 10
+"""
+import argparse
+import asyncio
+import csv
+import hmac
+import itertools
+import json
+import secrets
+import socket
+import sys
+import time
+from collections import deque
+
+from core.automation_engine import AutomationEngine
+from core.phase_timing import PhaseHistogram
+from core.progress_bus import CANCELLED, ProgressBus
+from core.retry_policy import RetryPolicy
+from core.template_compiler import compile_chain
+
+DEFAULT_PORT = 8765
+LEASE_TTL_SECONDS = 60
+# Workers renew their leases this many times per TTL
+_HEARTBEATS_PER_TTL = 3
+_PROGRESS_TICK_SECONDS = 0.1
+# Lines carry whole result dicts (error messages, attempt timings)
+_LINE_LIMIT = 16 * 1024 * 1024
+
+_DONE = object()
+
+
+async def _send(writer, message):
+    writer.write((json.dumps(message) + "\n").encode("utf-8"))
+    await writer.drain()
+
+
+async def _receive(reader):
+    line = await reader.readline()
+    if not line:
+        return None
+    return json.loads(line)
+
+
+class _Lease:
+    __slots__ = ("worker", "keys", "expires_at")
+
+    def __init__(self, worker, keys, ttl):
+        self.worker = worker
+        self.keys = set(keys)
+        self.expires_at = time.monotonic() + ttl
+
+
+class DistributedCoordinator:
+    """
+    Hands a batch out to remote workers instead of running it locally. Same batch interface as
+    AutomationEngine (run_batch_stream/run_batch, cancel, phase_percentiles), so the GUI can use
+    it in place of the local engine. Each device has a key; a result is accepted once per key,
+    so a late answer from an expired lease never duplicates a device.
+    Workers must send token in their hello; without one, a random token is generated (see .token).
+    """
+
+    def __init__(self, host="0.0.0.0", port=DEFAULT_PORT, lease_size=10, lease_ttl=LEASE_TTL_SECONDS, token=None, progress_bus=None, retry_attempts=1):
+        self.host = host
+        self.port = port
+        self.lease_size = lease_size
+        self.lease_ttl = lease_ttl
+        self.token = token or secrets.token_urlsafe(16)
+        self.progress_bus = progress_bus
+        self.retry_attempts = retry_attempts
+        self.is_cancelled = False
+        self.phase_stats = PhaseHistogram()
+        self.workers = {}  # writer -> worker name
+        self._handlers = set()
+        self._loop = None
+        self._job = None
+        self._source = None
+        self._source_done = False
+        self._requeued = deque()  # (key, dev) of expired leases
+        self._pending = {}        # key -> dev, leased or queued and without a result yet
+        self._leases = {}         # lease id -> _Lease
+        self._lease_ids = itertools.count(1)
+        self._keys = itertools.count()
+        self._results = None
+        self._progress_callback = None
+
+    @property
+    def current_concurrency(self):
+        return len(self.workers)
+
+    def phase_percentiles(self):
+        return self.phase_stats.percentiles()
+
+    def memory_profile(self):
+        """ Browsers run on the workers' machines: nothing to learn about this one. """
+        return None
+
+    def cancel(self, mode="graceful"):
+        """ Stops handing out devices and forwards the cancel to every worker. Safe from any thread. """
+        self.is_cancelled = True
+        loop = self._loop
+        if loop and not loop.is_closed():
+            loop.call_soon_threadsafe(lambda: asyncio.ensure_future(self._cancel_now(mode)))
+
+    async def _cancel_now(self, mode):
+        # Devices never leased are finished here; leased ones come back cancelled from their worker
+        while self._requeued:
+            key, dev = self._requeued.popleft()
+            self._cancelled(key, dev)
+        for dev in self._source:
+            self._cancelled(next(self._keys), dev)
+        self._source_done = True
+        self._check_done()
+        for writer in list(self.workers):
+            try:
+                await _send(writer, {"type": "cancel", "mode": mode})
+            except (ConnectionError, OSError):
+                pass
+
+    def _cancelled(self, key, dev):
+        self._pending.pop(key, None)
+        self._publish(dev['ip'], "Cancelado", CANCELLED)
+        self._results.put_nowait({"ip": dev['ip'], "port": dev['port'], "status": "cancelled", "message": "Operação cancelada pelo usuário"})
+
+    def _publish(self, ip, message, kind):
+        if self._progress_callback:
+            self._progress_callback(ip, message)
+        if self.progress_bus is not None:
+            self.progress_bus.publish(ip, message, kind)
+
+    def _check_done(self):
+        if self._source_done and not self._requeued and not self._pending:
+            self._results.put_nowait(_DONE)
+
+    def _take(self, count):
+        devices = []
+        while len(devices) < count and self._requeued:
+            devices.append(self._requeued.popleft())
+        while len(devices) < count and not self._source_done:
+            dev = next(self._source, None)
+            if dev is None:
+                self._source_done = True
+                break
+            key = next(self._keys)
+            self._pending[key] = dev
+            devices.append((key, dev))
+        return devices
+
+    def _expire(self, lease_id):
+        lease = self._leases.pop(lease_id)
+        for key in lease.keys:
+            dev = self._pending.get(key)
+            if dev is None:
+                continue
+            if self.is_cancelled:
+                self._cancelled(key, dev)
+            else:
+                self._requeued.appendleft((key, dev))
+                self._publish(dev['ip'], "Worker perdido, reenfileirado", "status")
+        self._check_done()
+
+    async def _reap(self):
+        while True:
+            await asyncio.sleep(1)
+            now = time.monotonic()
+            for lease_id in [lid for lid, lease in self._leases.items() if lease.expires_at < now]:
+                self._expire(lease_id)
+
+    async def _handle(self, reader, writer):
+        self._handlers.add(asyncio.current_task())
+        try:
+            hello = await _receive(reader)
+            if not hello or hello.get("type") != "hello" or not hmac.compare_digest(str(hello.get("token") or "").encode(), self.token.encode()):
+                await _send(writer, {"type": "error", "message": "Token inválido"})
+                return
+            self.workers[writer] = hello.get("name") or str(writer.get_extra_info("peername"))
+            await _send(writer, dict(self._job, type="job", lease_ttl=self.lease_ttl))
+
+            while True:
+                message = await _receive(reader)
+                if message is None:
+                    break
+                kind = message.get("type")
+                if kind == "lease":
+                    await self._lease(writer, int(message.get("max") or self.lease_size))
+                elif kind == "result":
+                    self._on_result(writer, message["key"], message["result"])
+                elif kind == "progress":
+                    for ip, event_kind, text in message["events"]:
+                        self._publish(ip, text, event_kind)
+                elif kind == "heartbeat":
+                    expires_at = time.monotonic() + self.lease_ttl
+                    for lease in self._leases.values():
+                        if lease.worker is writer:
+                            lease.expires_at = expires_at
+        except (ConnectionError, OSError, ValueError):
+            pass  # Worker vanished or sent garbage: its leases are expired below
+        finally:
+            self._handlers.discard(asyncio.current_task())
+            self.workers.pop(writer, None)
+            for lease_id in [lid for lid, lease in self._leases.items() if lease.worker is writer]:
+                self._expire(lease_id)
+            writer.close()
+
+    async def _lease(self, writer, count):
+        if self.is_cancelled:
+            await _send(writer, {"type": "done"})
+            return
+        devices = self._take(min(count, self.lease_size))
+        if devices:
+            lease_id = next(self._lease_ids)
+            self._leases[lease_id] = _Lease(writer, [key for key, _ in devices], self.lease_ttl)
+            await _send(writer, {"type": "devices", "lease": lease_id, "devices": [[key, dev] for key, dev in devices]})
+        elif self._pending:
+            # Everything is leased out; an expiring lease may still bring devices back
+            await _send(writer, {"type": "wait"})
+        else:
+            await _send(writer, {"type": "done"})
+            self._check_done()
+
+    def _on_result(self, writer, key, result):
+        if self._pending.pop(key, None) is None:
+            return  # Late answer for a device already finished elsewhere
+        for lease_id, lease in list(self._leases.items()):
+            if key in lease.keys:
+                lease.keys.discard(key)
+                if not lease.keys:
+                    del self._leases[lease_id]
+                break
+        result["worker"] = self.workers.get(writer)
+        if result.get("phases"):
+            self.phase_stats.record(result["phases"])
+        self._results.put_nowait(result)
+        self._check_done()
+
+    async def run_batch_stream(self, devices, script, username, password, progress_callback=None, **batch_kwargs):
+        """ Async generator of result dicts, like AutomationEngine.run_batch_stream. Each result
+        also says which worker ran it. Results only arrive while workers are connected. """
+        try:
+            compile_chain(script)
+        except Exception as e:
+            for dev in devices:
+                yield {"ip": dev['ip'], "port": dev['port'], "status": "error", "message": f"Erro no template: {e}"}
+            return
+
+        self._loop = asyncio.get_running_loop()
+        self._progress_callback = progress_callback
+        self._job = {"script": script, "username": username, "password": password, "options": batch_kwargs, "retry_attempts": self.retry_attempts}
+        self._source = iter(devices)
+        self._results = asyncio.Queue()
+        server = await asyncio.start_server(self._handle, self.host, self.port, limit=_LINE_LIMIT)
+        reaper = asyncio.ensure_future(self._reap())
+        try:
+            while True:
+                result = await self._results.get()
+                if result is _DONE:
+                    break
+                yield result
+        finally:
+            reaper.cancel()
+            server.close()
+            # Closing the connections ends the workers' runs and lets each handler return
+            for writer in list(self.workers):
+                writer.close()
+            if self._handlers:
+                await asyncio.wait(list(self._handlers), timeout=5)
+            self._loop = None
+
+    async def run_batch(self, devices, script, username, password, **batch_kwargs):
+        return [result async for result in self.run_batch_stream(devices, script, username, password, **batch_kwargs)]
+
+
+async def run_worker(host, port=DEFAULT_PORT, max_concurrent=5, name=None, token=None, lease_size=None):
+    """ Headless worker: pulls leases from the coordinator and runs them on the local AutomationEngine. """
+    reader, writer = await asyncio.open_connection(host, port, limit=_LINE_LIMIT)
+    await _send(writer, {"type": "hello", "name": name or socket.gethostname(), "token": token})
+    job = await _receive(reader)
+    if not job or job.get("type") != "job":
+        raise Exception((job or {}).get("message", "Coordenador recusou a conexão"))
+
+    bus = ProgressBus()
+    engine = AutomationEngine(max_concurrent=max_concurrent, retry_policy=RetryPolicy(max_attempts=job["retry_attempts"]), progress_bus=bus)
+    replies = asyncio.Queue()
+    keys_by_device = {}  # (ip, port) -> deque of coordinator keys (a list may repeat a device)
+    lease_size = lease_size or max_concurrent
+
+    async def read_loop():
+        while True:
+            try:
+                message = await _receive(reader)
+            except (ConnectionError, OSError, ValueError):
+                message = None
+            if message is None:
+                engine.cancel("hard")  # Coordinator is gone: nobody will take the results
+                await replies.put({"type": "done"})
+                return
+            if message.get("type") == "cancel":
+                engine.cancel(message.get("mode", "graceful"))
+            else:
+                await replies.put(message)
+
+    async def leased_devices():
+        while True:
+            try:
+                await _send(writer, {"type": "lease", "max": lease_size})
+            except (ConnectionError, OSError):
+                return
+            reply = await replies.get()
+            if reply["type"] == "done":
+                return
+            if reply["type"] == "wait":
+                await asyncio.sleep(1)
+                continue
+            for key, dev in reply["devices"]:
+                keys_by_device.setdefault((dev['ip'], str(dev['port'])), deque()).append(key)
+                yield dev
+
+    async def background():
+        interval = job["lease_ttl"] / _HEARTBEATS_PER_TTL
+        last_heartbeat = time.monotonic()
+        while True:
+            await asyncio.sleep(_PROGRESS_TICK_SECONDS)
+            events = bus.drain()
+            if events:
+                await _send(writer, {"type": "progress", "events": [[e.ip, e.kind, e.message] for e in events]})
+            if time.monotonic() - last_heartbeat >= interval:
+                last_heartbeat = time.monotonic()
+                await _send(writer, {"type": "heartbeat"})
+
+    tasks = [asyncio.ensure_future(read_loop()), asyncio.ensure_future(background())]
+    done = 0
+    try:
+        async for result in engine.run_batch_stream(leased_devices(), job["script"], job["username"], job["password"], **job["options"]):
+            key = keys_by_device[(result['ip'], str(result['port']))].popleft()
+            try:
+                await _send(writer, {"type": "result", "key": key, "result": result})
+            except (ConnectionError, OSError):
+                continue  # The lease expires on the coordinator and the device is run elsewhere
+            done += 1
+    finally:
+        for task in tasks:
+            task.cancel()
+        writer.close()
+    return done
+
+
+def _read_devices(path, default_port):
+    """ CSV/TXT with an IP column and an optional port column (',' or ';'), or one IP per line. """
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        sample = f.read(4096)
+        f.seek(0)
+        try:
+            dialect = csv.Sniffer().sniff(sample, delimiters=",;\t")
+        except csv.Error:
+            dialect = csv.excel
+        rows = list(csv.reader(f, dialect))
+    if rows and rows[0] and not rows[0][0].strip()[:1].isdigit():
+        rows = rows[1:]  # Header
+    for row in rows:
+        if row and row[0].strip():
+            yield {"ip": row[0].strip(), "port": (row[1].strip() if len(row) > 1 and row[1].strip() else default_port)}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m core.distributed", description="Execução distribuída em várias máquinas")
+    sub = parser.add_subparsers(dest="mode", required=True)
+
+    worker = sub.add_parser("worker", help="Executa lotes recebidos de um coordenador")
+    worker.add_argument("--host", required=True)
+    worker.add_argument("--port", type=int, default=DEFAULT_PORT)
+    worker.add_argument("--concurrency", type=int, default=5, help="Navegadores simultâneos nesta máquina")
+    worker.add_argument("--name")
+    worker.add_argument("--token", required=True, help="Token exibido pelo coordenador")
+
+    coordinator = sub.add_parser("coordinator", help="Distribui a lista de IPs para os workers conectados")
+    coordinator.add_argument("--template-id", type=int, required=True)
+    coordinator.add_argument("--devices", required=True, help="CSV com colunas IP e Porta")
+    coordinator.add_argument("--default-port", default="80")
+    coordinator.add_argument("--host", default="0.0.0.0")
+    coordinator.add_argument("--port", type=int, default=DEFAULT_PORT)
+    coordinator.add_argument("--lease-size", type=int, default=10)
+    coordinator.add_argument("--lease-ttl", type=int, default=LEASE_TTL_SECONDS)
+    coordinator.add_argument("--browser", default="firefox")
+    coordinator.add_argument("--timeout", type=int, default=15, help="Timeout por ação, em segundos")
+    coordinator.add_argument("--retries", type=int, default=1)
+    coordinator.add_argument("--token", help="Token exigido dos workers (padrão: gerado e exibido)")
+    args = parser.parse_args(argv)
+
+    if args.mode == "worker":
+        done = asyncio.run(run_worker(args.host, args.port, args.concurrency, args.name, args.token))
+        print(f"Worker finalizado: {done} equipamentos processados")
+        return 0
+
+    from database.db_handler import DatabaseHandler
+    template = DatabaseHandler().get_template(args.template_id)
+    if not template:
+        print("Template não encontrado no banco.", file=sys.stderr)
+        return 1
+
+    async def run():
+        coordinator = DistributedCoordinator(args.host, args.port, args.lease_size, args.lease_ttl, args.token, retry_attempts=args.retries)
+        counts = {}
+        async for result in coordinator.run_batch_stream(
+            _read_devices(args.devices, args.default_port), template[5], "admin", "admin",
+            browser_type=args.browser, timeout_ms=args.timeout * 1000, lean=bool(template[6]), cache_assets=True
+        ):
+            counts[result['status']] = counts.get(result['status'], 0) + 1
+            print(json.dumps(result, ensure_ascii=False), flush=True)
+        print(f"Finalizado: {counts}", file=sys.stderr)
+
+    args.token = args.token or secrets.token_urlsafe(16)
+    print(f"Aguardando workers na porta {args.port} (token: {args.token})...", file=sys.stderr)
+    asyncio.run(run())
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,135 @@
+import hashlib
+import re
+from urllib.parse import urljoin
+
+import httpx
+
+# Result status of devices whose fingerprint matched no template rule (never reached a browser)
+UNMATCHED = "unmatched"
+
+# Seconds for each of the two GETs (home page, favicon)
+FINGERPRINT_TIMEOUT = 3.0
+
+# Fields a rule can test: regexes on the page title and Server header, md5 of the favicon
+RULE_FIELDS = ("title", "server", "favicon")
+
+# Ports served over TLS by the usual CPE web interfaces
+_TLS_PORTS = {443, 8443}
+
+_TITLE_RE = re.compile(r"<title[^>]*>(.*?)</title>", re.IGNORECASE | re.DOTALL)
+_LINK_RE = re.compile(r"<link\b[^>]*>", re.IGNORECASE)
+_ATTR_RE = re.compile(r"""\b(rel|href)\s*=\s*(?:"([^"]*)"|'([^']*)'|([^\s>]+))""", re.IGNORECASE)
+_RULE_SPLIT_RE = re.compile(r"[;\n]+")
+_MD5_RE = re.compile(r"^[0-9a-f]{32}$")
+
+# Longest title kept (some firmwares put a whole banner in it)
+_MAX_TITLE = 200
+
+
+def _icon_href(html):
+    """ href of the page's <link rel="icon"> (or "shortcut icon"), or None. """
+    for tag in _LINK_RE.findall(html):
+        attrs = {name.lower(): "".join(values) for name, *values in _ATTR_RE.findall(tag)}
+        if "icon" in attrs.get("rel", "").lower().split() and attrs.get("href"):
+            return attrs["href"]
+    return None
+
+
+class Fingerprinter:
+    """
+    Lightweight HTTP identification of a device: one GET of its home page (redirects
+    followed) and one of its favicon. Yields {"title", "server", "favicon"} (favicon as an
+    md5 hex digest), with None for whatever the device didn't serve.
+    """
+
+    def __init__(self, timeout=FINGERPRINT_TIMEOUT, max_connections=100):
+        self._client = httpx.AsyncClient(
+            verify=False,  # CPEs ship self-signed certificates
+            timeout=timeout,
+            follow_redirects=True,
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+        )
+
+    async def fingerprint(self, ip, port):
+        """ The device's fingerprint, or None when it doesn't answer HTTP at all. """
+        try:
+            port = int(port or 80)
+            scheme = "https" if port in _TLS_PORTS else "http"
+            response = await self._client.get(f"{scheme}://{ip}:{port}/")
+        except (httpx.HTTPError, OSError, ValueError):
+            return None
+        html = response.text
+        match = _TITLE_RE.search(html)
+        title = " ".join(match.group(1).split())[:_MAX_TITLE] if match else None
+        return {
+            "title": title or None,
+            "server": response.headers.get("server"),
+            "favicon": await self._favicon_hash(urljoin(str(response.url), _icon_href(html) or "/favicon.ico")),
+        }
+
+    async def _favicon_hash(self, url):
+        try:
+            response = await self._client.get(url)
+        except (httpx.HTTPError, OSError, ValueError):
+            return None
+        if response.status_code != 200 or not response.content:
+            return None
+        return hashlib.md5(response.content).hexdigest()
+
+    async def close(self):
+        await self._client.aclose()
+
+
+def parse_rule(text):
+    """
+    "title: TP-Link; server: lighttpd" -> [(field, compiled regex), ...]. Conditions are
+    separated by ";" or new lines and all of them must match; title/server are
+    case-insensitive regexes, favicon an md5 hex digest. Raises ValueError with a message for the user.
+    """
+    conditions = []
+    for part in _RULE_SPLIT_RE.split(text or ""):
+        part = part.strip()
+        if not part:
+            continue
+        field, sep, value = part.partition(":")
+        field, value = field.strip().lower(), value.strip()
+        if not sep or field not in RULE_FIELDS or not value:
+            raise ValueError(f"Regra inválida: \"{part}\" (use {', '.join(f + ': ...' for f in RULE_FIELDS)})")
+        if field == "favicon":
+            value = value.lower()
+            if not _MD5_RE.match(value):
+                raise ValueError(f"Hash de favicon inválido: \"{value}\" (md5 em hexadecimal)")
+            conditions.append((field, re.compile(f"^{value}$")))
+            continue
+        try:
+            conditions.append((field, re.compile(value, re.IGNORECASE)))
+        except re.error as e:
+            raise ValueError(f"Expressão inválida em \"{part}\": {e}")
+    return conditions
+
+
+def rule_matches(conditions, fingerprint):
+    """ True when the fingerprint satisfies every condition (an empty rule matches nothing). """
+    if not conditions or not fingerprint:
+        return False
+    return all(fingerprint.get(field) and pattern.search(fingerprint[field]) for field, pattern in conditions)
+
+
+def match_route(fingerprint, routes):
+    """
+    The route whose rule the fingerprint satisfies, or None. routes: dicts with a parsed
+    "conditions" list; the most specific rule (most conditions) wins, then the first listed.
+    """
+    best = None
+    for route in routes:
+        if rule_matches(route["conditions"], fingerprint) and (best is None or len(route["conditions"]) > len(best["conditions"])):
+            best = route
+    return best
+
+
+def describe(fingerprint):
+    """ One line for the device table / log. """
+    if not fingerprint:
+        return "sem resposta HTTP"
+    parts = [f"{field}: {fingerprint[field]}" for field in RULE_FIELDS if fingerprint.get(field)]
+    return ", ".join(parts) or "HTTP sem título/Server/favicon"
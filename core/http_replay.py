@@ -0,0 +1,241 @@
+import asyncio
+import base64
+import http.cookiejar
+import json
+import re
+from urllib.parse import parse_qsl, quote_plus, urlsplit, urlunsplit
+
+import httpx
+
+from core.template_compiler import PLACEHOLDER_RE
+
+RECIPE_VERSION = 1
+
+# Only these requests carry the configuration; static assets are never replayed
+_RECORDED_RESOURCE_TYPES = ("document", "xhr", "fetch")
+# Headers the browser/driver sets itself or the cookie jar manages
+_DROPPED_HEADERS = ("cookie", "host", "content-length", "connection", "accept-encoding", "upgrade-insecure-requests")
+# Characters a token captured from a page/JSON body never contains
+_TOKEN_CHARSET = r"""([^"'&<>\s;,/?=]+)"""
+_MIN_TOKEN_LENGTH = 8
+# Shorter credentials would match unrelated text (a password "1" in every number)
+_MIN_VALUE_LENGTH = 3
+
+
+class ReplayError(Exception):
+    pass
+
+
+def _credential_variants(username, password):
+    """ Placeholder -> value, for every encoding a router UI commonly sends credentials in. """
+    variants = {}
+    for name, value in (("USERNAME", username), ("PASSWORD", password)):
+        value = str(value)
+        variants[name] = value
+        variants[f"{name}_URL"] = quote_plus(value)
+        variants[f"{name}_B64"] = base64.b64encode(value.encode("utf-8")).decode("ascii")
+    variants["BASIC_AUTH"] = base64.b64encode(f"{username}:{password}".encode("utf-8")).decode("ascii")
+    return variants
+
+
+def _replace_values(text, values):
+    """ Swaps literal values for {{NAME}} placeholders, longest value first. """
+    seen = set()
+    for name, value in sorted(values.items(), key=lambda item: -len(item[1])):
+        if len(value) < _MIN_VALUE_LENGTH or value in seen:
+            continue
+        seen.add(value)
+        text = text.replace(value, f"{{{{{name}}}}}")
+    return text
+
+
+def _render(text, values):
+    return PLACEHOLDER_RE.sub(lambda m: str(values.get(m.group(1), m.group(0))), text)
+
+
+class HttpRecorder:
+    """
+    Records the page/XHR requests a template makes during one browser run and turns them
+    into a replayable recipe: device address and credentials become placeholders, and
+    tokens the router hands out (CSRF, session ids in URLs) become extraction rules.
+    """
+
+    def __init__(self, ip, port, username, password):
+        self.ip = str(ip)
+        self.port = str(port)
+        self.username = username
+        self.password = password
+        self._exchanges = []   # [request, status, response headers, response text]
+        self._by_request = {}
+        self._pending = []
+
+    def attach(self, context):
+        context.on("request", self._on_request)
+        context.on("response", self._on_response)
+
+    def _on_request(self, request):
+        if request.resource_type not in _RECORDED_RESOURCE_TYPES:
+            return
+        exchange = [request, None, {}, ""]
+        self._by_request[request] = exchange
+        self._exchanges.append(exchange)
+
+    def _on_response(self, response):
+        exchange = self._by_request.get(response.request)
+        if exchange is not None:
+            self._pending.append(asyncio.ensure_future(self._capture(exchange, response)))
+
+    async def _capture(self, exchange, response):
+        exchange[1] = response.status
+        exchange[2] = dict(response.headers)
+        if 300 <= response.status < 400:
+            return  # Redirect bodies are not available
+        try:
+            exchange[3] = await response.text()
+        except Exception:
+            pass  # Binary or discarded body
+
+    async def finish(self):
+        """ Must be awaited before the context is closed so every response body is captured. """
+        if self._pending:
+            await asyncio.gather(*self._pending, return_exceptions=True)
+        return self.build_recipe()
+
+    def _parameterize_url(self, url):
+        parts = urlsplit(url)
+        netloc = parts.netloc
+        if parts.hostname == self.ip:
+            netloc = "{{IP}}:{{PORT}}" if parts.port or self.port not in ("80", "443") else "{{IP}}"
+        query = _replace_values(parts.query, _credential_variants(self.username, self.password))
+        return urlunsplit((parts.scheme, netloc, parts.path, query, parts.fragment))
+
+    def _parameterize_text(self, text):
+        text = text.replace(f"{self.ip}:{self.port}", "{{IP}}:{{PORT}}").replace(self.ip, "{{IP}}")
+        return _replace_values(text, _credential_variants(self.username, self.password))
+
+    def build_recipe(self):
+        steps = []
+        responses = []
+        for request, status, response_headers, response_text in self._exchanges:
+            if status is None:
+                continue  # Aborted / never answered
+            headers = {k: v for k, v in request.headers.items() if k.lower() not in _DROPPED_HEADERS and not k.startswith(":")}
+            steps.append({
+                "method": request.method,
+                "url": self._parameterize_url(request.url),
+                "headers": {k: self._parameterize_text(v) for k, v in headers.items()},
+                "body": self._parameterize_text(request.post_data or "") or None,
+                "expect_status": status,
+            })
+            header_text = "\n".join(f"{k}: {v}" for k, v in response_headers.items())
+            responses.append((header_text, response_text))
+
+        extract = self._detect_tokens(steps, responses)
+        return {"version": RECIPE_VERSION, "steps": steps, "extract": extract}
+
+    def _detect_tokens(self, steps, responses):
+        """ Values sent by a later request that first appeared in an earlier response
+        (hidden CSRF inputs, tokens in JSON, session ids in URLs) become {{TOKENn}}. """
+        rules = []
+        for index, step in enumerate(steps):
+            for value in self._candidate_values(step):
+                rule = self._find_source(value, index, responses, len(rules))
+                if rule is None:
+                    continue
+                rules.append(rule)
+                placeholder = f"{{{{{rule['name']}}}}}"
+                for later in steps[index:]:
+                    later["url"] = later["url"].replace(value, placeholder)
+                    if later["body"]:
+                        later["body"] = later["body"].replace(value, placeholder)
+                    later["headers"] = {k: v.replace(value, placeholder) for k, v in later["headers"].items()}
+        return rules
+
+    def _candidate_values(self, step):
+        parts = urlsplit(step["url"])
+        values = [v for _, v in parse_qsl(parts.query)]
+        values += re.split(r"[/;=]", parts.path)
+        body = step["body"] or ""
+        try:
+            data = json.loads(body)
+            if isinstance(data, dict):
+                values += [v for v in data.values() if isinstance(v, str)]
+        except ValueError:
+            values += [v for _, v in parse_qsl(body)]
+        values += [v for k, v in step["headers"].items() if re.search(r"csrf|xsrf|token", k, re.I)]
+        return {v for v in values if len(v) >= _MIN_TOKEN_LENGTH and not PLACEHOLDER_RE.search(v)}
+
+    def _find_source(self, value, step_index, responses, rule_count):
+        for source_index in range(step_index - 1, -1, -1):
+            for source, text in (("headers", responses[source_index][0]), ("body", responses[source_index][1])):
+                position = text.find(value)
+                if position < 0:
+                    continue
+                # Anchor the capture on the text right before the value, on the same line
+                left = text[max(0, position - 40):position].split("\n")[-1]
+                if not left:
+                    continue
+                regex = re.escape(left) + _TOKEN_CHARSET
+                match = re.search(regex, text)
+                if match and match.group(1) == value:
+                    return {"name": f"TOKEN{rule_count + 1}", "step": source_index, "source": source, "regex": regex}
+        return None
+
+
+class HttpReplayEngine:
+    """
+    Replays a recorded recipe against one device with a pooled async HTTP client.
+    Redirects are not followed: the browser recorded every hop as its own step.
+    Each device gets its own cookie jar; the shared client's jar refuses every cookie, so
+    sessions never leak between devices (e.g. two ports of one address) nor pile up.
+    """
+
+    def __init__(self, max_connections=100, timeout_ms=15000):
+        self._client = httpx.AsyncClient(
+            verify=False,
+            cookies=http.cookiejar.CookieJar(http.cookiejar.DefaultCookiePolicy(allowed_domains=[])),
+            timeout=timeout_ms / 1000,
+            follow_redirects=False,
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+        )
+
+    async def close(self):
+        await self._client.aclose()
+
+    async def replay(self, recipe, ip, port, username, password):
+        if recipe.get("version") != RECIPE_VERSION:
+            raise ReplayError("Receita HTTP em formato desconhecido. Grave novamente.")
+
+        values = {"IP": str(ip), "PORT": str(port)}
+        values.update(_credential_variants(username, password))
+        rules_by_step = {}
+        for rule in recipe.get("extract", []):
+            rules_by_step.setdefault(rule["step"], []).append(rule)
+
+        cookies = httpx.Cookies()
+        for index, step in enumerate(recipe["steps"]):
+            body = step.get("body")
+            request = self._client.build_request(
+                step["method"],
+                _render(step["url"], values),
+                headers={k: _render(v, values) for k, v in step["headers"].items()},
+                content=_render(body, values).encode("utf-8") if body else None,
+            )
+            cookies.set_cookie_header(request)
+            response = await self._client.send(request)
+            cookies.extract_cookies(response)
+            text = response.text
+            await response.aclose()
+
+            expected = step.get("expect_status")
+            if expected and response.status_code != expected and (response.status_code >= 400 or expected >= 400):
+                raise ReplayError(f"Passo {index + 1} ({step['method']} {request.url.path}): HTTP {response.status_code}, esperado {expected}")
+
+            for rule in rules_by_step.get(index, []):
+                source = text
+                if rule.get("source") == "headers":
+                    source = "\n".join(f"{k}: {v}" for k, v in response.headers.items())
+                match = re.search(rule["regex"], source)
+                if not match:
+                    raise ReplayError(f"Token {rule['name']} não encontrado na resposta do passo {index + 1}")
+                values[rule["name"]] = match.group(1)
@@ -0,0 +1,86 @@
+from fnmatch import fnmatch
+from urllib.parse import urlsplit
+
+# Resource types recorded scripts never interact with
+DEFAULT_BLOCKED_TYPES = ("image", "media", "font")
+
+# Analytics / ads / banner hosts seen on vendor UIs
+DEFAULT_BLOCKED_URLS = (
+    "*google-analytics.com*", "*googletagmanager.com*", "*doubleclick.net*",
+    "*googlesyndication.com*", "*facebook.net*", "*hotjar.com*", "*.ico",
+)
+
+# Injected in every page: no CSS animations/transitions to wait for
+_NO_ANIMATIONS_JS = """
+(() => {
+    const apply = () => {
+        const style = document.createElement('style');
+        style.textContent = '*, *::before, *::after { animation: none !important; transition: none !important; }';
+        (document.head || document.documentElement).appendChild(style);
+    };
+    if (document.documentElement) { apply(); } else { document.addEventListener('DOMContentLoaded', apply); }
+})();
+"""
+
+
+class LeanProfile:
+    """
+    "Lean mode" for router web UIs: small viewport, no animations or service workers, and
+    heavy resource types / analytics URLs aborted through context.route.
+    Bytes saved are estimated from one unblocked reference load per template, whose response
+    sizes are remembered per URL path (the host differs per device, the assets don't).
+    """
+
+    def __init__(self, block_resource_types=DEFAULT_BLOCKED_TYPES, block_url_patterns=DEFAULT_BLOCKED_URLS, viewport=(800, 600)):
+        self.block_resource_types = set(block_resource_types)
+        self.block_url_patterns = tuple(block_url_patterns)
+        self.viewport = viewport
+        self._sizes = {}          # (template_key, path) -> bytes
+        self._calibrated = set()  # template keys that already had their reference load
+
+    def context_options(self):
+        return {
+            "viewport": {"width": self.viewport[0], "height": self.viewport[1]},
+            "reduced_motion": "reduce",
+            "service_workers": "block",
+        }
+
+    def should_block(self, request):
+        if request.is_navigation_request() and request.frame.parent_frame is None:
+            return False  # Never block the page the script navigates to
+        if request.resource_type in self.block_resource_types:
+            return True
+        return any(fnmatch(request.url, pattern) for pattern in self.block_url_patterns)
+
+    async def apply(self, context, template_key):
+        """ Installs the profile on a fresh context. Returns the stats dict it keeps updated. """
+        stats = {"blocked_requests": 0, "bytes_saved": 0}
+        await context.add_init_script(script=_NO_ANIMATIONS_JS)
+
+        if template_key not in self._calibrated:
+            # Reference load: let everything through and learn what blocking would save
+            self._calibrated.add(template_key)
+
+            async def _learn_size(response):
+                if not self.should_block(response.request):
+                    return
+                try:
+                    sizes = await response.request.sizes()
+                    self._sizes[(template_key, urlsplit(response.url).path)] = sizes["responseBodySize"]
+                except Exception:
+                    pass  # Response body discarded (redirect, closed page)
+
+            context.on("response", _learn_size)
+            return stats
+
+        async def _route(route):
+            request = route.request
+            if self.should_block(request):
+                stats["blocked_requests"] += 1
+                stats["bytes_saved"] += self._sizes.get((template_key, urlsplit(request.url).path), 0)
+                await route.abort("blockedbyclient")
+            else:
+                await route.fallback()
+
+        await context.route("**/*", _route)
+        return stats
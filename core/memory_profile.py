@@ -0,0 +1,81 @@
+import statistics
+
+try:
+    import psutil
+except ImportError:  # No suggested maximum then, only the estimate
+    psutil = None
+
+# Used until a browser/template pair has been measured on this machine
+DEFAULT_PER_WORKER_MB = 150
+
+# Left free for the OS, the GUI and the Playwright driver when suggesting a worker count
+RESERVED_MB = 1024
+
+# Floor of a fitted per-worker cost: below it the fit is noise (e.g. a run of cached pages)
+_MIN_PER_WORKER_MB = 20
+
+
+class MemoryProfiler:
+    """
+    Collects (active devices, browser RSS) samples during a batch and fits
+    RSS ~= base_mb + per_worker_mb * active, i.e. the fixed cost (driver, pooled browsers)
+    and what each extra concurrent device adds on this browser and template.
+    """
+
+    def __init__(self):
+        self.samples = []
+
+    def record(self, active, rss_mb):
+        if active > 0 and rss_mb:
+            self.samples.append((active, rss_mb))
+
+    def estimate(self):
+        """ {"base_mb", "per_worker_mb", "peak_mb", "peak_workers", "samples"} or None without samples. """
+        if not self.samples:
+            return None
+        actives = [active for active, _ in self.samples]
+        rss = [mb for _, mb in self.samples]
+        per_worker = None
+        base = 0.0
+        if len(set(actives)) > 1:
+            mean_active = statistics.fmean(actives)
+            mean_rss = statistics.fmean(rss)
+            spread = sum((a - mean_active) ** 2 for a in actives)
+            slope = sum((a - mean_active) * (r - mean_rss) for a, r in zip(actives, rss)) / spread
+            if slope >= _MIN_PER_WORKER_MB:
+                per_worker = slope
+                base = max(0.0, mean_rss - slope * mean_active)
+        if per_worker is None:
+            # Constant concurrency (or a noisy fit): charge everything to the workers, which overestimates
+            per_worker = max(_MIN_PER_WORKER_MB, max(r / a for a, r in self.samples))
+        peak_workers, peak_mb = max(self.samples, key=lambda sample: sample[1])
+        return {
+            "base_mb": round(base, 1),
+            "per_worker_mb": round(per_worker, 1),
+            "peak_mb": round(peak_mb, 1),
+            "peak_workers": peak_workers,
+            "samples": len(self.samples),
+        }
+
+
+def estimate_ram_mb(profile, workers):
+    """ Expected browser RAM (MB) for this many concurrent devices. """
+    if not profile:
+        return workers * DEFAULT_PER_WORKER_MB
+    return profile["base_mb"] + profile["per_worker_mb"] * workers
+
+
+def available_memory_mb():
+    """ RAM (MB) the OS can still hand out, or None without psutil. """
+    if psutil is None:
+        return None
+    return psutil.virtual_memory().available / (1024 * 1024)
+
+
+def suggest_max_workers(profile, available_mb, limit=100):
+    """ Largest worker count whose estimated RAM fits in available_mb minus RESERVED_MB (1..limit). """
+    if available_mb is None:
+        return None
+    base = profile["base_mb"] if profile else 0
+    per_worker = profile["per_worker_mb"] if profile else DEFAULT_PER_WORKER_MB
+    return max(1, min(limit, int((available_mb - RESERVED_MB - base) // per_worker)))
@@ -0,0 +1,256 @@
+import asyncio
+import itertools
+import queue
+import threading
+import time
+from collections import namedtuple
+
+from core.fingerprint import Fingerprinter
+from core.preflight import tcp_probe
+from core.scan_cache import CACHED_REASON
+from core.scan_targets import int_to_ip, ip_to_int
+
+try:
+    import resource
+except ImportError:  # Windows: the proactor loop has no select() limit to respect
+    resource = None
+
+# Connect timeout (seconds) of a scan probe
+SCAN_TIMEOUT = 1.5
+# Connects in flight at once
+SCAN_CONCURRENCY = 2000
+# New connects per second; keeps the scan from flooding a CPE's NAT table or an IDS
+SCAN_RATE = 1000
+
+# HTTP fingerprints fetched at once when the scan identifies the hosts it finds
+FINGERPRINT_CONCURRENCY = 100
+
+# Targets looked up in the scan cache at once, and probe results written to it per transaction
+_CACHE_CHUNK = 1024
+
+# File descriptors left for the rest of the app when capping the concurrency to the process limit
+_FD_RESERVE = 128
+
+_SCAN_DONE = object()
+
+# fingerprint: {"title", "server", "favicon"} of an open host when the scan identifies hosts (see core/fingerprint.py)
+ScanResult = namedtuple("ScanResult", ("ip", "port", "open", "reason", "ms", "fingerprint"), defaults=(None,))
+
+
+def _max_sockets(requested):
+    """ Caps the concurrency to the open-files limit of the process (ulimit -n). """
+    if resource is None:
+        return requested
+    soft, _ = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft == resource.RLIM_INFINITY:
+        return requested
+    return max(1, min(requested, soft - _FD_RESERVE))
+
+
+class RateLimiter:
+    """ Token bucket: at most rate acquire() per second, with bursts of up to burst. """
+
+    def __init__(self, rate, burst=None):
+        self.rate = float(rate)
+        self.capacity = float(burst or max(1, rate / 10))
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+class ScanChannel:
+    """
+    Thread-safe results of a scan running on its own thread. The scanner thread only puts;
+    the GUI drains on its own tick (never touching Tk from the scan thread).
+    """
+
+    def __init__(self, total=None):
+        self.total = total
+        self.probed = 0
+        self.found = 0
+        self.started = time.monotonic()
+        self.error = None
+        self.finished = threading.Event()
+        self._queue = queue.SimpleQueue()
+
+    def put(self, result):
+        self.probed += 1
+        if result.open:
+            self.found += 1
+        self._queue.put(result)
+
+    def drain(self, limit=5000):
+        """ Results that arrived since the last drain, in completion order (at most limit). """
+        items = []
+        try:
+            while len(items) < limit:
+                items.append(self._queue.get_nowait())
+        except queue.Empty:
+            pass
+        return items
+
+    @property
+    def rate(self):
+        """ Probes per second so far. """
+        elapsed = time.monotonic() - self.started
+        return self.probed / elapsed if elapsed > 0 else 0.0
+
+
+class NetworkScanner:
+    """
+    Non-blocking TCP connect scan on asyncio: concurrency connects in flight, started at no
+    more than rate per second. Targets are consumed lazily and results come back in
+    completion order, so a slow host never holds up the others.
+    With fingerprint, every open port also gets a lightweight HTTP GET (title, Server header,
+    favicon hash) before its result is yielded. With a ScanCache (see core/scan_cache.py),
+    targets with a fresh cached result are answered from it without a probe.
+    """
+
+    def __init__(self, concurrency=SCAN_CONCURRENCY, rate=SCAN_RATE, timeout=SCAN_TIMEOUT, fingerprint=False, cache=None):
+        self.concurrency = _max_sockets(concurrency)
+        self.rate = rate
+        self.timeout = timeout
+        self.fingerprint = fingerprint
+        self.cache = cache
+        self.is_cancelled = False
+        self._loop = None
+        self._tasks = []
+
+    async def scan(self, targets):
+        """ Async generator of ScanResult for every (ip, port) of targets (e.g. a TargetSpec; ip as
+        int or str), as each probe finishes. Results always carry the ip as a string. """
+        self.is_cancelled = False
+        self._loop = asyncio.get_running_loop()
+        limiter = RateLimiter(self.rate) if self.rate else None
+        fingerprinter = Fingerprinter(max_connections=FINGERPRINT_CONCURRENCY) if self.fingerprint else None
+        work_queue = asyncio.Queue(maxsize=self.concurrency * 2)
+        results = asyncio.Queue()
+
+        feed_error = []
+        cache = self.cache
+        to_store = []
+
+        async def feeder():
+            try:
+                async for target in self._uncached(targets, results):
+                    if self.is_cancelled:
+                        break
+                    await work_queue.put(target)
+            except Exception as e:
+                feed_error.append(e)  # Re-raised once the probes already queued are done
+            for _ in range(self.concurrency):
+                await work_queue.put(_SCAN_DONE)
+
+        async def prober():
+            try:
+                while True:
+                    target = await work_queue.get()
+                    if target is _SCAN_DONE:
+                        break
+                    if self.is_cancelled:
+                        continue
+                    ip, port = target
+                    if isinstance(ip, int):
+                        ip = int_to_ip(ip)
+                    if limiter:
+                        await limiter.acquire()
+                    reachable, reason, ms = await tcp_probe(ip, port, self.timeout)
+                    fingerprint = await fingerprinter.fingerprint(ip, port) if reachable and fingerprinter else None
+                    results.put_nowait(ScanResult(ip, port, reachable, reason, round(ms, 1), fingerprint))
+            finally:
+                results.put_nowait(_SCAN_DONE)
+
+        self._tasks = [asyncio.ensure_future(feeder())]
+        self._tasks += [asyncio.ensure_future(prober()) for _ in range(self.concurrency)]
+        try:
+            finished = 0
+            while finished < self.concurrency:
+                result = await results.get()
+                if result is _SCAN_DONE:
+                    finished += 1
+                    continue
+                if cache and result.reason != CACHED_REASON:
+                    to_store.append(result)
+                    if len(to_store) >= _CACHE_CHUNK:
+                        await asyncio.to_thread(cache.store, to_store, self.fingerprint)
+                        to_store = []
+                yield result
+            if feed_error:
+                raise feed_error[0]
+        finally:
+            pending = [task for task in self._tasks if not task.done()]
+            for task in pending:
+                task.cancel()
+            if pending:
+                await asyncio.gather(*pending, return_exceptions=True)
+            if fingerprinter:
+                await fingerprinter.close()
+            if to_store:
+                # Results of a cancelled scan are as good as any: the next rescan skips them too
+                await asyncio.to_thread(cache.store, to_store, self.fingerprint)
+            self._tasks = []
+            self._loop = None
+
+    async def _uncached(self, targets, results):
+        """ The targets to probe. Without a cache, all of them; with one, targets with a fresh
+        cached result are put in results as they are (open hosts lacking a fingerprint this
+        scan needs are probed again). """
+        if self.cache is None:
+            for target in targets:
+                yield target
+            return
+        targets = iter(targets)
+        while True:
+            chunk = list(itertools.islice(targets, _CACHE_CHUNK))
+            if not chunk:
+                return
+            addresses = [ip if isinstance(ip, int) else ip_to_int(ip) for ip, _ in chunk]
+            fresh = await asyncio.to_thread(self.cache.lookup, addresses)
+            for (ip, port), address in zip(chunk, addresses):
+                cached = fresh.get((address, int(port)))
+                if cached is None or (cached.open and self.fingerprint and not cached.identified):
+                    yield ip, port
+                else:
+                    ip = ip if isinstance(ip, str) else int_to_ip(ip)
+                    results.put_nowait(ScanResult(ip, port, cached.open, CACHED_REASON, 0.0, cached.fingerprint))
+
+    def cancel(self):
+        """ Stops the scan: queued targets are dropped, probes in flight are abandoned. Safe from any thread. """
+        self.is_cancelled = True
+        loop = self._loop
+        if loop and not loop.is_closed():
+            loop.call_soon_threadsafe(self._cancel_probes)
+
+    def _cancel_probes(self):
+        for task in self._tasks[1:]:
+            task.cancel()
+
+    def start(self, targets, total=None):
+        """ Runs scan(targets) on a background thread with its own event loop. Returns its ScanChannel. """
+        channel = ScanChannel(total)
+
+        async def run():
+            async for result in self.scan(targets):
+                channel.put(result)
+
+        def thread_main():
+            try:
+                asyncio.run(run())
+            except Exception as e:
+                channel.error = e
+            finally:
+                channel.finished.set()
+
+        threading.Thread(target=thread_main, name="network-scanner", daemon=True).start()
+        return channel
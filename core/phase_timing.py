@@ -0,0 +1,100 @@
+import math
+import threading
+import time
+from contextlib import contextmanager
+
+# Phases of one device execution, in order. "first_goto" is the template's first page.goto
+# and is also counted inside "script" (the whole template body).
+PHASES = ("preflight", "fingerprint", "launch", "new_context", "first_goto", "script", "close", "http_replay")
+
+# Histogram buckets grow by 5%: ~300 buckets cover 1ms to 10min with <5% error
+_GROWTH = 1.05
+_BUCKETS = 300
+
+
+class PhaseTimer:
+    """ Monotonic per-phase durations (ms) of a single device execution. """
+
+    __slots__ = ("phases", "_started")
+
+    def __init__(self):
+        self.phases = {}
+        self._started = {}
+
+    def start(self, name):
+        self._started[name] = time.perf_counter()
+
+    def stop(self, name):
+        """ Ends a phase begun with start(); does nothing if it was never started. """
+        start = self._started.pop(name, None)
+        if start is not None:
+            self.add(name, (time.perf_counter() - start) * 1000)
+
+    @contextmanager
+    def phase(self, name):
+        self.start(name)
+        try:
+            yield
+        finally:
+            self.stop(name)
+
+    def add(self, name, ms):
+        self.phases[name] = round(self.phases.get(name, 0.0) + ms, 1)
+
+    def wrap_first_goto(self, page):
+        """ Times the first page.goto the template makes, whatever it navigates to. """
+        original = page.goto
+
+        async def goto(*args, **kwargs):
+            page.goto = original  # Only the first call is measured
+            with self.phase("first_goto"):
+                return await original(*args, **kwargs)
+
+        page.goto = goto
+
+
+class PhaseHistogram:
+    """
+    Per-phase log-bucketed histograms for a whole batch. record() is O(1) and the buckets
+    are preallocated, so percentiles() can be called from another thread (the GUI) mid-run.
+    """
+
+    def __init__(self, phases=PHASES):
+        self._lock = threading.Lock()
+        self._counts = {name: [0] * _BUCKETS for name in phases}
+        self._totals = {name: 0 for name in phases}
+
+    @staticmethod
+    def _bucket(ms):
+        if ms <= 1:
+            return 0
+        return min(_BUCKETS - 1, int(math.log(ms) / math.log(_GROWTH)) + 1)
+
+    def record(self, phases):
+        """ Adds the phases dict of one finished device. """
+        with self._lock:
+            for name, ms in phases.items():
+                counts = self._counts.get(name)
+                if counts is None:
+                    continue
+                counts[self._bucket(ms)] += 1
+                self._totals[name] += 1
+
+    def percentiles(self, quantiles=(50, 95, 99)):
+        """ {phase: {"count": n, "p50": ms, "p95": ms, "p99": ms}} for phases seen so far. """
+        with self._lock:
+            snapshot = {name: (list(counts), self._totals[name]) for name, counts in self._counts.items() if self._totals[name]}
+        report = {}
+        for name, (counts, total) in snapshot.items():
+            entry = {"count": total}
+            for q in quantiles:
+                rank = math.ceil(total * q / 100)
+                seen = 0
+                for index, count in enumerate(counts):
+                    seen += count
+                    if seen >= rank:
+                        # Upper bound of the bucket
+                        entry[f"p{q}"] = round(_GROWTH ** index if index else 1.0, 1)
+                        break
+            report[name] = entry
+        return report
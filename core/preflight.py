@@ -0,0 +1,28 @@
+import asyncio
+import time
+
+# Result status of devices that failed the TCP preflight (never reached a browser)
+UNREACHABLE = "unreachable"
+
+# Probes in flight at once; a TCP connect costs a socket, not a browser
+PREFLIGHT_CONCURRENCY = 256
+
+
+async def tcp_probe(ip, port, timeout):
+    """ Opens and closes a TCP connection to ip:port. Returns (reachable, reason, elapsed_ms). """
+    start = time.perf_counter()
+    try:
+        _, writer = await asyncio.wait_for(asyncio.open_connection(ip, int(port or 80)), timeout)
+    except ConnectionRefusedError:
+        return False, "Conexão recusada", (time.perf_counter() - start) * 1000
+    except asyncio.TimeoutError:
+        return False, f"Sem resposta em {timeout:g}s", (time.perf_counter() - start) * 1000
+    except (OSError, ValueError) as e:
+        return False, str(e), (time.perf_counter() - start) * 1000
+    elapsed = (time.perf_counter() - start) * 1000
+    writer.close()
+    try:
+        await writer.wait_closed()
+    except OSError:
+        pass  # Reset by the device right after the handshake: still reachable
+    return True, None, elapsed
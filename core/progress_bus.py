@@ -0,0 +1,41 @@
+import threading
+import time
+from collections import namedtuple
+
+# Event kinds published by the engine
+STATUS = "status"        # Intermediate step ("Iniciando conexão...")
+RETRY = "retry"          # Attempt failed, device will be retried
+SUCCESS = "success"
+ERROR = "error"
+CANCELLED = "cancelled"
+
+ProgressEvent = namedtuple("ProgressEvent", ("ip", "kind", "message", "at"))
+
+
+class ProgressBus:
+    """
+    Thread-safe channel between the engine (asyncio thread) and the GUI (Tk thread).
+    publish() never blocks and never touches Tk; the consumer drains on its own tick and
+    only gets the latest event per device, so 100 workers cost one batched redraw per tick.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._latest = {}  # ip -> ProgressEvent, insertion order = first change since last drain
+        self.published = 0
+
+    def publish(self, ip, message, kind=STATUS):
+        event = ProgressEvent(ip, kind, str(message), time.monotonic())
+        with self._lock:
+            self._latest[ip] = event
+            self.published += 1
+
+    def __call__(self, ip, message):
+        """ Lets the bus be passed wherever a progress_callback(ip, message) is expected. """
+        self.publish(ip, message)
+
+    def drain(self):
+        """ Returns the latest event of every device that changed since the previous drain. """
+        with self._lock:
+            latest, self._latest = self._latest, {}
+        return list(latest.values())
@@ -0,0 +1,79 @@
+import asyncio
+import random
+import socket
+
+import httpx
+from playwright.async_api import TimeoutError as PlaywrightTimeoutError
+
+# Error classes recorded in result dicts
+CONNECTION_REFUSED = "connection_refused"
+HOST_NOT_FOUND = "host_not_found"  # DNS failure: permanent, never retried
+TIMEOUT = "timeout"
+SELECTOR_NOT_FOUND = "selector_not_found"
+SCRIPT_ERROR = "script_error"
+
+# Network errors as reported by Firefox, Chromium and WebKit navigations
+_REFUSED_MARKERS = (
+    "NS_ERROR_CONNECTION_REFUSED", "ERR_CONNECTION_REFUSED", "Connection refused",
+    "Could not connect", "ECONNREFUSED", "NS_ERROR_NET_RESET", "ERR_CONNECTION_RESET",
+    "ERR_ADDRESS_UNREACHABLE",
+)
+# Name resolution failures (browsers, getaddrinfo): retrying doesn't make the name exist
+_DNS_MARKERS = (
+    "NS_ERROR_UNKNOWN_HOST", "ERR_NAME_NOT_RESOLVED", "Name or service not known",
+    "nodename nor servname", "getaddrinfo failed",
+)
+# Playwright waits that time out because the element never showed up
+_SELECTOR_MARKERS = ("waiting for locator", "waiting for selector", "waiting for get_by", "waiting for element")
+
+
+def _chain(exc):
+    """ The exception and the ones it was raised from (__cause__ / __context__). """
+    seen = set()
+    while exc is not None and id(exc) not in seen:
+        seen.add(id(exc))
+        yield exc
+        exc = exc.__cause__ or exc.__context__
+
+
+def classify_error(exc):
+    """ Maps an exception raised while running a template to one of the error classes above. """
+    message = str(exc)
+    chain = list(_chain(exc))
+    if any(isinstance(e, socket.gaierror) for e in chain) or any(marker in message for marker in _DNS_MARKERS):
+        return HOST_NOT_FOUND
+    # httpx (HTTP replay backend): ConnectError is a refused/unreachable connection, RemoteProtocolError a reset
+    if isinstance(exc, (httpx.ConnectError, httpx.RemoteProtocolError)) \
+            or any(isinstance(e, OSError) and not isinstance(e, TimeoutError) for e in chain) \
+            or any(marker in message for marker in _REFUSED_MARKERS):
+        return CONNECTION_REFUSED
+    lowered = message.lower()
+    if any(marker in lowered for marker in _SELECTOR_MARKERS):
+        return SELECTOR_NOT_FOUND
+    if isinstance(exc, (PlaywrightTimeoutError, asyncio.TimeoutError, TimeoutError)) or ("timeout" in lowered and "exceeded" in lowered) \
+            or "Timeout" in type(exc).__name__:  # httpx.ConnectTimeout / ReadTimeout (HTTP replay backend)
+        return TIMEOUT
+    return SCRIPT_ERROR
+
+
+class RetryPolicy:
+    """
+    Which error classes are retried and how long to wait before the next attempt.
+    The wait doubles per attempt (base_delay, 2*base_delay, ...) up to max_delay and is
+    spread by +/- jitter so a whole subnet of busy ONTs doesn't come back at once.
+    """
+
+    def __init__(self, max_attempts=3, base_delay=2.0, max_delay=60.0, jitter=0.5, retry_on=(CONNECTION_REFUSED, TIMEOUT)):
+        self.max_attempts = max(1, int(max_attempts))
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.jitter = jitter
+        self.retry_on = set(retry_on)
+
+    def should_retry(self, error_class, attempt):
+        return error_class in self.retry_on and attempt < self.max_attempts
+
+    def backoff(self, attempt):
+        """ Seconds to wait after the given (1-based) failed attempt. """
+        delay = min(self.max_delay, self.base_delay * (2 ** (attempt - 1)))
+        return delay * random.uniform(1 - self.jitter, 1 + self.jitter)
@@ -0,0 +1,84 @@
+import queue
+import threading
+import time
+
+_STOP = object()
+
+
+class _NewDevice:
+    """ Queue entry of a device discovered during the run (scan pipeline), journaled before its result. """
+
+    __slots__ = ("dev",)
+
+    def __init__(self, dev):
+        self.dev = dev
+
+
+class RunJournal:
+    """
+    Writes the final result of each device to the runs/run_items journal from a dedicated
+    thread. record() only enqueues; the thread groups everything that arrived within
+    flush_interval (or max_batch results) into one transaction, so 100 devices finishing
+    together cost one commit instead of 100 and the batch loop never waits on disk.
+    """
+
+    def __init__(self, db, run_id, flush_interval=0.5, max_batch=500):
+        self.db = db
+        self.run_id = run_id
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        self.written = 0
+        self.error = None
+        self._queue = queue.SimpleQueue()
+        self._thread = threading.Thread(target=self._run, name=f"run-journal-{run_id}", daemon=True)
+        self._thread.start()
+
+    def record(self, result):
+        self._queue.put(result)
+
+    def add_device(self, dev):
+        """ Adds a device to the run after it started (found by the scanner). Safe from any thread. """
+        self._queue.put(_NewDevice(dev))
+
+    def close(self, status="finished"):
+        """ Flushes what is left and marks the run (finished / cancelled). """
+        self._queue.put(_STOP)
+        self._thread.join()
+        self.db.finish_run(self.run_id, status)
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            batch = []
+            item = self._queue.get()
+            # Everything arriving within flush_interval of the first result joins its transaction
+            deadline = time.monotonic() + self.flush_interval
+            try:
+                while True:
+                    if item is _STOP:
+                        stopping = True
+                        break
+                    batch.append(item)
+                    remaining = deadline - time.monotonic()
+                    if len(batch) >= self.max_batch or remaining <= 0:
+                        break
+                    item = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                pass
+            if batch:
+                self._flush(batch)
+
+    def _flush(self, batch):
+        devices = [item.dev for item in batch if isinstance(item, _NewDevice)]
+        results = [item for item in batch if not isinstance(item, _NewDevice)]
+        try:
+            if devices:
+                # A device always reaches the queue before its result, so it exists before the UPDATE
+                self.db.append_run_devices(self.run_id, devices)
+            if results:
+                self.db.record_run_results(self.run_id, results)
+            self.written += len(results)
+        except Exception as e:
+            # A locked/full disk must not stop the batch; the devices stay 'pending' and are redone on resume
+            self.error = e
+            print(f"Run journal error: {e}")
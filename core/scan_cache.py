@@ -0,0 +1,58 @@
+import json
+import time
+from collections import namedtuple
+
+from core.scan_targets import ip_to_int
+
+# Reason of a ScanResult served from the cache instead of a probe
+CACHED_REASON = "Resultado em cache"
+
+# Results older than this are deleted on the next write, whatever the max age of the scans reading them
+SCAN_CACHE_RETENTION = 24 * 60 * 60
+
+# identified: the cached scan fingerprinted the host (fingerprint may still be None: no HTTP answer)
+CachedResult = namedtuple("CachedResult", ("open", "identified", "fingerprint"))
+
+
+def _consecutive_ranges(addresses):
+    """ [3, 1, 2, 7, 2] -> [(1, 3), (7, 7)] """
+    ranges = []
+    for address in sorted(set(addresses)):
+        if ranges and address == ranges[-1][1] + 1:
+            ranges[-1] = (ranges[-1][0], address)
+        else:
+            ranges.append((address, address))
+    return ranges
+
+
+class ScanCache:
+    """
+    Results of earlier scans in the embedded DB (table scan_results). A scanner with a cache
+    only probes the (ip, port) pairs without a result newer than max_age_minutes: fresh open
+    hosts are reported from the cache and hosts recently confirmed dead are skipped.
+    Every probe result is stored, so the next rescan can use it.
+    """
+
+    def __init__(self, db, max_age_minutes=0):
+        self.db = db
+        self.max_age_minutes = max_age_minutes
+
+    def lookup(self, addresses):
+        """ {(int ip, port): CachedResult} of the fresh results of these int addresses. Each run of
+        consecutive addresses is one range query, so the gaps between scanned ranges are never read. """
+        if self.max_age_minutes <= 0:
+            return {}
+        since = time.time() - self.max_age_minutes * 60
+        return {
+            (ip, port): CachedResult(bool(is_open), fingerprint is not None, json.loads(fingerprint) if fingerprint else None)
+            for ip, port, is_open, fingerprint in self.db.get_scan_results(_consecutive_ranges(addresses), since)
+        }
+
+    def store(self, results, identified=False):
+        """ Saves probe ScanResults; identified: the scan fingerprinted its open hosts. """
+        now = time.time()
+        rows = [
+            (ip_to_int(r.ip), int(r.port), int(r.open), json.dumps(r.fingerprint) if identified and r.open else None, now)
+            for r in results
+        ]
+        self.db.save_scan_results(rows, purge_before=now - SCAN_CACHE_RETENTION)
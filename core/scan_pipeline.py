@@ -0,0 +1,47 @@
+import asyncio
+
+_SCAN_DONE = object()
+
+
+async def discovered_devices(scanner, targets, on_result=None, on_found=None):
+    """
+    Async generator of {"ip", "port"} devices (plus "fingerprint" when the scanner identifies hosts) for run_batch_stream, yielded as soon as the
+    scanner finds each host open, so provisioning starts while the scan is still running.
+    The scan runs as its own task into an unbounded queue: a busy engine never slows it down.
+    A host open on several ports is yielded once, on the first port that answered.
+    on_result(ScanResult) sees every probe; on_found(device) is called before the device is
+    yielded (e.g. to add its row / journal entry ahead of any status of that device).
+    """
+    found = asyncio.Queue()
+    seen = set()
+
+    async def scan():
+        try:
+            async for result in scanner.scan(targets):
+                if on_result:
+                    on_result(result)
+                if result.open and result.ip not in seen:
+                    seen.add(result.ip)
+                    device = {"ip": result.ip, "port": str(result.port)}
+                    if scanner.fingerprint:
+                        device["fingerprint"] = result.fingerprint
+                    if on_found:
+                        on_found(device)
+                    found.put_nowait(device)
+        finally:
+            found.put_nowait(_SCAN_DONE)
+
+    task = asyncio.ensure_future(scan())
+    try:
+        while True:
+            device = await found.get()
+            if device is _SCAN_DONE:
+                break
+            yield device
+        await task  # Surfaces a failed scan
+    finally:
+        if not task.done():
+            # Consumer stopped early (batch cancelled): the scan has no one left to feed
+            scanner.cancel()
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
@@ -0,0 +1,143 @@
+import ipaddress
+import re
+import socket
+import struct
+
+# Separators accepted between items of a target list: commas, semicolons, spaces, new lines
+_SPLIT_RE = re.compile(r"[\s,;]+")
+
+_MAX_PORT = 65535
+
+
+def int_to_ip(value):
+    """ 3232235777 -> "192.168.1.1" (much cheaper than str(IPv4Address)). """
+    return socket.inet_ntoa(struct.pack("!I", value))
+
+
+def ip_to_int(text):
+    return int(ipaddress.IPv4Address(text.strip()))
+
+
+def _parse_item(item, hosts_only=True):
+    """
+    One "10.0.0.0/24", "10.0.0.1-10.0.0.50", "10.0.0.1-50" or "10.0.0.1" as an inclusive (start, end).
+    hosts_only=False keeps a CIDR's network and broadcast addresses (exclusions cover the whole block).
+    """
+    try:
+        if "/" in item:
+            network = ipaddress.IPv4Network(item, strict=False)
+            if hosts_only and network.prefixlen < 31:
+                # Usable hosts only (network.hosts()): the network and broadcast addresses are no device
+                return int(network.network_address) + 1, int(network.broadcast_address) - 1
+            return int(network.network_address), int(network.broadcast_address)
+        if "-" in item:
+            first, last = item.split("-", 1)
+            start = ip_to_int(first)
+            if "." not in last:
+                # Short form: only the last octet of the end address
+                last = first.rsplit(".", 1)[0] + "." + last
+            end = ip_to_int(last)
+        else:
+            start = end = ip_to_int(item)
+    except ValueError:
+        raise ValueError(f"Alvo inválido: \"{item}\" (use 192.168.1.0/24, 192.168.1.10-192.168.1.50 ou 192.168.1.1)")
+    if start > end:
+        raise ValueError(f"Faixa invertida: \"{item}\" (o IP inicial é maior que o final)")
+    return start, end
+
+
+def _merge(intervals):
+    merged = []
+    for start, end in sorted(intervals):
+        if merged and start <= merged[-1][1] + 1:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def _subtract(intervals, excluded):
+    result = []
+    for start, end in intervals:
+        for ex_start, ex_end in excluded:
+            if ex_end < start or ex_start > end:
+                continue
+            if ex_start > start:
+                result.append((start, ex_start - 1))
+            start = ex_end + 1
+            if start > end:
+                break
+        if start <= end:
+            result.append((start, end))
+    return result
+
+
+def parse_intervals(text, hosts_only=True):
+    """ Merged, sorted inclusive (start, end) address intervals of a target list. """
+    return _merge(_parse_item(item, hosts_only) for item in _SPLIT_RE.split(text.strip()) if item)
+
+
+def parse_ports(text):
+    """ "80,8080,443" or "8000-8010" -> ports in the given order, without repeats. """
+    ports = []
+    seen = set()
+    for item in _SPLIT_RE.split(text.strip()):
+        if not item:
+            continue
+        try:
+            if "-" in item:
+                first, last = (int(part) for part in item.split("-", 1))
+            else:
+                first = last = int(item)
+        except ValueError:
+            raise ValueError(f"Porta inválida: \"{item}\"")
+        if not 1 <= first <= last <= _MAX_PORT:
+            raise ValueError(f"Porta fora do intervalo 1-{_MAX_PORT}: \"{item}\"")
+        for port in range(first, last + 1):
+            if port not in seen:
+                seen.add(port)
+                ports.append(port)
+    if not ports:
+        raise ValueError("Informe ao menos uma porta")
+    return ports
+
+
+class TargetSpec:
+    """
+    Scan targets: CIDRs, ranges and single addresses minus exclusions, times a port set.
+    Stored as merged address intervals, so a /12 costs a few tuples; iterating yields
+    (int ip, port) pairs on demand, every port of a host before the next host.
+    """
+
+    def __init__(self, intervals, ports):
+        self.intervals = intervals
+        self.ports = list(ports)
+
+    @classmethod
+    def parse(cls, targets, ports="80", exclude=""):
+        """ Builds a spec from the user's text fields. Raises ValueError with a message for the user. """
+        intervals = parse_intervals(targets)
+        if not intervals:
+            raise ValueError("Informe ao menos um IP, faixa ou rede")
+        if exclude.strip():
+            intervals = _subtract(intervals, parse_intervals(exclude, hosts_only=False))
+        return cls(intervals, parse_ports(ports))
+
+    @property
+    def host_count(self):
+        return sum(end - start + 1 for start, end in self.intervals)
+
+    def __len__(self):
+        return self.host_count * len(self.ports)
+
+    def __iter__(self):
+        ports = self.ports
+        for start, end in self.intervals:
+            for ip in range(start, end + 1):
+                for port in ports:
+                    yield ip, port
+
+    def hosts(self):
+        """ Addresses only (int), for lists that don't probe every port. """
+        for start, end in self.intervals:
+            yield from range(start, end + 1)
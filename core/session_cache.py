@@ -0,0 +1,130 @@
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+import zlib
+
+# Line that separates a template's login steps from its configuration steps
+LOGIN_END_MARKER = "# FIM DO LOGIN"
+
+# Seen on every vendor's login page and (almost) never after it
+LOGIN_FORM_SELECTOR = "input[type=password]"
+
+_PASSWORD_FILL_RE = re.compile(r"\.fill\(.*(password|senha|pass|pwd|\{\{PASSWORD\}\})", re.IGNORECASE)
+_SUBMIT_RE = re.compile(r"\.(click|press)\(")
+
+# The directory is scanned for expired/oversized entries once per this many writes
+_LIMIT_CHECK_EVERY = 100
+
+
+def split_login(script):
+    """
+    Splits a template at LOGIN_END_MARKER into (prelude, rest): the prelude is everything up
+    to the first page.goto (the navigation that lands on the device), the rest is everything
+    after the marker. Returns None when the template has no marker or no top-level goto.
+    """
+    lines = script.split("\n")
+    marker = next((i for i, line in enumerate(lines) if line.strip() == LOGIN_END_MARKER and not line[:1].isspace()), None)
+    if marker is None:
+        return None
+    goto = next((i for i, line in enumerate(lines[:marker]) if "page.goto(" in line and not line[:1].isspace()), None)
+    if goto is None:
+        return None
+    return "\n".join(lines[:goto + 1]), "\n".join(lines[marker + 1:])
+
+
+def suggest_login_end(script):
+    """ Index of the line after which a recorded script's login ends (the submit that follows
+    the password fill), or None. Used to place LOGIN_END_MARKER in freshly recorded templates. """
+    lines = script.split("\n")
+    for i, line in enumerate(lines):
+        if _PASSWORD_FILL_RE.search(line):
+            for j in range(i + 1, min(i + 4, len(lines))):
+                if _SUBMIT_RE.search(lines[j]) and not lines[j][:1].isspace():
+                    return j
+            return None
+    return None
+
+
+class SessionCache:
+    """
+    On-disk cache of Playwright storage_state (cookies + localStorage) per device and vendor,
+    so the next template run on the same ONT can skip the login. One zlib-compressed JSON file
+    per entry; entries expire after ttl seconds and the oldest are dropped past max_bytes.
+    """
+
+    def __init__(self, directory, ttl=30 * 60, max_bytes=16 * 1024 * 1024, max_entry_bytes=256 * 1024):
+        self.directory = directory
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = max_entry_bytes
+        self._puts = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, ip, port, scope):
+        digest = hashlib.sha1(f"{scope}|{ip}:{port}".encode("utf-8")).hexdigest()
+        return os.path.join(self.directory, digest + ".state")
+
+    def get(self, ip, port, scope):
+        path = self._path(ip, port, scope)
+        try:
+            if time.time() - os.path.getmtime(path) > self.ttl:
+                os.remove(path)
+                return None
+            with open(path, "rb") as f:
+                return json.loads(zlib.decompress(f.read()))
+        except (OSError, ValueError, zlib.error):
+            return None
+
+    def put(self, ip, port, scope, state):
+        data = zlib.compress(json.dumps(state, separators=(",", ":")).encode("utf-8"), 6)
+        if len(data) > self.max_entry_bytes:
+            return
+        path = self._path(ip, port, scope)
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp, "wb") as f:
+                f.write(data)
+            os.replace(tmp, path)  # Atomic: shards/threads never read half a file
+        except OSError:
+            return
+        self._puts += 1
+        if self._puts % _LIMIT_CHECK_EVERY == 1:
+            self._enforce_limit()
+
+    def invalidate(self, ip, port, scope):
+        try:
+            os.remove(self._path(ip, port, scope))
+        except OSError:
+            pass
+
+    def _enforce_limit(self):
+        entries = []
+        total = 0
+        now = time.time()
+        for entry in os.scandir(self.directory):
+            if not entry.name.endswith(".state"):
+                continue
+            try:
+                stat = entry.stat()
+            except OSError:
+                continue
+            if now - stat.st_mtime > self.ttl:
+                self._remove(entry.path)
+                continue
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+            total += stat.st_size
+        entries.sort()
+        while total > self.max_bytes and entries:
+            _, size, path = entries.pop(0)
+            self._remove(path)
+            total -= size
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
@@ -0,0 +1,268 @@
+import asyncio
+import multiprocessing
+import queue
+import threading
+
+from core.automation_engine import AutomationEngine
+from core.memory_profile import MemoryProfiler
+from core.phase_timing import PhaseHistogram
+from core.progress_bus import CANCELLED, ERROR, ProgressBus
+from core.template_compiler import compile_chain
+
+# Values of the shared cancel flag
+_RUNNING, _GRACEFUL, _HARD = 0, 1, 2
+
+# How often a shard forwards its coalesced progress events / checks the cancel flag
+_SHARD_TICK_SECONDS = 0.1
+# Blocking queue waits are cut into slices so dead peers and cancellation are noticed
+_POLL_SECONDS = 0.5
+
+# Result message of devices no shard process finished (the process died)
+_LOST_MESSAGE = "Processo encerrado antes de concluir o dispositivo"
+
+
+def _lost_result(ip, port):
+    return {"ip": ip, "port": port, "status": "error", "message": _LOST_MESSAGE}
+
+
+def _split(total, parts):
+    base, extra = divmod(total, parts)
+    return [base + (1 if index < extra else 0) for index in range(parts)]
+
+
+def _shard_main(index, engine_kwargs, batch_kwargs, work_queue, events, cancel_state):
+    """ Entry point of a shard process: its own event loop and AutomationEngine. """
+    try:
+        asyncio.run(_run_shard(index, engine_kwargs, batch_kwargs, work_queue, events, cancel_state))
+    finally:
+        events.put(("done", index))
+
+
+async def _run_shard(index, engine_kwargs, batch_kwargs, work_queue, events, cancel_state):
+    bus = ProgressBus()
+    engine = AutomationEngine(progress_bus=bus, **engine_kwargs)
+
+    async def devices():
+        while True:
+            try:
+                dev = await asyncio.to_thread(work_queue.get, True, _POLL_SECONDS)
+            except queue.Empty:
+                continue
+            if dev is None:
+                return
+            # Lets the parent report the device if this process dies before its result
+            events.put(("taken", (index, dev['ip'], dev['port'])))
+            yield dev
+
+    def forward_progress():
+        pending = bus.drain()
+        if pending:
+            events.put(("progress", [tuple(event) for event in pending]))
+
+    async def watch():
+        seen = _RUNNING
+        while True:
+            await asyncio.sleep(_SHARD_TICK_SECONDS)
+            forward_progress()
+            mode = cancel_state.value
+            if mode > seen:
+                seen = mode
+                engine.cancel("hard" if mode == _HARD else "graceful")
+
+    watcher = asyncio.ensure_future(watch())
+    try:
+        async for result in engine.run_batch_stream(devices(), **batch_kwargs):
+            events.put(("result", (index, result)))
+    finally:
+        watcher.cancel()
+        forward_progress()
+        events.put(("memory", engine.memory_profiler.samples))
+
+
+class ShardedEngine:
+    """
+    Runs a batch across several processes, each with its own event loop and AutomationEngine,
+    so Playwright protocol handling is spread over CPU cores. Devices are pulled by the shards
+    from one shared queue (a busy shard simply takes fewer); results and coalesced progress come
+    back on another. max_concurrent (and memory_ceiling_mb) are global and split across shards,
+    and cancel() reaches every shard.
+    Same batch interface as AutomationEngine (run_batch_stream/run_batch, cancel, phase_percentiles,
+    memory_profile); the memory profile is fitted on the samples of every shard.
+    """
+
+    def __init__(self, shards, max_concurrent=5, progress_bus=None, **engine_kwargs):
+        self.max_concurrent = max_concurrent
+        self.shards = max(1, min(int(shards), max_concurrent))
+        self.progress_bus = progress_bus
+        self.engine_kwargs = engine_kwargs
+        self.is_cancelled = False
+        self.phase_stats = PhaseHistogram()
+        self.memory_profiler = MemoryProfiler()
+        # Spawn: forking a process that runs Tk and Playwright threads is not safe
+        self._mp = multiprocessing.get_context("spawn")
+        self._cancel_state = None
+
+    @property
+    def current_concurrency(self):
+        return self.max_concurrent
+
+    def phase_percentiles(self):
+        return self.phase_stats.percentiles()
+
+    def memory_profile(self):
+        return self.memory_profiler.estimate()
+
+    def cancel(self, mode="graceful"):
+        """ Stops the batch on every shard. Safe to call from any thread. """
+        self.is_cancelled = True
+        state = self._cancel_state
+        if state is not None:
+            with state.get_lock():
+                state.value = max(state.value, _HARD if mode == "hard" else _GRACEFUL)
+
+    def _shard_engine_kwargs(self):
+        kwargs_per_shard = []
+        ceilings = None
+        if self.engine_kwargs.get("memory_ceiling_mb"):
+            ceilings = _split(int(self.engine_kwargs["memory_ceiling_mb"]), self.shards)
+        minimums = _split(int(self.engine_kwargs.get("min_concurrent", 1)), self.shards)
+        for index, limit in enumerate(_split(self.max_concurrent, self.shards)):
+            kwargs = dict(self.engine_kwargs, max_concurrent=limit, min_concurrent=max(1, minimums[index]))
+            if ceilings:
+                kwargs["memory_ceiling_mb"] = ceilings[index]
+            kwargs_per_shard.append(kwargs)
+        return kwargs_per_shard
+
+    async def run_batch_stream(self, devices, script, username, password, progress_callback=None, **batch_kwargs):
+        """ Async generator of result dicts, like AutomationEngine.run_batch_stream. """
+        try:
+            compile_chain(script)
+        except Exception as e:
+            for dev in devices:
+                yield {"ip": dev['ip'], "port": dev['port'], "status": "error", "message": f"Erro no template: {e}"}
+            return
+
+        self._cancel_state = self._mp.Value("i", _RUNNING)
+        work_queue = self._mp.Queue(maxsize=self.max_concurrent * 2)
+        events = self._mp.Queue()
+        batch_kwargs = dict(batch_kwargs, script=script, username=username, password=password)
+        processes = [
+            self._mp.Process(target=_shard_main, args=(index, kwargs, batch_kwargs, work_queue, events, self._cancel_state), daemon=True)
+            for index, kwargs in enumerate(self._shard_engine_kwargs())
+        ]
+        for process in processes:
+            process.start()
+
+        def shards_alive():
+            return any(process.is_alive() for process in processes)
+
+        def feed():
+            try:
+                for dev in devices:
+                    if self.is_cancelled:
+                        # Never handed to a shard: reported from here
+                        events.put(("progress", [(dev['ip'], CANCELLED, "Cancelado", None)]))
+                        events.put(("result", (None, {"ip": dev['ip'], "port": dev['port'], "status": "cancelled", "message": "Operação cancelada pelo usuário"})))
+                        continue
+                    while True:
+                        if not shards_alive():
+                            # Every shard died: nobody will ever take this device
+                            events.put(("progress", [(dev['ip'], ERROR, f"Erro: {_LOST_MESSAGE}", None)]))
+                            events.put(("result", (None, _lost_result(dev['ip'], dev['port']))))
+                            break
+                        try:
+                            work_queue.put(dev, True, _POLL_SECONDS)
+                            break
+                        except queue.Full:
+                            pass
+            finally:
+                events.put(("done", "feeder"))
+                for _ in processes:
+                    while shards_alive():
+                        try:
+                            work_queue.put(None, True, _POLL_SECONDS)
+                            break
+                        except queue.Full:
+                            pass
+
+        threading.Thread(target=feed, daemon=True).start()
+
+        finished = set()
+        expected = len(processes) + 1  # Every shard and the feeder
+        # Devices each shard took and hasn't returned a result for: {index: {(ip, port): count}}
+        taken = {index: {} for index in range(len(processes))}
+
+        def report(ip, event_kind, message):
+            if progress_callback:
+                progress_callback(ip, message)
+            if self.progress_bus is not None:
+                self.progress_bus.publish(ip, message, event_kind)
+
+        def lost_results(index):
+            """ Error results for the devices a finished shard never returned. """
+            lost = []
+            for (ip, port), count in taken[index].items():
+                report(ip, ERROR, f"Erro: {_LOST_MESSAGE}")
+                lost.extend(_lost_result(ip, port) for _ in range(count))
+            taken[index].clear()
+            return lost
+
+        try:
+            while len(finished) < expected:
+                try:
+                    kind, payload = await asyncio.to_thread(events.get, True, _POLL_SECONDS)
+                except queue.Empty:
+                    # A shard that crashed never reports "done"
+                    for index, process in enumerate(processes):
+                        if index not in finished and not process.is_alive() and process.exitcode not in (0, None):
+                            finished.add(index)
+                            for result in lost_results(index):
+                                yield result
+                    continue
+                if kind == "taken":
+                    index, ip, port = payload
+                    key = (ip, str(port))
+                    taken[index][key] = taken[index].get(key, 0) + 1
+                elif kind == "result":
+                    index, result = payload
+                    if index is not None:
+                        key = (result['ip'], str(result['port']))
+                        if taken[index].get(key, 0) > 1:
+                            taken[index][key] -= 1
+                        else:
+                            taken[index].pop(key, None)
+                    if result.get("phases"):
+                        self.phase_stats.record(result["phases"])
+                    yield result
+                elif kind == "progress":
+                    for ip, event_kind, message, _ in payload:
+                        report(ip, event_kind, message)
+                elif kind == "memory":
+                    self.memory_profiler.samples.extend(payload)
+                elif kind == "done":
+                    finished.add(payload)
+                    if payload in taken:
+                        # A shard whose engine raised still reports "done", without the devices it held
+                        for result in lost_results(payload):
+                            yield result
+            # Devices still queued once every shard is gone were never taken by any of them
+            while True:
+                try:
+                    dev = work_queue.get_nowait()
+                except queue.Empty:
+                    break
+                if dev is not None:
+                    report(dev['ip'], ERROR, f"Erro: {_LOST_MESSAGE}")
+                    yield _lost_result(dev['ip'], dev['port'])
+        finally:
+            if len(finished) < expected:
+                # Consumer stopped early: stop the shards too
+                self.cancel("hard")
+            for process in processes:
+                await asyncio.to_thread(process.join, 15)
+                if process.is_alive():
+                    process.terminate()
+            self._cancel_state = None
+
+    async def run_batch(self, devices, script, username, password, **batch_kwargs):
+        return [result async for result in self.run_batch_stream(devices, script, username, password, **batch_kwargs)]
@@ -0,0 +1,169 @@
+import asyncio
+import builtins
+import hashlib
+import io
+import re
+import tokenize
+import types
+
+# {{NAME}} placeholders as written in the stored template
+PLACEHOLDER_RE = re.compile(r"\{\{([A-Za-z_][A-Za-z0-9_]*)\}\}")
+# Inside an f-string, {{NAME}} is an escaped brace and evaluates to {NAME}
+_FSTRING_BOUND_RE = re.compile(r"\{\{([A-Za-z_][A-Za-z0-9_]*)\}\}|\{([A-Za-z_][A-Za-z0-9_]*)\}")
+
+_BIND_FUNC = "__tpl_bind__"
+_BIND_VARS = "__tpl_vars__"
+
+# Compiled templates, keyed by the sha256 of actions_script
+_cache = {}
+_CACHE_LIMIT = 64
+
+
+def _bind(text, values, fstring=False):
+    """ Runtime replacement of placeholders inside a string literal of the template. """
+    def _sub(match):
+        name = match.group(1) or match.group(2)
+        if name in values:
+            return str(values[name])
+        return match.group(0)
+    return (_FSTRING_BOUND_RE if fstring else PLACEHOLDER_RE).sub(_sub, text)
+
+
+def _string_groups(source):
+    """ Returns the string literals (f-strings included) of source as groups of (start, end, is_fstring)
+    offsets. Implicitly concatenated literals ("a" "b") come back as one group. """
+    line_offsets = [0]
+    for line in source.splitlines(keepends=True):
+        line_offsets.append(line_offsets[-1] + len(line))
+
+    def offset(pos):
+        return line_offsets[pos[0] - 1] + pos[1]
+
+    groups = []
+    adjacent = False
+    fstring_start = None
+    fstring_depth = 0
+    for tok in tokenize.generate_tokens(io.StringIO(source).readline):
+        tok_name = tokenize.tok_name[tok.type]
+        span = None
+        # Python 3.12+ splits f-strings into FSTRING_START ... FSTRING_END
+        if tok_name == "FSTRING_START":
+            if fstring_depth == 0:
+                fstring_start = tok.start
+            fstring_depth += 1
+            continue
+        elif tok_name == "FSTRING_END":
+            fstring_depth -= 1
+            if fstring_depth == 0:
+                span = (offset(fstring_start), offset(tok.end), True)
+        elif fstring_depth:
+            continue
+        elif tok.type == tokenize.STRING:
+            prefix = re.match(r"[A-Za-z]*", tok.string).group(0).lower()
+            span = (offset(tok.start), offset(tok.end), "f" in prefix)
+        elif tok.type in (tokenize.NL, tokenize.COMMENT):
+            continue  # Line breaks inside brackets keep literals adjacent
+        else:
+            adjacent = False
+            continue
+
+        if adjacent:
+            groups[-1].append(span)
+        else:
+            groups.append([span])
+        adjacent = True
+    return groups
+
+
+def _bind_literals(source, group):
+    """ The source of one group of concatenated literals, each piece holding a {{VAR}} wrapped in a bind call. """
+    start, end = group[0][0], group[-1][1]
+    if not PLACEHOLDER_RE.search(source[start:end]) or "b" in re.match(r"[A-Za-z]*", source[start:end]).group(0).lower():
+        return source[start:end]  # Bytes literals cannot be bound
+    parts = []
+    position = start
+    for piece_start, piece_end, fstring in group:
+        if piece_start > start:
+            # Line breaks and comments between the pieces stay, so line numbers don't move
+            parts.append(source[position:piece_start] + " + ")
+        literal = source[piece_start:piece_end]
+        if PLACEHOLDER_RE.search(literal):
+            literal = f"{_BIND_FUNC}({literal}, {_BIND_VARS}, {fstring})"
+        parts.append(literal)
+        position = piece_end
+    # "+" replaces the implicit concatenation; the parentheses keep the group a single operand
+    return f"({''.join(parts)})"
+
+
+def _bind_placeholders(source):
+    """ Wraps every string literal holding a {{VAR}} in a runtime bind call and turns a bare
+    {{VAR}} in code into a variable lookup, so the values never end up in the compiled source. """
+    bound = []
+    position = 0
+    for group in _string_groups(source):
+        bound.append(PLACEHOLDER_RE.sub(rf'{_BIND_VARS}["\1"]', source[position:group[0][0]]))
+        bound.append(_bind_literals(source, group))
+        position = group[-1][1]
+    bound.append(PLACEHOLDER_RE.sub(rf'{_BIND_VARS}["\1"]', source[position:]))
+    return "".join(bound)
+
+
+class CompiledTemplate:
+    """ actions_script compiled once into a run_automation code object. Each device only
+    supplies its variables; the function is rebound to per-device globals. """
+
+    def __init__(self, script):
+        self.key = hashlib.sha256(script.encode("utf-8")).hexdigest()
+        self.placeholders = sorted(set(PLACEHOLDER_RE.findall(script)))
+
+        script_lines = "\n".join([f"    {line}" for line in script.splitlines()])
+        wrapped_script = f"async def run_automation(page):\n{script_lines}"
+        try:
+            wrapped_script = _bind_placeholders(wrapped_script)
+        except (tokenize.TokenError, IndentationError):
+            pass  # Let compile() report the real syntax error below
+
+        module_code = compile(wrapped_script, f"<template {self.key[:12]}>", "exec")
+        # The module body only defines run_automation; pull its code object out once
+        namespace = {}
+        exec(module_code, namespace)
+        self.code = namespace["run_automation"].__code__
+
+    def bind(self, variables, **env):
+        """ Returns a run_automation(page) coroutine function bound to this device's variables. """
+        template_globals = {
+            "__builtins__": builtins,
+            "asyncio": asyncio,
+            "re": re,
+            _BIND_FUNC: _bind,
+            _BIND_VARS: variables,
+            # Same {{VAR}} keyed dict the scripts always received
+            "variables": {f"{{{{{k}}}}}": v for k, v in variables.items()},
+        }
+        template_globals.update(env)
+        return types.FunctionType(self.code, template_globals, "run_automation")
+
+
+def compile_template(script):
+    """ Returns the CompiledTemplate for script, compiling it only the first time. """
+    key = hashlib.sha256(script.encode("utf-8")).hexdigest()
+    compiled = _cache.get(key)
+    if compiled is None:
+        compiled = CompiledTemplate(script)
+        if len(_cache) >= _CACHE_LIMIT:
+            _cache.pop(next(iter(_cache)))
+        _cache[key] = compiled
+    return compiled
+
+
+def template_steps(script):
+    """ A template chain is a list of {"id", "name", "script"} steps run in order on one page;
+    a plain script is a chain of one step. """
+    if isinstance(script, str):
+        return [{"id": None, "name": None, "script": script}]
+    return list(script)
+
+
+def compile_chain(script):
+    """ CompiledTemplate of every step of template_steps(script), in order. """
+    return [compile_template(step["script"]) for step in template_steps(script)]
@@ -1,5 +1,7 @@
 import sqlite3
 import os
+import json
+import time
 
 class DatabaseHandler:
     def __init__(self, db_name='bot_templates.db'):
@@ -26,28 +28,106 @@ class DatabaseHandler:
                 actions_script TEXT NOT NULL
             )
         ''')
+        # Columns added after the first release: migrate older databases in place
+        columns = [col[1] for col in cursor.execute('PRAGMA table_info(templates)').fetchall()]
+        if 'lean_mode' not in columns:
+            # Lean mode (blocked images/fonts/analytics, small viewport) changes what the page renders:
+            # templates recorded before it existed stay off, only new ones default to on (save_template)
+            cursor.execute('ALTER TABLE templates ADD COLUMN lean_mode INTEGER NOT NULL DEFAULT 0')
+        if 'fingerprint' not in columns:
+            # Rule matched against the scanner's HTTP fingerprint to route devices (see core/fingerprint.py)
+            cursor.execute("ALTER TABLE templates ADD COLUMN fingerprint TEXT NOT NULL DEFAULT ''")
+        # Browserless HTTP recipes recorded from a template run (see core/http_replay.py)
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS http_recipes (
+                template_id INTEGER PRIMARY KEY,
+                recipe TEXT NOT NULL,
+                recorded_at REAL NOT NULL
+            )
+        ''')
+        # Run journal: every device of a batch and its final status, so a crashed run can resume
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS runs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                template_id INTEGER NOT NULL,
+                started_at REAL NOT NULL,
+                finished_at REAL,
+                status TEXT NOT NULL DEFAULT 'running',
+                total INTEGER NOT NULL
+            )
+        ''')
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS run_items (
+                run_id INTEGER NOT NULL,
+                seq INTEGER NOT NULL,
+                ip TEXT NOT NULL,
+                port TEXT NOT NULL,
+                status TEXT NOT NULL DEFAULT 'pending',
+                message TEXT,
+                error_class TEXT,
+                attempts INTEGER,
+                finished_at REAL,
+                PRIMARY KEY (run_id, seq)
+            )
+        ''')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_run_items_ip ON run_items (run_id, ip)')
+        # Measured browser RAM per browser type and template (see core/memory_profile.py)
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS memory_profiles (
+                browser_type TEXT NOT NULL,
+                template_id INTEGER NOT NULL,
+                base_mb REAL NOT NULL,
+                per_worker_mb REAL NOT NULL,
+                peak_mb REAL NOT NULL,
+                peak_workers INTEGER NOT NULL,
+                samples INTEGER NOT NULL,
+                updated_at REAL NOT NULL,
+                PRIMARY KEY (browser_type, template_id)
+            )
+        ''')
+        # Results of earlier network scans, reused by rescans within their max age (see core/scan_cache.py).
+        # ip is the IPv4 address as an integer so a scanned range is one index range;
+        # fingerprint is NULL when the scan didn't identify hosts
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS scan_results (
+                ip INTEGER NOT NULL,
+                port INTEGER NOT NULL,
+                open INTEGER NOT NULL,
+                fingerprint TEXT,
+                scanned_at REAL NOT NULL,
+                PRIMARY KEY (ip, port)
+            )
+        ''')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_scan_results_scanned_at ON scan_results (scanned_at)')
+        # WAL: journal flushes don't block the GUI reading templates, and survive a power loss
+        cursor.execute('PRAGMA journal_mode=WAL')
         conn.commit()
         conn.close()
 
-    def save_template(self, vendor, model, firmware, hardware, script):
+    def save_template(self, vendor, model, firmware, hardware, script, lean_mode=True, fingerprint=""):
         conn = sqlite3.connect(self.db_path)
         cursor = conn.cursor()
         cursor.execute('''
-            INSERT INTO templates (vendor, model, firmware, hardware, actions_script)
-            VALUES (?, ?, ?, ?, ?)
-        ''', (vendor, model, firmware, hardware, script))
+            INSERT INTO templates (vendor, model, firmware, hardware, actions_script, lean_mode, fingerprint)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        ''', (vendor, model, firmware, hardware, script, int(bool(lean_mode)), fingerprint or ""))
         conn.commit()
         conn.commit()
         conn.close()
 
-    def update_template(self, template_id, vendor, model, firmware, hardware, script):
+    def update_template(self, template_id, vendor, model, firmware, hardware, script, lean_mode=True, fingerprint=""):
         conn = sqlite3.connect(self.db_path)
         cursor = conn.cursor()
+        # A recorded HTTP recipe no longer matches once the script changes
+        cursor.execute('''
+            DELETE FROM http_recipes WHERE template_id = ?
+            AND (SELECT actions_script FROM templates WHERE id = ?) != ?
+        ''', (template_id, template_id, script))
         cursor.execute('''
             UPDATE templates 
-            SET vendor = ?, model = ?, firmware = ?, hardware = ?, actions_script = ?
+            SET vendor = ?, model = ?, firmware = ?, hardware = ?, actions_script = ?, lean_mode = ?, fingerprint = ?
             WHERE id = ?
-        ''', (vendor, model, firmware, hardware, script, template_id))
+        ''', (vendor, model, firmware, hardware, script, int(bool(lean_mode)), fingerprint or "", template_id))
         conn.commit()
         conn.close()
 
@@ -55,13 +135,14 @@ class DatabaseHandler:
         conn = sqlite3.connect(self.db_path)
         cursor = conn.cursor()
         cursor.execute('DELETE FROM templates WHERE id = ?', (template_id,))
+        cursor.execute('DELETE FROM http_recipes WHERE template_id = ?', (template_id,))
         conn.commit()
         conn.close()
 
     def get_all_templates(self):
         conn = sqlite3.connect(self.db_path)
         cursor = conn.cursor()
-        cursor.execute('SELECT id, vendor, model, firmware, hardware, actions_script FROM templates')
+        cursor.execute('SELECT id, vendor, model, firmware, hardware, actions_script, lean_mode, fingerprint FROM templates')
         rows = cursor.fetchall()
         conn.close()
         return rows
@@ -69,7 +150,181 @@ class DatabaseHandler:
     def get_template(self, template_id):
         conn = sqlite3.connect(self.db_path)
         cursor = conn.cursor()
-        cursor.execute('SELECT * FROM templates WHERE id = ?', (template_id,))
+        cursor.execute('SELECT id, vendor, model, firmware, hardware, actions_script, lean_mode, fingerprint FROM templates WHERE id = ?', (template_id,))
         row = cursor.fetchone()
         conn.close()
         return row
+
+    def get_fingerprint_routes(self):
+        """ Templates with a fingerprint rule, as run_batch_stream routes (oldest template first). """
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        cursor.execute("SELECT id, vendor, model, actions_script, lean_mode, fingerprint FROM templates WHERE TRIM(fingerprint) != '' ORDER BY id")
+        rows = cursor.fetchall()
+        conn.close()
+        return [
+            {"template_id": row[0], "name": f"{row[1]} {row[2]}", "vendor": row[1], "script": row[3], "lean": bool(row[4]), "rule": row[5]}
+            for row in rows
+        ]
+
+    def save_http_recipe(self, template_id, recipe):
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        cursor.execute('''
+            INSERT OR REPLACE INTO http_recipes (template_id, recipe, recorded_at)
+            VALUES (?, ?, ?)
+        ''', (template_id, json.dumps(recipe), time.time()))
+        conn.commit()
+        conn.close()
+
+    def get_http_recipe(self, template_id):
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        cursor.execute('SELECT recipe FROM http_recipes WHERE template_id = ?', (template_id,))
+        row = cursor.fetchone()
+        conn.close()
+        return json.loads(row[0]) if row else None
+
+    def save_memory_profile(self, browser_type, template_id, profile):
+        """ Blends a batch's measured profile into the stored one, weighted by sample count
+        (capped, so the profile follows firmware/browser updates instead of freezing). """
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        cursor.execute('SELECT base_mb, per_worker_mb, peak_mb, peak_workers, samples FROM memory_profiles WHERE browser_type = ? AND template_id = ?', (browser_type, template_id))
+        row = cursor.fetchone()
+        base, per_worker, peak, peak_workers, samples = profile["base_mb"], profile["per_worker_mb"], profile["peak_mb"], profile["peak_workers"], profile["samples"]
+        if row:
+            old_weight = min(row[4], 100)
+            total = old_weight + samples
+            base = (row[0] * old_weight + base * samples) / total
+            per_worker = (row[1] * old_weight + per_worker * samples) / total
+            if row[2] > peak:
+                peak, peak_workers = row[2], row[3]
+            samples = row[4] + samples
+        cursor.execute('''
+            INSERT OR REPLACE INTO memory_profiles (browser_type, template_id, base_mb, per_worker_mb, peak_mb, peak_workers, samples, updated_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        ''', (browser_type, template_id, base, per_worker, peak, peak_workers, samples, time.time()))
+        conn.commit()
+        conn.close()
+
+    def get_memory_profile(self, browser_type, template_id):
+        """ Stored profile of the template on that browser; falls back to the browser's average
+        over the other templates. None when the browser was never measured here. """
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        cursor.execute('SELECT base_mb, per_worker_mb, peak_mb, peak_workers, samples FROM memory_profiles WHERE browser_type = ? AND template_id = ?', (browser_type, template_id))
+        row = cursor.fetchone()
+        measured = "template"
+        if not row:
+            cursor.execute('SELECT AVG(base_mb), AVG(per_worker_mb), MAX(peak_mb), MAX(peak_workers), SUM(samples) FROM memory_profiles WHERE browser_type = ?', (browser_type,))
+            row = cursor.fetchone()
+            measured = "browser"
+        conn.close()
+        if not row or row[4] is None:
+            return None
+        return {"base_mb": row[0], "per_worker_mb": row[1], "peak_mb": row[2], "peak_workers": row[3], "samples": row[4], "measured": measured}
+
+    def create_run(self, template_id, devices):
+        """ Journals a new batch with every device as 'pending'. Returns the run id. """
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        cursor.execute('INSERT INTO runs (template_id, started_at, total) VALUES (?, ?, 0)', (template_id, time.time()))
+        run_id = cursor.lastrowid
+        cursor.executemany(
+            'INSERT INTO run_items (run_id, seq, ip, port) VALUES (?, ?, ?, ?)',
+            ((run_id, seq, dev['ip'], str(dev['port'])) for seq, dev in enumerate(devices))
+        )
+        cursor.execute('UPDATE runs SET total = (SELECT COUNT(*) FROM run_items WHERE run_id = ?) WHERE id = ?', (run_id, run_id))
+        conn.commit()
+        conn.close()
+        return run_id
+
+    def append_run_devices(self, run_id, devices):
+        """ Adds devices found after the run started (scan pipeline) as 'pending'. """
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        cursor.execute('SELECT COALESCE(MAX(seq), -1) + 1 FROM run_items WHERE run_id = ?', (run_id,))
+        first_seq = cursor.fetchone()[0]
+        cursor.executemany(
+            'INSERT INTO run_items (run_id, seq, ip, port) VALUES (?, ?, ?, ?)',
+            ((run_id, first_seq + offset, dev['ip'], str(dev['port'])) for offset, dev in enumerate(devices))
+        )
+        cursor.execute('UPDATE runs SET total = total + ? WHERE id = ?', (len(devices), run_id))
+        conn.commit()
+        conn.close()
+
+    def record_run_results(self, run_id, results):
+        """ Group commit: final status of many devices in one transaction. """
+        now = time.time()
+        conn = sqlite3.connect(self.db_path)
+        conn.execute('PRAGMA synchronous=NORMAL')
+        cursor = conn.cursor()
+        cursor.executemany('''
+            UPDATE run_items SET status = ?, message = ?, error_class = ?, attempts = ?, finished_at = ?
+            WHERE run_id = ? AND ip = ? AND port = ? AND status != 'success'
+        ''', [(r['status'], r.get('message'), r.get('error_class'), r.get('attempts'), now, run_id, r['ip'], str(r['port'])) for r in results])
+        conn.commit()
+        conn.close()
+
+    def finish_run(self, run_id, status):
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        cursor.execute('UPDATE runs SET status = ?, finished_at = ? WHERE id = ?', (status, time.time(), run_id))
+        conn.commit()
+        conn.close()
+
+    def get_resumable_runs(self):
+        """ Runs with devices not configured yet: (id, template_id, started_at, status, total, done), newest first. """
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT r.id, r.template_id, r.started_at, r.status, r.total,
+                   (SELECT COUNT(*) FROM run_items i WHERE i.run_id = r.id AND i.status = 'success') AS done
+            FROM runs r
+            WHERE EXISTS (SELECT 1 FROM run_items i WHERE i.run_id = r.id AND i.status != 'success')
+            ORDER BY r.id DESC
+        ''')
+        rows = cursor.fetchall()
+        conn.close()
+        return rows
+
+    def get_run_pending_devices(self, run_id):
+        """ Devices of a run not marked success, in their original order. """
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        cursor.execute("SELECT ip, port FROM run_items WHERE run_id = ? AND status != 'success' ORDER BY seq", (run_id,))
+        rows = cursor.fetchall()
+        conn.close()
+        return [{"ip": ip, "port": port} for ip, port in rows]
+
+    def reopen_run(self, run_id):
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        cursor.execute("UPDATE runs SET status = 'running', finished_at = NULL WHERE id = ?", (run_id,))
+        conn.commit()
+        conn.close()
+
+    def save_scan_results(self, rows, purge_before=None):
+        """ Group commit of (ip int, port, open, fingerprint json, scanned_at) rows; rows scanned
+        before purge_before are deleted in the same transaction. """
+        conn = sqlite3.connect(self.db_path)
+        conn.execute('PRAGMA synchronous=NORMAL')
+        cursor = conn.cursor()
+        cursor.executemany('INSERT OR REPLACE INTO scan_results (ip, port, open, fingerprint, scanned_at) VALUES (?, ?, ?, ?, ?)', rows)
+        if purge_before is not None:
+            cursor.execute('DELETE FROM scan_results WHERE scanned_at < ?', (purge_before,))
+        conn.commit()
+        conn.close()
+
+    def get_scan_results(self, ranges, since):
+        """ (ip int, port, open, fingerprint json) of the results scanned after since, for each
+        inclusive (start_ip, end_ip) range; one primary-key range scan per range. """
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        rows = []
+        for start_ip, end_ip in ranges:
+            cursor.execute('SELECT ip, port, open, fingerprint FROM scan_results WHERE ip BETWEEN ? AND ? AND scanned_at >= ?', (start_ip, end_ip, since))
+            rows.extend(cursor.fetchall())
+        conn.close()
+        return rows
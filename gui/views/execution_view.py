@@ -4,10 +4,30 @@ import threading
 import asyncio
 import pandas as pd
 import json
+import os
+import secrets
 import socket
-from concurrent.futures import ThreadPoolExecutor
+import time
 
 from core.automation_engine import AutomationEngine
+from core.fingerprint import UNMATCHED, describe
+from core.memory_profile import available_memory_mb, estimate_ram_mb, suggest_max_workers
+from core.network_scanner import SCAN_RATE, NetworkScanner, ScanChannel
+from core.scan_cache import CACHED_REASON, ScanCache
+from core.scan_pipeline import discovered_devices
+from core.scan_targets import TargetSpec, int_to_ip
+from core.progress_bus import ProgressBus
+from core.distributed import DEFAULT_PORT, DistributedCoordinator
+from core.sharded_engine import ShardedEngine
+from core.retry_policy import RetryPolicy
+from core.run_journal import RunJournal
+from core.session_cache import SessionCache
+
+# How often (ms) queued progress events are applied to the table
+PROGRESS_TICK_MS = 100
+
+# Generated lists above this many IPs ask for confirmation (each one becomes a table row)
+LARGE_LIST_WARNING = 65536
 
 class ExecutionView(ctk.CTkFrame):
     def __init__(self, master, db):
@@ -15,6 +35,19 @@ class ExecutionView(ctk.CTkFrame):
         self.db = db
         self.devices = []  # Will hold list of dicts: {'ip': '', 'port': '80', 'status': 'Pendente'}
         self.active_engine = None
+        # Engine -> GUI status events, applied in batches by _drain_progress
+        self.progress_bus = ProgressBus()
+        self._devices_by_ip = {}  # ip -> dev dict in self.devices
+        self._tree_items = {}     # ip -> Treeview item id
+        # Journal run being resumed with the current list (None: the next start journals a new run)
+        self._resume_run_id = None
+        # Scan pipeline: (scanner, spec) waiting for the start, and the channel/scanner of the running one
+        self._pending_scan = None
+        self._scan_channel = None
+        self._active_scanner = None
+        # Measured RAM of the selected browser/template, used by the workers slider
+        self._memory_profile = None
+        self._available_mb = None
         
         # Grid layout
         self.grid_rowconfigure(2, weight=1)
@@ -31,13 +64,13 @@ class ExecutionView(ctk.CTkFrame):
         
         # Template selection
         self.template_var = ctk.StringVar(value="Selecione um Template")
-        self.cb_templates = ctk.CTkOptionMenu(self.config_frame, variable=self.template_var, values=self._get_template_names(), width=220)
+        self.cb_templates = ctk.CTkOptionMenu(self.config_frame, variable=self.template_var, values=self._get_template_names(), width=220, command=self._refresh_memory_profile)
         self.cb_templates.grid(row=0, column=1, padx=20)
         
         # Browser Selection
         ctk.CTkLabel(self.config_frame, text="Navegador:").grid(row=0, column=2, padx=(5, 5))
         self.browser_var = ctk.StringVar(value="Firefox")
-        self.cb_browser = ctk.CTkOptionMenu(self.config_frame, variable=self.browser_var, values=["Firefox", "Chromium", "WebKit"], width=100)
+        self.cb_browser = ctk.CTkOptionMenu(self.config_frame, variable=self.browser_var, values=["Firefox", "Chromium", "WebKit"], width=100, command=self._refresh_memory_profile)
         self.cb_browser.grid(row=0, column=3, padx=(0, 20), sticky="w")
         
         # Timeout Selection 
@@ -53,6 +86,59 @@ class ExecutionView(ctk.CTkFrame):
         self.slider_workers.grid(row=1, column=1, columnspan=2, padx=5, pady=(0, 10), sticky="w")
         self.lbl_workers = ctk.CTkLabel(self.config_frame, text="3 (~450MB RAM)", anchor="w")
         self.lbl_workers.grid(row=1, column=3, columnspan=4, padx=5, pady=(0, 10), sticky="w")
+        self._refresh_memory_profile()
+
+        # Adaptive concurrency: the slider becomes the upper bound and the engine adjusts during the run
+        self.adaptive_var = ctk.BooleanVar(value=False)
+        self.chk_adaptive = ctk.CTkCheckBox(self.config_frame, text="Ajuste automático (adaptativo)", variable=self.adaptive_var)
+        self.chk_adaptive.grid(row=2, column=0, columnspan=2, padx=(10, 5), pady=(0, 10), sticky="w")
+        ctk.CTkLabel(self.config_frame, text="Teto RAM (MB):").grid(row=2, column=2, padx=(5, 5), pady=(0, 10), sticky="e")
+        self.entry_ram_ceiling = ctk.CTkEntry(self.config_frame, width=100, placeholder_text="Ex: 4096")
+        self.entry_ram_ceiling.grid(row=2, column=3, padx=(0, 20), pady=(0, 10), sticky="w")
+
+        # Retries for transient failures (timeout / connection refused), with exponential backoff
+        ctk.CTkLabel(self.config_frame, text="Tentativas:").grid(row=2, column=4, padx=(10, 5), pady=(0, 10))
+        self.retries_var = ctk.StringVar(value="1")
+        self.cb_retries = ctk.CTkOptionMenu(self.config_frame, variable=self.retries_var, values=["1", "2", "3", "5"], width=130)
+        self.cb_retries.grid(row=2, column=5, padx=(0, 20), pady=(0, 10), sticky="w")
+
+        # Execution backend: HTTP replay needs a recipe recorded in "Testar Único IP"
+        ctk.CTkLabel(self.config_frame, text="Motor:").grid(row=3, column=0, padx=(10, 5), pady=(0, 10), sticky="e")
+        self.backend_var = ctk.StringVar(value="Navegador")
+        self.cb_backend = ctk.CTkOptionMenu(self.config_frame, variable=self.backend_var, values=["Navegador", "HTTP (fallback navegador)", "Somente HTTP"], width=220)
+        self.cb_backend.grid(row=3, column=1, padx=20, pady=(0, 10), sticky="w")
+
+        # Sharded execution: the batch is split across N processes (one event loop per CPU core),
+        # or across other PCs running "python -m core.distributed worker" (Rede)
+        ctk.CTkLabel(self.config_frame, text="Processos:").grid(row=3, column=2, padx=(5, 5), pady=(0, 10))
+        self.shards_var = ctk.StringVar(value="1")
+        self.cb_shards = ctk.CTkOptionMenu(self.config_frame, variable=self.shards_var, values=["1", "2", "4", "8", "Rede (workers)"], width=100)
+        self.cb_shards.grid(row=3, column=3, padx=(0, 20), pady=(0, 10), sticky="w")
+
+        # TCP preflight: devices that don't answer on the port fail in seconds, without a browser
+        self.preflight_var = ctk.BooleanVar(value=True)
+        self.chk_preflight = ctk.CTkCheckBox(self.config_frame, text="Pré-verificar porta (TCP, 3s)", variable=self.preflight_var)
+        self.chk_preflight.grid(row=3, column=4, columnspan=2, padx=(10, 5), pady=(0, 10), sticky="w")
+
+        # Template chain: the listed templates run in order on each device, in one browser session
+        ctk.CTkLabel(self.config_frame, text="Encadear IDs:").grid(row=4, column=0, padx=(10, 5), pady=(0, 10), sticky="e")
+        self.entry_chain = ctk.CTkEntry(self.config_frame, width=220, placeholder_text="Ex: 3,5,7 (vazio = só o template)")
+        self.entry_chain.grid(row=4, column=1, columnspan=2, padx=20, pady=(0, 10), sticky="w")
+
+        # Login reuse: templates with "# FIM DO LOGIN" skip the login while the device session is valid
+        self.session_var = ctk.BooleanVar(value=True)
+        self.chk_session = ctk.CTkCheckBox(self.config_frame, text="Reutilizar sessão de login (30 min)", variable=self.session_var)
+        self.chk_session.grid(row=4, column=4, columnspan=2, padx=(10, 5), pady=(0, 10), sticky="w")
+
+        # Fingerprint routing: each device runs the template whose rule matches its web interface
+        self.routing_var = ctk.BooleanVar(value=False)
+        self.chk_routing = ctk.CTkCheckBox(self.config_frame, text="Escolher template por fingerprint (título, Server, favicon)", variable=self.routing_var)
+        self.chk_routing.grid(row=5, column=0, columnspan=4, padx=(10, 5), pady=(0, 10), sticky="w")
+
+        # Lower bound of the adaptive mode (the slider is the upper one)
+        ctk.CTkLabel(self.config_frame, text="Mínimo (adaptativo):").grid(row=5, column=4, padx=(10, 5), pady=(0, 10))
+        self.entry_min_workers = ctk.CTkEntry(self.config_frame, width=130, placeholder_text="Ex: 2 (padrão 1)")
+        self.entry_min_workers.grid(row=5, column=5, padx=(0, 20), pady=(0, 10), sticky="w")
 
         # 2. Action Bar
         self.action_frame = ctk.CTkFrame(self, fg_color="transparent")
@@ -72,6 +158,9 @@ class ExecutionView(ctk.CTkFrame):
         
         self.btn_test = ctk.CTkButton(self.action_frame, text="🧪 Testar Único IP", command=self.open_test_modal, fg_color="#D1911B", hover_color="#9C6B11")
         self.btn_test.pack(side="left", padx=(10, 2))
+
+        self.btn_resume = ctk.CTkButton(self.action_frame, text="♻️ Retomar Execução", command=self.open_resume_modal, fg_color="#565b5e", hover_color="#343638")
+        self.btn_resume.pack(side="left", padx=2)
         
         self.btn_play = ctk.CTkButton(self.action_frame, text="▶️ INICIAR AUTOMAÇÃO", command=self.start_execution, fg_color="#2EA043", hover_color="#238636")
         self.btn_play.pack(side="right", padx=2)
@@ -100,18 +189,38 @@ class ExecutionView(ctk.CTkFrame):
             
         self.tree.pack(fill="both", expand=True, padx=10, pady=10)
 
+        self.after(PROGRESS_TICK_MS, self._drain_progress)
+
+    def _selected_template_id(self):
+        selected_text = self.template_var.get()
+        if not selected_text.startswith("["):
+            return None
+        return int(selected_text.split("]")[0].replace("[", ""))
+
+    def _refresh_memory_profile(self, *_):
+        """ Reloads the measured RAM profile of the selected browser/template and the free RAM. """
+        self._memory_profile = self.db.get_memory_profile(self.browser_var.get().lower(), self._selected_template_id())
+        self._available_mb = available_memory_mb()
+        self._update_slider_label(self.workers_var.get())
+
     def _update_slider_label(self, val):
         workers = int(val)
-        ram_mb = workers * 150
+        ram_mb = int(estimate_ram_mb(self._memory_profile, workers))
         if ram_mb >= 1024:
             ram_str = f"{ram_mb / 1024:.1f}GB"
         else:
             ram_str = f"{ram_mb}MB"
-            
-        if workers > 30:
-            self.lbl_workers.configure(text=f"{workers} (~{ram_str} RAM) ⚠️ ALTO", text_color="#d12c2c")
+        # Measured on this machine (this template, or the browser's average) vs the 150MB guess
+        source = "medido" if self._memory_profile else "estimado"
+        safe_max = suggest_max_workers(self._memory_profile, self._available_mb)
+        text = f"{workers} (~{ram_str} RAM, {source})"
+        if safe_max:
+            text += f" · máx. seguro: {safe_max}"
+
+        if workers > (safe_max or 30):
+            self.lbl_workers.configure(text=f"{text} ⚠️ ALTO", text_color="#d12c2c")
         else:
-            self.lbl_workers.configure(text=f"{workers} (~{ram_str} RAM)", text_color=["gray10", "#DCE4EE"])
+            self.lbl_workers.configure(text=text, text_color=["gray10", "#DCE4EE"])
 
     def _get_template_names(self):
         templates = self.db.get_all_templates()
@@ -124,6 +233,7 @@ class ExecutionView(ctk.CTkFrame):
         self.cb_templates.configure(values=new_values)
         if new_values[0] != "Nenhum template cadastrado":
             self.cb_templates.set(new_values[-1])
+        self._refresh_memory_profile()
 
     def import_list(self):
         # Refresh templates on import click just in case
@@ -158,9 +268,7 @@ class ExecutionView(ctk.CTkFrame):
                     else:
                         mapped_df[req] = ""
 
-            self.devices = []
-            for item in self.tree.get_children():
-                self.tree.delete(item)
+            self._clear_devices()
                 
             for _, row in mapped_df.iterrows():
                 dev = {
@@ -169,8 +277,7 @@ class ExecutionView(ctk.CTkFrame):
                     "status": "Pendente"
                 }
                 if dev['ip'] and dev['ip'] != 'nan':
-                    self.devices.append(dev)
-                    self.tree.insert("", "end", values=(dev['ip'], dev['port'], dev['status']))
+                    self._add_device(dev)
                     
             if self.devices:
                 self.btn_export.configure(state="normal")
@@ -179,24 +286,61 @@ class ExecutionView(ctk.CTkFrame):
         except Exception as e:
             messagebox.showerror("Erro de Importação", f"Erro ao ler arquivo: {str(e)}\nFormato esperado: colunas IP, Porta")
 
+    def _clear_devices(self):
+        self.devices = []
+        self._resume_run_id = None
+        self._pending_scan = None
+        self._devices_by_ip = {}
+        self._tree_items = {}
+        self.tree.delete(*self.tree.get_children())
+        self.progress_bus.drain()  # Drop events of the previous list
+
+    def _add_device(self, dev):
+        self.devices.append(dev)
+        item = self.tree.insert("", "end", values=(dev['ip'], dev['port'], dev['status']))
+        # Repeated IPs: the first row is the one that gets status updates
+        self._devices_by_ip.setdefault(dev['ip'], dev)
+        self._tree_items.setdefault(dev['ip'], item)
+
     def update_device_status(self, ip, message):
-        # Update device internal list
-        for dev in self.devices:
-            if dev.get('ip') == ip:
-                dev['status'] = str(message)
-                break
-                
-        # Format for single-line treeview display
-        clean_msg = str(message).replace('\n', ' | ').replace('\r', '')
-        
-        # Must be called from main thread ideally, or handled safely
-        def _update():
-            for item in self.tree.get_children():
-                if self.tree.item(item, "values")[0] == ip:
-                    vals = self.tree.item(item, "values")
-                    self.tree.item(item, values=(vals[0], vals[1], clean_msg))
-                    break
-        self.after(0, _update)
+        """ Safe from any thread: the change is queued and applied on the next tick. """
+        self.progress_bus.publish(ip, message)
+
+    def _scanned_device(self, ip, port, status, fingerprint, identified):
+        """ Table row of a host found by the scanner; an identified host keeps its fingerprint for routing. """
+        dev = {"ip": ip, "port": str(port), "status": status}
+        if identified:
+            dev["fingerprint"] = fingerprint
+            dev["status"] = f"{status} - {describe(fingerprint)}"
+        return dev
+
+    def _drain_scan(self):
+        """ Adds a row for every host the running scan pipeline found since the last tick. """
+        channel = self._scan_channel
+        if channel is None:
+            return
+        finished = channel.finished.is_set()
+        for result in channel.drain(limit=channel.total or 5000):
+            if result.open and result.ip not in self._devices_by_ip:
+                self._add_device(self._scanned_device(result.ip, result.port, "Encontrado", result.fingerprint, result.fingerprint is not None))
+        if finished:
+            self._scan_channel = None
+
+    def _drain_progress(self):
+        # Only the latest status of each device that changed since the previous tick
+        events = self.progress_bus.drain()
+        # Rows of newly found hosts go in after the events are taken: a device is always
+        # put in the scan channel before the engine can publish anything about it
+        self._drain_scan()
+        for event in events:
+            dev = self._devices_by_ip.get(event.ip)
+            if dev is not None:
+                dev['status'] = event.message
+            item = self._tree_items.get(event.ip)
+            if item is not None:
+                # Format for single-line treeview display
+                self.tree.set(item, "Status", event.message.replace('\n', ' | ').replace('\r', ''))
+        self.after(PROGRESS_TICK_MS, self._drain_progress)
 
     def export_log(self):
         if not self.devices:
@@ -361,16 +505,32 @@ if __name__ == "__main__":
 
     def _start_execution_internal(self):
         """Internal method to start execution after browser check."""
-        if not self.devices:
+        # Scan pipeline (see open_ip_scanner_modal): devices arrive from the scanner during the run
+        scan, self._pending_scan = self._pending_scan, None
+        if not self.devices and scan is None:
             messagebox.showwarning("Aviso", "Importe uma lista de equipamentos primeiro.")
             return
+
+        routes = None
+        if self.routing_var.get():
+            # Each device gets the template its fingerprint matches; the selected one (or the first
+            # routed template) only names the run in the journal
+            routes = self.db.get_fingerprint_routes()
+            if not routes:
+                messagebox.showwarning("Aviso", "Nenhum template tem regra de fingerprint.\nPreencha o campo Fingerprint na aba de templates.")
+                return
+            if self.entry_chain.get().strip():
+                messagebox.showwarning("Aviso", "A escolha por fingerprint não pode ser combinada com templates encadeados.")
+                return
             
         selected_text = self.template_var.get()
-        if not selected_text or "Nenhum" in selected_text or "Selecione" in selected_text:
+        if routes:
+            template_id = self._selected_template_id() or routes[0]["template_id"]
+        elif not selected_text or "Nenhum" in selected_text or "Selecione" in selected_text:
             messagebox.showwarning("Aviso", "Por favor, selecione um template do dropdown primeiro.")
             return
-            
-        template_id = int(selected_text.split("]")[0].replace("[", ""))
+        else:
+            template_id = int(selected_text.split("]")[0].replace("[", ""))
         template_row = self.db.get_template(template_id)
         
         if not template_row:
@@ -378,7 +538,32 @@ if __name__ == "__main__":
             return
             
         script = template_row[5] # actions_script column
+        lean = bool(template_row[6]) # lean_mode column
         workers = int(self.workers_var.get())
+
+        chain_text = self.entry_chain.get().strip()
+        if chain_text:
+            # The first template of the chain gives the lean mode, vendor (session) and journal entry
+            steps = []
+            for part in chain_text.replace(";", ",").split(","):
+                part = part.strip()
+                step_row = self.db.get_template(int(part)) if part.isdigit() else None
+                if not step_row:
+                    messagebox.showerror("Erro", f"Template \"{part}\" da cadeia não encontrado no banco.")
+                    return
+                steps.append({"id": step_row[0], "name": f"{step_row[1]} {step_row[2]}", "script": step_row[5]})
+            template_row = self.db.get_template(steps[0]["id"])
+            template_id = steps[0]["id"]
+            lean = bool(template_row[6])
+            script = steps if len(steps) > 1 else steps[0]["script"]
+
+        backend = {"Navegador": "browser", "HTTP (fallback navegador)": "auto", "Somente HTTP": "http"}[self.backend_var.get()]
+        http_recipe = None
+        if backend != "browser" and not isinstance(script, list) and not routes:
+            http_recipe = self.db.get_http_recipe(template_id)
+            if not http_recipe:
+                messagebox.showwarning("Aviso", "Este template ainda não tem receita HTTP gravada.\nUse \"Testar Único IP\" com a opção de gravação marcada.")
+                return
         
         # Parse timeout from selected text
         timeout_str_val = self.timeout_var.get().split("s")[0]
@@ -390,158 +575,363 @@ if __name__ == "__main__":
         self.btn_export.configure(state="disabled")
         self.btn_export_py.configure(state="disabled")
         self.slider_workers.configure(state="disabled")
+        self.chk_adaptive.configure(state="disabled")
+        self.cb_shards.configure(state="disabled")
+
+        adaptive = bool(self.adaptive_var.get())
+        ram_ceiling_str = self.entry_ram_ceiling.get().strip()
+        memory_ceiling_mb = int(ram_ceiling_str) if ram_ceiling_str.isdigit() else None
+        min_workers_str = self.entry_min_workers.get().strip()
+        min_workers = min(workers, max(1, int(min_workers_str))) if min_workers_str.isdigit() else 1
+        retry_policy = RetryPolicy(max_attempts=int(self.retries_var.get()))
+        distributed = self.shards_var.get().startswith("Rede")
+        shards = 1 if distributed else int(self.shards_var.get())
+        preflight_timeout = 3 if self.preflight_var.get() else None
+        channel = None
+        if routes:
+            # Routing happens in this process's engine, in front of its browsers
+            distributed, shards, backend = False, 1, "browser"
+        if scan:
+            # Found hosts are fed to this process's engine as they come; the scan already is the TCP preflight
+            distributed, shards, preflight_timeout = False, 1, None
+            scanner, spec = scan
+            channel = ScanChannel(total=len(spec))
+            self._scan_channel = channel
+            self._active_scanner = scanner
+        # Sessions are kept per device and vendor: other templates of the same vendor reuse them too
+        session_scope = template_row[1] if self.session_var.get() else None
+        session_cache = SessionCache(os.path.join(os.path.dirname(self.db.db_path), "sessions")) if session_scope else None
+
+        # Journal every device up front: if the app dies, "Retomar Execução" skips the successes
+        if self._resume_run_id:
+            run_id = self._resume_run_id
+            self.db.reopen_run(run_id)
+        else:
+            run_id = self.db.create_run(template_id, self.devices)
+        journal = RunJournal(self.db, run_id)
+        # Workers get the credentials and run the template: only ones started with this run's token are accepted
+        worker_token = secrets.token_urlsafe(16) if distributed else None
+        if distributed:
+            messagebox.showinfo("Execução Distribuída", f"Aguardando workers na porta {DEFAULT_PORT}.\n\nEm cada PC da rede, execute:\npython -m core.distributed worker --host {socket.gethostbyname(socket.gethostname())} --token {worker_token} --concurrency {workers}")
 
         # Asyncio loop runner
         def run_async_loop():
-            self.active_engine = AutomationEngine(max_concurrent=workers)
+            engine_kwargs = dict(max_concurrent=workers, adaptive=adaptive, min_concurrent=min_workers, memory_ceiling_mb=memory_ceiling_mb, retry_policy=retry_policy, progress_bus=self.progress_bus, session_cache=session_cache)
+            if distributed:
+                self.active_engine = DistributedCoordinator(token=worker_token, progress_bus=self.progress_bus, retry_attempts=retry_policy.max_attempts)
+            elif shards > 1:
+                # Worker count and RAM ceiling are split across the processes
+                self.active_engine = ShardedEngine(shards, **engine_kwargs)
+            else:
+                self.active_engine = AutomationEngine(**engine_kwargs)
             
             loop = asyncio.new_event_loop()
             asyncio.set_event_loop(loop)
             
+            async def _consume_results():
+                # Results stream in as each device finishes, so counts are available during the run
+                results = []
+                devices = self.devices
+                if scan:
+                    async def scanned_devices():
+                        # The channel is the GUI's view of the scan: mark it finished however the scan ends
+                        try:
+                            async for dev in discovered_devices(scanner, iter(spec), on_result=channel.put, on_found=journal.add_device):
+                                yield dev
+                        except Exception as e:
+                            channel.error = e
+                            raise
+                        finally:
+                            channel.finished.set()
+
+                    devices = scanned_devices()
+                async for result in self.active_engine.run_batch_stream(devices, script, "admin", "admin", browser_type=self.browser_var.get().lower(), timeout_ms=timeout_ms, lean=lean, cache_assets=True, http_recipe=http_recipe, backend=backend, preflight_timeout=preflight_timeout, session_scope=session_scope, routes=routes):
+                    results.append(result)
+                    journal.record(result)
+                return results
+
+            status = "failed"
             try:
-                results = loop.run_until_complete(
-                    self.active_engine.run_batch(self.devices, script, "admin", "admin", browser_type=self.browser_var.get().lower(), timeout_ms=timeout_ms, progress_callback=self.update_device_status)
-                )
+                results = loop.run_until_complete(_consume_results())
+                phase_report = self.active_engine.phase_percentiles()
+                # A routed batch mixes templates: its RAM isn't any one template's profile
+                memory_profile = None if routes else self.active_engine.memory_profile()
+                if memory_profile:
+                    # Next time the slider estimates this browser/template from real numbers
+                    self.db.save_memory_profile(self.browser_var.get().lower(), template_id, memory_profile)
                 
                 # Execution finished
                 def _finish():
-                    self.btn_stop.pack_forget()
-                    self.btn_play.pack(side="right", padx=5)
-                    self.btn_play.configure(state="normal", text="▶️ INICIAR AUTOMAÇÃO")
-                    self.btn_import.configure(state="normal")
-                    self.btn_export.configure(state="normal")
-                    self.btn_export_py.configure(state="normal")
+                    self._drain_scan()
+                    self._restore_controls()
                     messagebox.showinfo("Sucesso", "Todas as operações foram concluídas!")
-                    self.slider_workers.configure(state="normal")
                     
                     success_count = sum(1 for r in results if isinstance(r, dict) and r.get('status') == 'success')
-                    messagebox.showinfo("Finalizado", f"Execução concluída!\\nSucessos: {success_count} de {len(self.devices)}")
+                    saved_mb = sum(r.get('lean', {}).get('bytes_saved', 0) for r in results if isinstance(r, dict)) / (1024 * 1024)
+                    summary = f"Execução concluída!\nSucessos: {success_count} de {len(self.devices)}"
+                    unreachable_count = sum(1 for r in results if isinstance(r, dict) and r.get('status') == 'unreachable')
+                    if unreachable_count:
+                        summary += f"\nInacessíveis (porta fechada): {unreachable_count}"
+                    if routes:
+                        routed = {}
+                        for r in results:
+                            if isinstance(r, dict) and r.get('template'):
+                                routed[r['template']] = routed.get(r['template'], 0) + 1
+                        unmatched_count = sum(1 for r in results if isinstance(r, dict) and r.get('status') == UNMATCHED)
+                        summary += "\nPor template: " + (", ".join(f"{name} {count}" for name, count in routed.items()) or "nenhum")
+                        if unmatched_count:
+                            summary += f"\nNão identificados (ignorados): {unmatched_count}"
+                    if channel:
+                        summary += f"\nVarredura: {channel.found} hosts encontrados em {channel.probed} verificações"
+                    if lean:
+                        summary += f"\nModo leve: ~{saved_mb:.1f}MB economizados"
+                    # Where the time went: p95 of each execution phase
+                    p95 = ", ".join(f"{name} {stats['p95'] / 1000:.1f}s" for name, stats in phase_report.items())
+                    if p95:
+                        summary += f"\nTempo p95 por fase: {p95}"
+                    if memory_profile:
+                        summary += f"\nRAM medida: ~{memory_profile['per_worker_mb']:.0f}MB por navegador simultâneo (pico {memory_profile['peak_mb']:.0f}MB)"
+                    self._refresh_memory_profile()
+                    messagebox.showinfo("Finalizado", summary)
                 
                 self.after(0, _finish)
                 
             except Exception as e:
                 print(f"Loop error: {e}")
+
+                def _failed(error=str(e)):
+                    self._drain_scan()
+                    self._restore_controls()
+                    messagebox.showerror("Erro", f"A execução foi interrompida: {error}\nOs equipamentos pendentes podem ser retomados em \"Retomar Execução\".")
+
+                self.after(0, _failed)
+            else:
+                status = "cancelled" if self.active_engine.is_cancelled else "finished"
             finally:
+                journal.close(status)
+                if channel:
+                    # A cancelled batch may leave the scan generator suspended, never reaching its finally
+                    channel.finished.set()
                 loop.close()
                 self.active_engine = None
+                self._active_scanner = None
 
         # Start background thread for asyncio to not freeze tkinter GUI
         threading.Thread(target=run_async_loop, daemon=True).start()
 
+    def _restore_controls(self):
+        """ Back to the idle layout once a run ends (finished, cancelled or failed). """
+        self.btn_stop.pack_forget()
+        self.btn_stop.configure(state="normal", text="⏹️ PARAR")
+        self.btn_play.pack(side="right", padx=5)
+        self.btn_play.configure(state="normal", text="▶️ INICIAR AUTOMAÇÃO")
+        self.btn_import.configure(state="normal")
+        self.btn_export.configure(state="normal")
+        self.btn_export_py.configure(state="normal")
+        self.slider_workers.configure(state="normal")
+        self.chk_adaptive.configure(state="normal")
+        self.cb_shards.configure(state="normal")
+
+    def open_resume_modal(self):
+        runs = self.db.get_resumable_runs()
+        if not runs:
+            messagebox.showinfo("Retomar Execução", "Nenhuma execução pendente encontrada.")
+            return
+
+        templates = {t[0]: f"{t[1]} {t[2]}" for t in self.db.get_all_templates()}
+        labels = {}
+        for run_id, template_id, started_at, status, total, done in runs:
+            state = {"running": "interrompida", "cancelled": "cancelada"}.get(status, "com falhas")
+            label = f"#{run_id} - {templates.get(template_id, 'template removido')} - {time.strftime('%d/%m %H:%M', time.localtime(started_at))} - {done}/{total} ok ({state})"
+            labels[label] = (run_id, template_id)
+
+        modal = ctk.CTkToplevel(self)
+        modal.title("Retomar Execução")
+        modal.geometry("560x220")
+        modal.transient(self.winfo_toplevel())
+        modal.grab_set()
+
+        ctk.CTkLabel(modal, text="Execuções com equipamentos pendentes", font=ctk.CTkFont(size=16, weight="bold")).pack(pady=(20, 10))
+        run_var = ctk.StringVar(value=next(iter(labels)))
+        ctk.CTkOptionMenu(modal, variable=run_var, values=list(labels), width=500).pack(padx=20, pady=10)
+
+        def resume():
+            run_id, template_id = labels[run_var.get()]
+            if template_id not in templates:
+                messagebox.showerror("Erro", "O template desta execução foi removido.")
+                return
+            self._clear_devices()
+            for dev in self.db.get_run_pending_devices(run_id):
+                dev["status"] = "Pendente"
+                self._add_device(dev)
+            self._resume_run_id = run_id
+            self.refresh_templates()
+            for name in self._get_template_names():
+                if name.startswith(f"[{template_id}]"):
+                    self.cb_templates.set(name)
+            self._refresh_memory_profile()
+            self.btn_export.configure(state="normal")
+            self.btn_export_py.configure(state="normal")
+            modal.destroy()
+            messagebox.showinfo("Retomar Execução", f"{len(self.devices)} equipamentos pendentes carregados. Os já configurados foram ignorados.\nClique em INICIAR para continuar.")
+
+        ctk.CTkButton(modal, text="Carregar pendentes", command=resume).pack(pady=10)
+
     def stop_execution(self):
-        if self.active_engine:
-            self.active_engine.cancel()
+        if not self.active_engine:
+            return
+        if self._active_scanner:
+            # Scan pipeline: no new hosts either
+            self._active_scanner.cancel()
+        if not self.active_engine.is_cancelled:
+            # First click: graceful stop, a second click forces it
+            self.active_engine.cancel("graceful")
+            self.btn_stop.configure(text="⏹️ FORÇAR PARADA")
+            messagebox.showinfo("Cancelando", "Solicitação de parada enviada. Os equipamentos na fila foram cancelados e os ativos terão alguns segundos para finalizar.\n\nClique novamente para forçar a parada imediata.")
+        else:
+            self.active_engine.cancel("hard")
             self.btn_stop.configure(state="disabled", text="Parando...")
-            messagebox.showinfo("Cancelando", "Solicitação de parada enviada. Aguarde as execuções ativas finalizarem.")
 
     def open_ip_scanner_modal(self):
         modal = ctk.CTkToplevel(self)
         modal.title("Scanner de Rede (Apenas IPs Ativos)")
-        modal.geometry("500x500")
+        modal.geometry("500x610")
         modal.transient(self.winfo_toplevel())
         modal.grab_set()
         
         ctk.CTkLabel(modal, text="Scanner de Rede Inteligente", font=ctk.CTkFont(size=18, weight="bold")).pack(pady=20)
-        ctk.CTkLabel(modal, text="Verifica quais IPs no Range possuem interface web ativa na porta informada.").pack(pady=(0, 20))
+        ctk.CTkLabel(modal, text="Verifica quais IPs das redes/faixas possuem interface web ativa nas portas informadas.").pack(pady=(0, 20))
         
         form_frame = ctk.CTkFrame(modal)
         form_frame.pack(fill="x", padx=20, pady=10)
         
-        ctk.CTkLabel(form_frame, text="IP Inicial:").grid(row=0, column=0, padx=10, pady=10, sticky="w")
-        entry_start = ctk.CTkEntry(form_frame, width=200, placeholder_text="Ex: 192.168.1.100")
-        entry_start.grid(row=0, column=1, padx=10, pady=10)
+        ctk.CTkLabel(form_frame, text="Alvos:").grid(row=0, column=0, padx=10, pady=10, sticky="w")
+        entry_targets = ctk.CTkEntry(form_frame, width=260, placeholder_text="Ex: 192.168.1.0/24, 10.0.0.1-10.0.0.50")
+        entry_targets.grid(row=0, column=1, padx=10, pady=10)
         
-        ctk.CTkLabel(form_frame, text="IP Final:").grid(row=1, column=0, padx=10, pady=10, sticky="w")
-        entry_end = ctk.CTkEntry(form_frame, width=200, placeholder_text="Ex: 192.168.1.254")
-        entry_end.grid(row=1, column=1, padx=10, pady=10)
+        ctk.CTkLabel(form_frame, text="Excluir:").grid(row=1, column=0, padx=10, pady=10, sticky="w")
+        entry_exclude = ctk.CTkEntry(form_frame, width=260, placeholder_text="Ex: 192.168.1.1, 192.168.1.250-254")
+        entry_exclude.grid(row=1, column=1, padx=10, pady=10)
         
-        ctk.CTkLabel(form_frame, text="Porta Base:").grid(row=2, column=0, padx=10, pady=10, sticky="w")
-        entry_port = ctk.CTkEntry(form_frame, width=200)
+        ctk.CTkLabel(form_frame, text="Portas:").grid(row=2, column=0, padx=10, pady=10, sticky="w")
+        entry_port = ctk.CTkEntry(form_frame, width=260)
         entry_port.insert(0, "80")
         entry_port.grid(row=2, column=1, padx=10, pady=10)
 
+        ctk.CTkLabel(form_frame, text="Limite (conexões/s):").grid(row=3, column=0, padx=10, pady=10, sticky="w")
+        entry_rate = ctk.CTkEntry(form_frame, width=260)
+        entry_rate.insert(0, str(SCAN_RATE))
+        entry_rate.grid(row=3, column=1, padx=10, pady=10)
+
+        # Scan cache: addresses checked less than N minutes ago aren't probed again (dead ones are skipped)
+        ctk.CTkLabel(form_frame, text="Usar cache de até (min):").grid(row=4, column=0, padx=10, pady=10, sticky="w")
+        entry_cache = ctk.CTkEntry(form_frame, width=260, placeholder_text="0 = verificar tudo de novo")
+        entry_cache.grid(row=4, column=1, padx=10, pady=10)
+
+        # Pipeline: every host found goes straight to the browsers with the selected template
+        pipeline_var = ctk.BooleanVar(value=False)
+        ctk.CTkCheckBox(form_frame, text="Configurar durante a varredura (template selecionado)", variable=pipeline_var).grid(row=5, column=0, columnspan=2, padx=10, pady=10, sticky="w")
+
+        # Fingerprint: a GET per open port (title, Server, favicon), used to route devices to their template
+        identify_var = ctk.BooleanVar(value=self.routing_var.get())
+        ctk.CTkCheckBox(form_frame, text="Identificar equipamentos (título, Server, favicon)", variable=identify_var).grid(row=6, column=0, columnspan=2, padx=10, pady=10, sticky="w")
+
         lbl_progress = ctk.CTkLabel(modal, text="Aguardando início...", text_color="gray")
         lbl_progress.pack(pady=10)
         
         btn_action = ctk.CTkButton(modal, text="Iniciar Varredura")
         btn_action.pack(pady=10)
 
-        def _check_port(ip, port):
-            with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
-                s.settimeout(1.5) # Fast timeout
-                try:
-                    s.connect((ip, int(port)))
-                    return True
-                except:
-                    return False
+        # Every probe result is saved; the field above only decides how old a reused one may be
+        scanner = NetworkScanner(cache=ScanCache(self.db))
+
+        def _on_close():
+            scanner.cancel()
+            modal.destroy()
+
+        modal.protocol("WM_DELETE_WINDOW", _on_close)
 
         def scan_ips():
-            import ipaddress
-            start = entry_start.get().strip()
-            end = entry_end.get().strip()
-            port = entry_port.get().strip()
-            
+            rate = entry_rate.get().strip()
             try:
-                start_ip = ipaddress.IPv4Address(start)
-                end_ip = ipaddress.IPv4Address(end)
-                if int(start_ip) > int(end_ip):
-                    messagebox.showerror("Erro", "IP Inicial maior que o IP Final.")
+                spec = TargetSpec.parse(entry_targets.get(), entry_port.get(), entry_exclude.get())
+            except ValueError as e:
+                messagebox.showerror("Erro de Formato", str(e))
+                return
+            scanner.rate = int(rate) if rate.isdigit() else SCAN_RATE
+            scanner.fingerprint = identify_var.get()
+            cache_minutes = entry_cache.get().strip()
+            scanner.cache.max_age_minutes = int(cache_minutes) if cache_minutes.isdigit() else 0
+
+            if pipeline_var.get():
+                if self._selected_template_id() is None and not self.routing_var.get():
+                    messagebox.showwarning("Aviso", "Selecione um template antes de configurar durante a varredura.", parent=modal)
                     return
-                
-                # Setup UI
-                btn_action.configure(state="disabled", text="Escaneando...")
-                lbl_progress.configure(text="Disparando pacotes...")
-                
-                # Generating pool
-                ip_list = [str(ipaddress.IPv4Address(i)) for i in range(int(start_ip), int(end_ip) + 1)]
-                total = len(ip_list)
-                active_ips = []
-                
-                def _scan_thread():
-                    count = 0
-                    with ThreadPoolExecutor(max_workers=50) as executor:
-                        # Map IPs to check_port future
-                        future_to_ip = {executor.submit(_check_port, ip, port): ip for ip in ip_list}
-                        for future in future_to_ip:
-                            ip = future_to_ip[future]
-                            try:
-                                is_open = future.result()
-                                if is_open:
-                                    active_ips.append(ip)
-                            except:
-                                pass
-                            
-                            count += 1
-                            lbl_progress.configure(text=f"Progresso: {count}/{total} - Encontrados: {len(active_ips)}")
-                            self.update() # Force UI update safely
-                            
-                    # Finished scanning
-                    def _sync_finish():
-                        # Clear main list
-                        self.devices = []
-                        for item in self.tree.get_children():
-                            self.tree.delete(item)
-                            
-                        # Add alive devices
-                        for ip in active_ips:
-                            dev = {"ip": ip, "port": port, "status": "Online"}
-                            self.devices.append(dev)
-                            self.tree.insert("", "end", values=(dev['ip'], dev['port'], dev['status']))
-                            
-                        if self.devices:
-                            self.btn_export.configure(state="normal")
-                            self.btn_export_py.configure(state="normal")
-                            
-                        messagebox.showinfo("Scanner Finalizado", f"Varredura concluída. {len(active_ips)} IPs ativos encontrados.")
-                        modal.destroy()
-                        
-                    self.after(0, _sync_finish)
+                # The table fills in as hosts are found; INICIAR's usual flow runs with the scanner as the device source
+                self._clear_devices()
+                self._pending_scan = (scanner, spec)
+                modal.destroy()
+                self.start_execution()
+                return
+
+            # Setup UI
+            btn_action.configure(state="disabled", text="Escaneando...")
+            lbl_progress.configure(text="Disparando pacotes...")
+
+            # (ip, port) pairs are generated as the scanner consumes them, never as a full list
+            channel = scanner.start(iter(spec), total=len(spec))
+            # A host open on several ports is listed once, on the first of them in the port list
+            port_rank = {port: index for index, port in enumerate(spec.ports)}
+            active_ips = {}
+            fingerprints = {}
+            cached = {"hits": 0}
+
+            def _collect(batch):
+                for result in batch:
+                    if result.reason == CACHED_REASON:
+                        cached["hits"] += 1
+                    if result.open and port_rank[result.port] < port_rank.get(active_ips.get(result.ip), len(port_rank)):
+                        active_ips[result.ip] = result.port
+                        fingerprints[result.ip] = result.fingerprint
+
+            def _poll():
+                # Runs on the Tk thread: the scan thread only writes to the channel
+                if not modal.winfo_exists():
+                    return
+                finished = channel.finished.is_set()
+                batch = channel.drain()
+                while batch:
+                    _collect(batch)
+                    # Once the scan thread is done, take everything left in one go
+                    batch = channel.drain() if finished else None
+                lbl_progress.configure(text=f"Progresso: {channel.probed}/{channel.total} - Encontrados: {len(active_ips)} ({channel.rate:.0f} conexões/s)")
+                if not finished:
+                    self.after(PROGRESS_TICK_MS, _poll)
+                    return
+                if channel.error:
+                    messagebox.showerror("Erro", f"Falha na varredura: {channel.error}")
+                _sync_finish()
+
+            # Finished scanning
+            def _sync_finish():
+                # Clear main list
+                self._clear_devices()
                     
-                threading.Thread(target=_scan_thread, daemon=True).start()
-                
-            except Exception as e:
-                messagebox.showerror("Erro de Formato", f"IPs inválidos: {str(e)}")
-                btn_action.configure(state="normal", text="Iniciar Varredura")
+                # Add alive devices
+                for ip, port in active_ips.items():
+                    self._add_device(self._scanned_device(ip, port, "Online", fingerprints[ip], scanner.fingerprint))
+                    
+                if self.devices:
+                    self.btn_export.configure(state="normal")
+                    self.btn_export_py.configure(state="normal")
+                    
+                message = f"Varredura concluída. {len(active_ips)} IPs ativos encontrados."
+                if cached["hits"]:
+                    message += f"\n{cached['hits']} de {channel.total} verificações reaproveitadas do cache."
+                messagebox.showinfo("Scanner Finalizado", message)
+                modal.destroy()
+
+            _poll()
                 
         btn_action.configure(command=scan_ips)
 
@@ -557,64 +947,52 @@ if __name__ == "__main__":
         form_frame = ctk.CTkFrame(modal)
         form_frame.pack(fill="x", padx=20, pady=10)
         
-        ctk.CTkLabel(form_frame, text="IP Inicial:").grid(row=0, column=0, padx=10, pady=10, sticky="w")
-        entry_start = ctk.CTkEntry(form_frame, width=200, placeholder_text="Ex: 192.168.1.100")
-        entry_start.grid(row=0, column=1, padx=10, pady=10)
+        ctk.CTkLabel(form_frame, text="Alvos:").grid(row=0, column=0, padx=10, pady=10, sticky="w")
+        entry_targets = ctk.CTkEntry(form_frame, width=240, placeholder_text="Ex: 192.168.1.100-200, 10.0.0.0/28")
+        entry_targets.grid(row=0, column=1, padx=10, pady=10)
         
-        ctk.CTkLabel(form_frame, text="IP Final:").grid(row=1, column=0, padx=10, pady=10, sticky="w")
-        entry_end = ctk.CTkEntry(form_frame, width=200, placeholder_text="Ex: 192.168.1.200")
-        entry_end.grid(row=1, column=1, padx=10, pady=10)
+        ctk.CTkLabel(form_frame, text="Excluir:").grid(row=1, column=0, padx=10, pady=10, sticky="w")
+        entry_exclude = ctk.CTkEntry(form_frame, width=240, placeholder_text="Ex: 192.168.1.150")
+        entry_exclude.grid(row=1, column=1, padx=10, pady=10)
         
         ctk.CTkLabel(form_frame, text="Porta:").grid(row=2, column=0, padx=10, pady=10, sticky="w")
-        entry_port = ctk.CTkEntry(form_frame, width=200)
+        entry_port = ctk.CTkEntry(form_frame, width=240)
         entry_port.insert(0, "80")
         entry_port.grid(row=2, column=1, padx=10, pady=10)
         
         def generate_ips():
-            import ipaddress
-            start = entry_start.get().strip()
-            end = entry_end.get().strip()
-            
             try:
-                start_ip = ipaddress.IPv4Address(start)
-                end_ip = ipaddress.IPv4Address(end)
-                
-                if int(start_ip) > int(end_ip):
-                    messagebox.showerror("Erro", "O IP Inicial não pode ser maior que o IP Final.")
-                    return
+                spec = TargetSpec.parse(entry_targets.get(), entry_port.get(), entry_exclude.get())
+            except ValueError as e:
+                messagebox.showerror("Erro", str(e))
+                return
+            if len(spec.ports) > 1:
+                # Each device of the queue has one port; several ports only make sense in the scanner
+                messagebox.showerror("Erro", "Informe uma única porta (para testar várias portas use o Scanner de Rede).")
+                return
+            count = spec.host_count
+            if count > LARGE_LIST_WARNING and not messagebox.askyesno("Lista grande", f"{count} IPs serão adicionados à fila. Continuar?"):
+                return
+
+            # Clear current table
+            self._clear_devices()
                 
-                # Clear current table
-                self.devices = []
-                for item in self.tree.get_children():
-                    self.tree.delete(item)
-                    
-                # Generate
-                current_ip = int(start_ip)
-                end_int = int(end_ip)
-                port = entry_port.get().strip()
+            # Generate
+            port = str(spec.ports[0])
+            for ip in spec.hosts():
+                dev = {
+                    "ip": int_to_ip(ip),
+                    "port": port,
+                    "status": "Pendente"
+                }
+                self._add_device(dev)
                 
-                count = 0
-                while current_ip <= end_int:
-                    ip_str = str(ipaddress.IPv4Address(current_ip))
-                    dev = {
-                        "ip": ip_str,
-                        "port": port,
-                        "status": "Pendente"
-                    }
-                    self.devices.append(dev)
-                    self.tree.insert("", "end", values=(dev['ip'], dev['port'], dev['status']))
-                    current_ip += 1
-                    count += 1
-                    
-                if self.devices:
-                    self.btn_export.configure(state="normal")
-                    self.btn_export_py.configure(state="normal")
-                    
-                messagebox.showinfo("Sucesso", f"{count} IPs gerados e adicionados à fila de execução!")
-                modal.destroy()
+            if self.devices:
+                self.btn_export.configure(state="normal")
+                self.btn_export_py.configure(state="normal")
                 
-            except ipaddress.AddressValueError:
-                messagebox.showerror("Erro", "Formato de IP inválido. Use formato IPv4 (ex: 192.168.0.1).")
+            messagebox.showinfo("Sucesso", f"{count} IPs gerados e adicionados à fila de execução!")
+            modal.destroy()
                 
         btn_gen = ctk.CTkButton(modal, text="Gerar Fila", command=generate_ips)
         btn_gen.pack(pady=20)
@@ -652,6 +1030,10 @@ if __name__ == "__main__":
         entry_port.insert(0, "80")
         entry_port.grid(row=1, column=1, padx=10, pady=10)
         
+        record_var = ctk.BooleanVar(value=False)
+        chk_record = ctk.CTkCheckBox(form_frame, text="Gravar receita HTTP (motor sem navegador)", variable=record_var)
+        chk_record.grid(row=2, column=0, columnspan=2, padx=10, pady=10, sticky="w")
+
         lbl_status = ctk.CTkLabel(modal, text="Pronto para testar", text_color="yellow")
         lbl_status.pack(pady=10)
 
@@ -699,6 +1081,31 @@ if __name__ == "__main__":
                     )
                 )
                     
+            def record_runner():
+                engine = AutomationEngine(max_concurrent=1)
+                timeout_ms = int(self.timeout_var.get().split("s")[0]) * 1000
+                loop = asyncio.new_event_loop()
+                try:
+                    recipe = loop.run_until_complete(engine.record_http_recipe(
+                        ip, entry_port.get().strip(), "admin", "admin", script,
+                        browser_type=self.browser_var.get(), timeout_ms=timeout_ms, progress_callback=test_progress
+                    ))
+                    self.db.save_http_recipe(template_id, recipe)
+
+                    def _finish():
+                        btn_exec.configure(state="normal", text="Executar Teste")
+                        lbl_status.configure(text="Receita HTTP gravada!", text_color="#2EA043")
+                        messagebox.showinfo("Sucesso", f"Receita HTTP gravada com {len(recipe['steps'])} requisições e {len(recipe['extract'])} token(s) dinâmico(s).\nSelecione o motor HTTP na execução em lote.")
+                    modal.after(0, _finish)
+                except Exception as e:
+                    def _err(err=str(e)):
+                        btn_exec.configure(state="normal", text="Executar Teste")
+                        lbl_status.configure(text="Falha na gravação", text_color="#C93B3B")
+                        messagebox.showerror("Erro na Gravação", err)
+                    modal.after(0, _err)
+                finally:
+                    loop.close()
+
             def async_runner():
                 engine = AutomationEngine(max_concurrent=1)
                 device = {"ip": ip, "port": entry_port.get().strip()}
@@ -732,16 +1139,18 @@ if __name__ == "__main__":
                         messagebox.showerror("Exceção", str(e))
                     modal.after(0, _err)
                     
+            runner = record_runner if record_var.get() else async_runner
+
             # Wrap the start inside the verification logic
             chosen_browser_lower = self.browser_var.get().lower()
             app_root = self.winfo_toplevel()
             if hasattr(app_root, 'download_browser_if_missing'):
                 app_root.download_browser_if_missing(
                     chosen_browser_lower, 
-                    callback=lambda: threading.Thread(target=async_runner, daemon=True).start()
+                    callback=lambda: threading.Thread(target=runner, daemon=True).start()
                 )
             else:
-                threading.Thread(target=async_runner, daemon=True).start()
+                threading.Thread(target=runner, daemon=True).start()
 
         btn_exec = ctk.CTkButton(modal, text="Executar Teste", command=run_single_test, fg_color="#D1911B", hover_color="#9C6B11")
         btn_exec.pack(pady=10)
@@ -9,6 +9,9 @@ import json
 from tkinter import filedialog
 import re
 
+from core.fingerprint import parse_rule
+from core.session_cache import LOGIN_END_MARKER, suggest_login_end
+
 class TemplatesView(ctk.CTkFrame):
     def __init__(self, master, db):
         super().__init__(master, corner_radius=10)
@@ -121,7 +124,9 @@ class TemplatesView(ctk.CTkFrame):
                 "model": row[2],
                 "firmware": row[3],
                 "hardware": row[4],
-                "script": row[5]
+                "script": row[5],
+                "lean_mode": bool(row[6]),
+                "fingerprint": row[7]
             })
             
         try:
@@ -151,7 +156,10 @@ class TemplatesView(ctk.CTkFrame):
                         item['model'],
                         item.get('firmware', ''),
                         item.get('hardware', ''),
-                        item['script']
+                        item['script'],
+                        # Exports from before lean mode were recorded without it
+                        lean_mode=item.get('lean_mode', False),
+                        fingerprint=item.get('fingerprint', '')
                     )
                     count += 1
             
@@ -163,7 +171,7 @@ class TemplatesView(ctk.CTkFrame):
     def open_new_template_modal(self, template_id=None):
         modal = ctk.CTkToplevel(self)
         modal.title("Editar Template" if template_id else "Novo Template")
-        modal.geometry("650x800")
+        modal.geometry("650x850")
         modal.transient(self.winfo_toplevel())
         modal.grab_set()
 
@@ -190,6 +198,16 @@ class TemplatesView(ctk.CTkFrame):
         entry_hw = ctk.CTkEntry(form_frame, width=250)
         entry_hw.grid(row=3, column=1, padx=10, pady=10)
 
+        # Lean mode: block images/fonts/analytics during batch runs (opt-out per template)
+        lean_var = ctk.BooleanVar(value=True)
+        chk_lean = ctk.CTkCheckBox(form_frame, text="Modo leve (bloquear imagens, fontes e analytics)", variable=lean_var)
+        chk_lean.grid(row=4, column=0, columnspan=2, padx=10, pady=10, sticky="w")
+
+        # Fingerprint rule: batches routed by fingerprint send matching devices to this template
+        ctk.CTkLabel(form_frame, text="Fingerprint:").grid(row=5, column=0, padx=10, pady=10, sticky="w")
+        entry_fingerprint = ctk.CTkEntry(form_frame, width=350, placeholder_text="Ex: title: Archer C6; server: lighttpd; favicon: <md5>")
+        entry_fingerprint.grid(row=5, column=1, padx=10, pady=10)
+
         # Code section
         ctk.CTkLabel(modal, text="Script de Automação (Python Playwright):").pack(anchor="w", padx=20, pady=(10, 0))
         text_script = ctk.CTkTextbox(modal, height=120)
@@ -204,9 +222,12 @@ class TemplatesView(ctk.CTkFrame):
                 entry_fw.insert(0, row[3] if row[3] else "")
                 entry_hw.insert(0, row[4] if row[4] else "")
                 text_script.insert("0.0", row[5])
+                lean_var.set(bool(row[6]))
+                if row[7]:
+                    entry_fingerprint.insert(0, row[7])
         else:
             # Inject standard variable tips
-            tip = '# Variáveis injetadas durante execução: {{IP}}, {{PORT}}\n# Ex: await page.goto(f"http://{{IP}}:{{PORT}}/")\n'
+            tip = '# Variáveis injetadas durante execução: {{IP}}, {{PORT}}\n# Ex: await page.goto(f"http://{{IP}}:{{PORT}}/")\n# Uma linha "# FIM DO LOGIN" após o login permite reaproveitar a sessão do equipamento\n'
             text_script.insert("0.0", tip)
 
         # Instructions Section
@@ -300,6 +321,13 @@ class TemplatesView(ctk.CTkFrame):
                         
                         # Sub the actual typed IP in the recording to {{IP}} template variable
                         final_script = re.sub(r'\b(?:[0-9]{1,3}\.){3}[0-9]{1,3}\b', '{{IP}}', final_script)
+
+                        # Mark where the login ends so batch runs can reuse the device session
+                        login_end = suggest_login_end(final_script)
+                        if login_end is not None:
+                            script_lines = final_script.split("\n")
+                            script_lines.insert(login_end + 1, LOGIN_END_MARKER)
+                            final_script = "\n".join(script_lines)
                         
                         # Update GUI safely from main thread using after()
                         def update_text():
@@ -337,12 +365,19 @@ class TemplatesView(ctk.CTkFrame):
             if not v or not m or len(s) < 5:
                 messagebox.showerror("Erro", "Campos Fabricante, Modelo e Script são obrigatórios!")
                 return
+
+            fingerprint = entry_fingerprint.get().strip()
+            try:
+                parse_rule(fingerprint)
+            except ValueError as e:
+                messagebox.showerror("Erro", str(e))
+                return
             
             if template_id:
-                self.db.update_template(template_id, v, m, entry_fw.get(), entry_hw.get(), s)
+                self.db.update_template(template_id, v, m, entry_fw.get(), entry_hw.get(), s, lean_mode=lean_var.get(), fingerprint=fingerprint)
                 messagebox.showinfo("Sucesso", "Template atualizado com sucesso!")
             else:
-                self.db.save_template(v, m, entry_fw.get(), entry_hw.get(), s)
+                self.db.save_template(v, m, entry_fw.get(), entry_hw.get(), s, lean_mode=lean_var.get(), fingerprint=fingerprint)
                 messagebox.showinfo("Sucesso", "Novo template cadastrado com sucesso!")
                 
             self.refresh_table()
@@ -1,5 +1,6 @@
 import customtkinter as ctk
 import tkinter.messagebox as messagebox
+import multiprocessing
 import sys
 import os
 import subprocess
@@ -189,5 +190,7 @@ class TR069ProvisionerApp(ctk.CTk):
                 callback()
 
 if __name__ == "__main__":
+    # Sharded batches spawn worker processes; required for the frozen EXE
+    multiprocessing.freeze_support()
     app = TR069ProvisionerApp()
     app.mainloop()
@@ -0,0 +1,70 @@
+import asyncio
+import unittest
+
+from core.http_replay import RECIPE_VERSION, HttpReplayEngine, ReplayError
+
+# Login sets a session cookie named after the port; /check only accepts that device's own session
+RECIPE = {
+    "version": RECIPE_VERSION,
+    "steps": [
+        {"method": "GET", "url": "http://{{IP}}:{{PORT}}/login", "headers": {}, "expect_status": 200},
+        {"method": "GET", "url": "http://{{IP}}:{{PORT}}/check", "headers": {}, "expect_status": 200},
+    ],
+    "extract": [],
+}
+
+
+async def _router(reader, writer):
+    """ Minimal HTTP/1.1 device: one request per connection. """
+    port = writer.get_extra_info("sockname")[1]
+    request_line = (await reader.readline()).decode()
+    cookie = ""
+    while True:
+        line = (await reader.readline()).decode()
+        if line in ("\r\n", ""):
+            break
+        name, _, value = line.partition(":")
+        if name.lower() == "cookie":
+            cookie = value.strip()
+    path = request_line.split()[1]
+    headers = ""
+    status = "200 OK"
+    if path == "/login":
+        await asyncio.sleep(0.05)  # Both devices are mid-login at the same time
+        headers = f"Set-Cookie: sid={port}; Path=/\r\n"
+    elif cookie != f"sid={port}":
+        status = "403 Forbidden"
+    writer.write(f"HTTP/1.1 {status}\r\n{headers}Content-Length: 0\r\nConnection: close\r\n\r\n".encode())
+    await writer.drain()
+    writer.close()
+
+
+class HttpReplayCookieTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.servers = [await asyncio.start_server(_router, "127.0.0.1", 0) for _ in range(2)]
+        self.ports = [server.sockets[0].getsockname()[1] for server in self.servers]
+        self.engine = HttpReplayEngine(max_connections=10, timeout_ms=5000)
+
+    async def asyncTearDown(self):
+        await self.engine.close()
+        for server in self.servers:
+            server.close()
+            await server.wait_closed()
+
+    async def test_same_ip_devices_keep_their_own_session(self):
+        outcomes = await asyncio.gather(
+            *(self.engine.replay(RECIPE, "127.0.0.1", port, "admin", "admin") for port in self.ports),
+            return_exceptions=True,
+        )
+        self.assertEqual(outcomes, [None, None])
+        self.assertEqual(len(self.engine._client.cookies.jar), 0)
+
+    async def test_session_does_not_outlive_its_replay(self):
+        await self.engine.replay(RECIPE, "127.0.0.1", self.ports[0], "admin", "admin")
+        skip_login = dict(RECIPE, steps=RECIPE["steps"][1:])
+        with self.assertRaises(ReplayError):
+            await self.engine.replay(skip_login, "127.0.0.1", self.ports[0], "admin", "admin")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,57 @@
+import unittest
+
+from core.scan_targets import TargetSpec, int_to_ip, ip_to_int, parse_ports
+
+
+def _addresses(spec):
+    return [int_to_ip(ip) for ip in spec.hosts()]
+
+
+class TargetSpecTest(unittest.TestCase):
+    def test_cidr_yields_usable_hosts_only(self):
+        spec = TargetSpec.parse("192.168.1.0/30")
+        self.assertEqual(_addresses(spec), ["192.168.1.1", "192.168.1.2"])
+
+    def test_point_to_point_and_single_host_cidrs_keep_every_address(self):
+        self.assertEqual(_addresses(TargetSpec.parse("10.0.0.0/31")), ["10.0.0.0", "10.0.0.1"])
+        self.assertEqual(_addresses(TargetSpec.parse("10.0.0.7/32")), ["10.0.0.7"])
+
+    def test_ranges_are_merged(self):
+        spec = TargetSpec.parse("10.0.0.1-5, 10.0.0.4-10.0.0.8; 10.0.0.9")
+        self.assertEqual(spec.intervals, [(ip_to_int("10.0.0.1"), ip_to_int("10.0.0.9"))])
+
+    def test_excluded_network_is_removed_whole(self):
+        spec = TargetSpec.parse("10.0.0.0/16", "80", "10.0.1.0/24")
+        for address in ("10.0.1.0", "10.0.1.1", "10.0.1.255"):
+            self.assertFalse(any(start <= ip_to_int(address) <= end for start, end in spec.intervals), address)
+        self.assertEqual(spec.host_count, 65534 - 256)
+
+    def test_excluding_half_a_network(self):
+        spec = TargetSpec.parse("192.168.0.0/24", "80", "192.168.0.0/25")
+        self.assertEqual(_addresses(spec)[0], "192.168.0.128")
+        self.assertEqual(spec.host_count, 127)
+
+    def test_iteration_visits_every_port_of_a_host_first(self):
+        spec = TargetSpec.parse("10.0.0.1-2", "80,443")
+        self.assertEqual(len(spec), 4)
+        self.assertEqual([(int_to_ip(ip), port) for ip, port in spec],
+                         [("10.0.0.1", 80), ("10.0.0.1", 443), ("10.0.0.2", 80), ("10.0.0.2", 443)])
+
+    def test_invalid_targets_raise(self):
+        for text in ("", "10.0.0.300", "10.0.0.9-10.0.0.1"):
+            with self.assertRaises(ValueError):
+                TargetSpec.parse(text)
+
+
+class ParsePortsTest(unittest.TestCase):
+    def test_order_kept_and_repeats_dropped(self):
+        self.assertEqual(parse_ports("8080, 80;8080 79-81"), [8080, 80, 79, 81])
+
+    def test_invalid_ports_raise(self):
+        for text in ("", "http", "0", "70000", "90-80"):
+            with self.assertRaises(ValueError):
+                parse_ports(text)
+
+
+if __name__ == "__main__":
+    unittest.main()